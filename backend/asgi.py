@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The server-sent events stream is answered before Django's request handling
+(see transactions.events); everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,5 +14,16 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# The analytics endpoints switch to their async views (backend.async_urls)
+os.environ.setdefault('DJANGO_ASYNC_ANALYTICS_VIEWS', 'true')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the app registry is ready
+from transactions import events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == events.PATH:
+        return await events.event_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
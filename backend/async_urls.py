@@ -0,0 +1,20 @@
+"""
+Async analytics views at the paths of their DRF counterparts.
+
+``backend.urls`` puts these first when ASYNC_ANALYTICS_VIEWS is on, which
+``backend.asgi`` makes the default. Under WSGI an async view would run in
+an event loop of its own per request, so the DRF views stay in place there.
+"""
+
+from django.urls import path
+
+from budgets import async_views as budget_views
+from transactions import async_views as transaction_views
+
+urlpatterns = [
+    path('api/transactions/summary/', transaction_views.summary, name='transaction-summary-async'),
+    path('api/transactions/time_series/', transaction_views.time_series, name='transaction-time-series-async'),
+    path('api/transactions/balance_at/', transaction_views.balance_at, name='transaction-balance-at-async'),
+    path('api/budgets/summary/', budget_views.budget_summary, name='budget-summary-async'),
+    path('api/budgets/category-stats/', budget_views.category_stats, name='category-stats-async'),
+]
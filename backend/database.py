@@ -0,0 +1,27 @@
+"""
+Database connection helpers shared by the health endpoint and gunicorn hooks.
+"""
+
+from django.db import connections
+
+
+def connection_pool_stats():
+    """
+    Return psycopg_pool statistics (pool_size, pool_available,
+    requests_waiting, ...) for every database alias that uses pooling.
+    """
+    stats = {}
+    for alias in connections:
+        # Only the PostgreSQL backend has a pool, and only when configured
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def close_connection_pools():
+    """Close every connection pool, e.g. in a gunicorn master before fork()"""
+    for alias in connections:
+        close_pool = getattr(connections[alias], "close_pool", None)
+        if close_pool is not None:
+            close_pool()
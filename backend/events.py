@@ -0,0 +1,129 @@
+"""
+Per-user event fan-out for the server-sent events stream.
+
+Writers call ``publish`` inside their database transaction. On PostgreSQL
+it sends a NOTIFY, which the server delivers at commit to every process
+listening on that database, so a write served by a gunicorn (WSGI) worker
+reaches the streams of an ASGI process. On other databases the event goes
+to this process' streams after commit.
+
+Each open stream is an asyncio queue on the ASGI event loop: an idle
+connection costs a suspended coroutine, not a thread. A process runs one
+listener task per PostgreSQL database, started by the first subscriber.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'finance_events'
+# Frames buffered per stream; a client that falls further behind loses the
+# oldest ones (events carry current values, so the newest one wins anyway)
+QUEUE_SIZE = 100
+# Seconds before a dropped listener connection is retried
+LISTEN_RETRY_SECONDS = 5
+
+
+def format_event(event, data):
+    """One server-sent event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _offer(queue, frame):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(frame)
+
+
+def _listen_params(alias):
+    params = connections[alias].get_connection_params()
+    # Django's sync cursor settings do not apply to the async connection
+    for key in ('cursor_factory', 'context', 'prepare_threshold'):
+        params.pop(key, None)
+    return params
+
+
+class Broker:
+    """Streams subscribed per user in this process"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listeners = {}
+
+    def subscribe(self, user_id):
+        """Register a stream on the running event loop; returns its queue"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id].add((loop, queue))
+        self._ensure_listeners(loop)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            streams = self._subscribers.get(user_id, set())
+            streams.difference_update({entry for entry in streams if entry[1] is queue})
+            if not streams:
+                self._subscribers.pop(user_id, None)
+
+    def dispatch(self, user_id, frame):
+        """Hand ``frame`` to the user's streams; safe from any thread"""
+        with self._lock:
+            streams = list(self._subscribers.get(user_id, ()))
+        for loop, queue in streams:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, frame)
+            except RuntimeError:
+                # The stream's loop is closed
+                self.unsubscribe(user_id, queue)
+
+    def _ensure_listeners(self, loop):
+        for alias in settings.SHARD_DATABASES or [DEFAULT_DB_ALIAS]:
+            if connections[alias].vendor != 'postgresql':
+                continue
+            with self._lock:
+                task = self._listeners.get(alias)
+                if task is not None and not task.done() and task.get_loop() is loop:
+                    continue
+                self._listeners[alias] = loop.create_task(self._listen(alias))
+
+    async def _listen(self, alias):
+        import psycopg
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    **_listen_params(alias), autocommit=True,
+                ) as connection:
+                    await connection.execute(f'LISTEN {CHANNEL}')
+                    async for notify in connection.notifies():
+                        message = json.loads(notify.payload)
+                        self.dispatch(message['user'], message['frame'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event listener on %s failed; retrying", alias)
+            await asyncio.sleep(LISTEN_RETRY_SECONDS)
+
+
+broker = Broker()
+
+
+def publish(user_id, event, data, using=DEFAULT_DB_ALIAS):
+    """Send ``event`` to ``user_id``'s streams once the current transaction commits"""
+    frame = format_event(event, data)
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps({'user': user_id, 'frame': frame})])
+    else:
+        transaction.on_commit(lambda: broker.dispatch(user_id, frame), using=using)
@@ -0,0 +1,147 @@
+"""
+Read-replica routing for read-only analytics views.
+
+Views opt in with ``@use_read_replica``; everything else keeps reading from
+``default``. Reads are only sent to the replica when:
+
+- a ``replica`` database is configured (DATABASE_REPLICA_URL),
+- the current user has not written anything within the last
+  ``REPLICA_STICKY_SECONDS`` (read-your-writes), and
+- the default connection is not inside a transaction.
+"""
+
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+REPLICA_ALIAS = "replica"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def _sticky_key(user_id):
+    return f"db:recent_write:{user_id}"
+
+
+def mark_recent_write(user_id):
+    """Pin the user's reads to the primary for REPLICA_STICKY_SECONDS"""
+    cache.set(_sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def has_recent_write(user_id):
+    return bool(cache.get(_sticky_key(user_id)))
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def use_read_replica(view):
+    """
+    Let reads made while ``view`` runs go to the replica.
+
+    Works on function views (including ``@api_view``), on viewset actions
+    and on async views; place it directly above the function, below the DRF
+    decorators.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapped(request, *args, **kwargs):
+            user = getattr(request, "user", None)
+            allowed = (
+                replica_configured()
+                and user is not None
+                and user.is_authenticated
+                and not await cache.aget(_sticky_key(user.pk))
+            )
+            token = _use_replica.set(allowed)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+
+        return async_wrapped
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, (HttpRequest, Request)))
+        user = getattr(request, "user", None)
+        allowed = (
+            replica_configured()
+            and user is not None
+            and user.is_authenticated
+            and not has_recent_write(user.pk)
+        )
+        token = _use_replica.set(allowed)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapped
+
+
+class ReadReplicaRouter:
+    """Sends opted-in reads to the replica; writes always go to default"""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or not replica_configured():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so instances read from the replica are saved to default
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Records successful writes so the writer's next reads stay on the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.record_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            # Resolving request.user may query the database
+            await sync_to_async(self.record_write)(request, response)
+        return response
+
+    def record_write(self, request, response):
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and replica_configured()
+        ):
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                mark_recent_write(user.pk)
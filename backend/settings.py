@@ -5,6 +5,7 @@ Django settings for backend project.
 from pathlib import Path
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -61,7 +62,8 @@ _base_auth_classes = [
     "rest_framework.authentication.SessionAuthentication",
     "rest_framework.authentication.BasicAuthentication",
 ]
-if os.environ.get("DJANGO_ENFORCE_2FA", "false").lower() == "true":
+ENFORCE_2FA = os.environ.get("DJANGO_ENFORCE_2FA", "false").lower() == "true"
+if ENFORCE_2FA:
     # Enforce OTP: only use our 2FA authenticator for API views by default
     REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"] = [
         "transactions.authentication.TwoFactorAuthentication",
@@ -73,6 +75,8 @@ else:
 LOGIN_URL = "two_factor:login"
 LOGIN_REDIRECT_URL = "two_factor:profile"
 OTP_TOTP_ISSUER = "Finance Tracker"
+# Seconds a user's "has a confirmed OTP device" flag stays cached
+OTP_DEVICE_CACHE_TIMEOUT = int(os.environ.get("DJANGO_OTP_DEVICE_CACHE_TIMEOUT", "300"))
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
@@ -81,6 +85,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "backend.replica.ReplicaStickinessMiddleware",
+    "backend.sharding.ShardContextMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -122,30 +128,150 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 CORS_ALLOW_CREDENTIALS = True
 
+# Sessions
+# DJANGO_SESSION_ENGINE selects where session data lives:
+#   db             - django_session table (default), read on every request
+#   cached_db      - reads served from CACHES, writes go through to the DB
+#   cache          - cache only; sessions are lost when the cache is cleared
+#   signed_cookies - no server-side storage; a copied cookie stays valid until
+#                    it expires and a logout cannot revoke it
+# The cache-backed modes need a shared cache (DJANGO_REDIS_URL) when running
+# more than one worker, otherwise a logout in one worker is not seen by others.
+# The session holds the OTP verification (otp_verified), so signed_cookies is
+# refused when 2FA is enforced.
+_SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+_session_engine = os.environ.get("DJANGO_SESSION_ENGINE", "db").strip().lower()
+SESSION_ENGINE = _SESSION_ENGINES.get(_session_engine, _session_engine)
+if ENFORCE_2FA and SESSION_ENGINE == _SESSION_ENGINES["signed_cookies"]:
+    raise ImproperlyConfigured(
+        "DJANGO_SESSION_ENGINE=signed_cookies cannot be used with DJANGO_ENFORCE_2FA: "
+        "a replayed cookie would carry the OTP verification past logout."
+    )
+
 SESSION_COOKIE_SAMESITE = "Lax"
 SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_SAMESITE = "Lax"
 CSRF_COOKIE_HTTPONLY = False
 
-# Database
 # Database
 # Only require SSL for Postgres URLs. SQLite doesn't support sslmode.
+# CONN_HEALTH_CHECKS re-validates a persistent connection before reusing it,
+# so requests after a Fly machine suspend don't fail on a dead socket.
+_conn_health_checks = os.environ.get("DJANGO_DB_CONN_HEALTH_CHECKS", "true").lower() == "true"
 _env_db_url = os.environ.get("DATABASE_URL", "").strip()
 if _env_db_url:
-    _ssl_required = _env_db_url.startswith("postgres://") or _env_db_url.startswith("postgresql://")
+    _is_postgres = _env_db_url.startswith("postgres://") or _env_db_url.startswith("postgresql://")
+    _ssl_required = os.environ.get("DJANGO_DB_SSL_REQUIRE", str(_is_postgres)).lower() == "true"
+    # psycopg 3 connection pool (Django 5.1+). Pooling replaces persistent
+    # per-thread connections, so CONN_MAX_AGE must be 0 when it is on.
+    _db_pool = _is_postgres and os.environ.get("DJANGO_DB_POOL", "false").lower() == "true"
     _db_config = dj_database_url.parse(
         _env_db_url,
-        conn_max_age=600,
+        conn_max_age=0 if _db_pool else 600,
+        conn_health_checks=_conn_health_checks,
         ssl_require=_ssl_required,
     )
+    if _db_pool:
+        _db_config.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": int(os.environ.get("DJANGO_DB_POOL_MIN_SIZE", "1")),
+            "max_size": int(os.environ.get("DJANGO_DB_POOL_MAX_SIZE", "4")),
+            # Seconds a request waits for a free connection before erroring
+            "timeout": float(os.environ.get("DJANGO_DB_POOL_TIMEOUT", "10")),
+            # Drop connections idle for this long (e.g. across a suspend)
+            "max_idle": float(os.environ.get("DJANGO_DB_POOL_MAX_IDLE", "300")),
+        }
 else:
     _db_config = dj_database_url.parse(
         f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
         conn_max_age=600,
+        conn_health_checks=_conn_health_checks,
     )
 
 DATABASES = {"default": _db_config}
 
+
+def _parse_secondary_db(url):
+    """Parse a replica/shard URL with the same connection settings as default"""
+    is_postgres = url.startswith(("postgres://", "postgresql://"))
+    return dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        conn_health_checks=_conn_health_checks,
+        ssl_require=os.environ.get("DJANGO_DB_SSL_REQUIRE", str(is_postgres)).lower() == "true",
+    )
+
+
+# Optional read replica for the analytics views (see backend/replica.py).
+# Any URL dj-database-url understands works, e.g. a second SQLite file.
+_replica_db_url = os.environ.get("DATABASE_REPLICA_URL", "").strip()
+if _replica_db_url:
+    DATABASES["replica"] = _parse_secondary_db(_replica_db_url)
+
+# Optional user sharding (see backend/sharding.py): a comma-separated list of
+# database URLs, exposed as aliases shard0, shard1, ... Per-user tables live
+# on the user's shard; auth, sessions and other global tables stay on default.
+SHARD_DATABASES = []
+for _index, _shard_url in enumerate(
+    url.strip() for url in os.environ.get("DATABASE_SHARD_URLS", "").split(",") if url.strip()
+):
+    DATABASES[f"shard{_index}"] = _parse_secondary_db(_shard_url)
+    SHARD_DATABASES.append(f"shard{_index}")
+# Seconds a user's shard pin (core.UserShard) is cached per process
+SHARD_PIN_CACHE_TIMEOUT = int(os.environ.get("DJANGO_SHARD_PIN_CACHE_TIMEOUT", "60"))
+
+# The shard router answers first for per-user models; everything else falls
+# through to the replica router.
+DATABASE_ROUTERS = ["backend.sharding.UserShardRouter", "backend.replica.ReadReplicaRouter"]
+# Seconds a user's reads stay on the primary after they write
+REPLICA_STICKY_SECONDS = int(os.environ.get("DJANGO_REPLICA_STICKY_SECONDS", "5"))
+
+# Opt-in SQLite performance profile, applied per connection by
+# backend.sqlite.apply_sqlite_pragmas. No effect on other databases.
+SQLITE_PRAGMAS = {}
+if (
+    os.environ.get("DJANGO_SQLITE_TUNING", "false").lower() == "true"
+    and _db_config["ENGINE"] == "django.db.backends.sqlite3"
+):
+    _busy_timeout_ms = int(os.environ.get("DJANGO_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": _busy_timeout_ms,
+        # 256 MiB memory-mapped I/O and a 64 MiB page cache (negative = KiB)
+        "mmap_size": int(os.environ.get("DJANGO_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": -int(os.environ.get("DJANGO_SQLITE_CACHE_KB", str(64 * 1024))),
+        "temp_store": "MEMORY",
+    }
+    _db_config.setdefault("OPTIONS", {}).update({
+        # Take the write lock when a transaction starts so a reader can't
+        # deadlock trying to upgrade to a writer mid-transaction
+        "transaction_mode": "IMMEDIATE",
+        "timeout": _busy_timeout_ms / 1000,
+    })
+
+# Cache
+# Local memory by default. Set DJANGO_REDIS_URL (requires the redis package)
+# so per-user cache entries are shared and invalidated across workers.
+_redis_url = os.environ.get("DJANGO_REDIS_URL", "").strip()
+if _redis_url:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": _redis_url,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -164,6 +290,23 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Seconds an Idempotency-Key and its stored response are honoured
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("DJANGO_IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+
+# Per-process budget for the columnar analytics frames (transactions/analytics.py)
+ANALYTICS_CACHE_MAX_BYTES = int(os.environ.get("DJANGO_ANALYTICS_CACHE_MB", "64")) * 1024 * 1024
+
+# Serve the analytics endpoints with async views (backend/async_urls.py).
+# backend/asgi.py turns this on; under WSGI the DRF views are faster.
+ASYNC_ANALYTICS_VIEWS = os.environ.get("DJANGO_ASYNC_ANALYTICS_VIEWS", "false").lower() == "true"
+
+# Seconds an analytics view's last result may be served while a newer one is
+# computed in the background (transactions/coalesce.py); 0 turns this off
+ANALYTICS_STALE_SECONDS = int(os.environ.get("DJANGO_ANALYTICS_STALE_SECONDS", "0"))
+
+# Compressed yearly snapshots written by the archive_transactions command
+TRANSACTION_ARCHIVE_ROOT = os.environ.get("DJANGO_TRANSACTION_ARCHIVE_ROOT", str(BASE_DIR / "archive"))
+
 _project_static = BASE_DIR / "static"
 STATICFILES_DIRS = [_project_static] if _project_static.exists() else []
 
@@ -0,0 +1,216 @@
+"""
+User-sharded database routing (DATABASE_SHARD_URLS).
+
+Per-user models live on one of the ``shardN`` aliases, chosen by a stable
+hash of ``user_id`` unless the user is pinned elsewhere by a
+``core.UserShard`` row. Global tables (auth, sessions, budget templates,
+banks, ...) stay on ``default``. With no shards configured the router
+answers nothing and routing is unchanged.
+
+The user is taken, in order, from the instance being read or written, from
+an explicit ``user_shard(user_id)`` block, or from the current request
+(``ShardContextMiddleware``). Code outside a request that touches per-user
+models through ``Model.objects`` must use ``user_shard()``.
+
+Each shard also holds a copy of the ``auth_user`` rows of its users so
+foreign keys and ``select_related('user')`` keep working.
+"""
+
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# app_label.model_name of every model keyed by user
+SHARDED_MODELS = {
+    "transactions.category",
+    "transactions.transaction",
+    "transactions.userprofile",
+    "transactions.transactionarchive",
+    "transactions.archivedtotal",
+    "transactions.categorystatistics",
+    "transactions.recurringtransaction",
+    "transactions.idempotencykey",
+    "transactions.spendinganomaly",
+    "transactions.balancecheckpoint",
+    "transactions.synctombstone",
+    "budgets.budget",
+    "budgets.budgetalert",
+    "banking.connectedaccount",
+}
+
+_shard_user_id = ContextVar("shard_user_id", default=None)
+_shard_request = ContextVar("shard_request", default=None)
+
+
+def sharding_enabled():
+    return bool(settings.SHARD_DATABASES)
+
+
+def is_sharded_model(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def hash_shard_for_user(user_id, shards=None):
+    """Placement by hash alone: stable across processes and restarts"""
+    shards = shards or settings.SHARD_DATABASES
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def _pin_cache_key(user_id):
+    return f"db:shard_pin:{user_id}"
+
+
+def invalidate_shard_pin(user_id):
+    cache.delete(_pin_cache_key(user_id))
+
+
+def pin_cache_is_shared():
+    """
+    Whether invalidate_shard_pin() reaches every process. With the local
+    memory cache, other workers keep routing by an old pin for up to
+    SHARD_PIN_CACHE_TIMEOUT seconds.
+    """
+    return settings.CACHES["default"]["BACKEND"] != "django.core.cache.backends.locmem.LocMemCache"
+
+
+def shard_for_user(user_id):
+    """Return the alias holding ``user_id``'s data: its pin, else its hash shard"""
+    from core.models import UserShard  # Avoid import at app loading
+
+    key = _pin_cache_key(user_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = (
+            UserShard.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=user_id)
+            .values_list("alias", flat=True)
+            .first()
+        ) or ""
+        cache.set(key, alias, settings.SHARD_PIN_CACHE_TIMEOUT)
+    if alias and alias in settings.SHARD_DATABASES:
+        return alias
+    return hash_shard_for_user(user_id)
+
+
+@contextmanager
+def user_shard(user_id):
+    """Route per-user queries without an instance hint to ``user_id``'s shard"""
+    token = _shard_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _shard_user_id.reset(token)
+
+
+def _user_id_from_instance(instance):
+    if instance is None:
+        return None
+    if isinstance(instance, User):
+        return instance.pk
+    user_id = getattr(instance, "user_id", None)
+    if user_id is not None:
+        return user_id
+    # BudgetAlert/ArchivedTotal: only use the parent if it is already loaded
+    fields_cache = instance._state.fields_cache
+    parent = fields_cache.get("budget") or fields_cache.get("archive")
+    return getattr(parent, "user_id", None)
+
+
+def _current_user_id():
+    user_id = _shard_user_id.get()
+    if user_id is not None:
+        return user_id
+    request = _shard_request.get()
+    # DRF copies the authenticated user back onto the Django request
+    user = getattr(request, "user", None) if request is not None else None
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+class UserShardRouter:
+    """Places per-user models on their user's shard"""
+
+    def _route(self, model, hints):
+        if not sharding_enabled() or not is_sharded_model(model):
+            return None
+        user_id = _user_id_from_instance(hints.get("instance"))
+        if user_id is None:
+            user_id = _current_user_id()
+        if user_id is None:
+            return None
+        return shard_for_user(user_id)
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A sharded row may point at its user on default
+        if sharding_enabled() and (is_sharded_model(obj1) or is_sharded_model(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards are migrated like default (``migrate --database shardN``):
+        # they need auth tables for the mirrored user rows.
+        return None
+
+
+class ShardContextMiddleware:
+    """Makes the current request's user available to the router"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _shard_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _shard_request.reset(token)
+
+    async def __acall__(self, request):
+        token = _shard_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _shard_request.reset(token)
+
+
+def copy_user_row(user, alias):
+    """Insert or refresh ``user``'s auth_user row on ``alias`` without signals"""
+    values = {
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields
+        if not field.primary_key
+    }
+    updated = User.objects.using(alias).filter(pk=user.pk).update(**values)
+    if not updated:
+        User.objects.using(alias).bulk_create([User(pk=user.pk, **values)])
+
+
+def mirror_user_to_shard(sender, instance, created, using, **kwargs):
+    """
+    Keep a copy of the user row on the user's shard. Connected in
+    CoreConfig.ready(), ahead of the profile signal that inserts into the
+    shard and needs the row for its foreign key.
+    """
+    if not sharding_enabled() or using != DEFAULT_DB_ALIAS:
+        return
+    copy_user_row(instance, shard_for_user(instance.pk))
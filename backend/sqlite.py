@@ -0,0 +1,20 @@
+"""
+Opt-in SQLite performance profile (DJANGO_SQLITE_TUNING=true).
+
+Applied to every new SQLite connection through ``connection_created``:
+WAL lets readers proceed while a writer commits, ``synchronous=NORMAL`` is
+safe under WAL and avoids an fsync per commit, and the busy timeout makes
+concurrent writers wait for the lock instead of failing immediately.
+Write transactions are opened with ``BEGIN IMMEDIATE`` via the database's
+``transaction_mode`` option (see ``backend/settings.py``).
+"""
+
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
@@ -0,0 +1,13 @@
+"""
+two_factor's URLconf in a form Django can import on demand.
+
+``two_factor.urls.urlpatterns`` is a ``(patterns, app_name)`` tuple, which a
+URLResolver can only take once it has been imported. Re-exporting it as a
+plain module lets ``backend.urls`` defer the import (and the qrcode, Pillow
+and phonenumbers imports behind two_factor's views) until an ``account/``
+URL is actually resolved or reversed.
+"""
+
+from two_factor.urls import urlpatterns as _two_factor_urlpatterns
+
+urlpatterns, app_name = _two_factor_urlpatterns
@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, re_path, include
-from two_factor.urls import urlpatterns as tf_urls
+from django.urls.resolvers import RegexPattern, URLResolver
 # Comment out the AdminSiteOTPRequired import for now
 # from two_factor.admin import AdminSiteOTPRequired
-from core.views import index, contact
+from core.views import index, contact, healthz_ready
 from transactions.views import legacy_api_auth_login, legacy_api_auth_logout
 
 # Comment out the admin site class modification for now
@@ -12,6 +13,7 @@ from transactions.views import legacy_api_auth_login, legacy_api_auth_logout
 urlpatterns = [
     path('', index, name = 'index'),
     path('contact/', contact, name = 'contact'),
+    path('healthz/ready', healthz_ready, name='healthz-ready'),
     path('admin/', admin.site.urls),
     path('accounts/', include('allauth.urls')),
     path('api/', include('transactions.urls')),
@@ -19,8 +21,23 @@ urlpatterns = [
     path('api-auth/login/', legacy_api_auth_login, name='legacy-login'),
     path('api-auth/logout/', legacy_api_auth_logout, name='legacy-logout'),
     path('api-auth/', include('rest_framework.urls')),  # Optional for browsable API
-    path('', include(tf_urls)),  # Two-Factor authentication URLs
+    # Two-Factor authentication URLs (all under account/). The zero-width
+    # prefix keeps their full paths while deferring the import of two_factor's
+    # views, and the qrcode/Pillow/phonenumbers imports behind them, until an
+    # account/ URL is resolved or reversed.
+    URLResolver(
+        RegexPattern(r'^(?=account/)'),
+        'backend.two_factor_urls',
+        app_name='two_factor',
+        namespace='two_factor',
+    ),
     path('api/budgets/', include('budgets.urls')),
     # Catch-all: serve SPA for non-API/admin/two-factor paths
     re_path(r'^(?!admin/|api/|api-auth/|static/|media/|account/).*$', index),
 ]
+
+if settings.ASYNC_ANALYTICS_VIEWS:
+    from backend.async_urls import urlpatterns as async_urlpatterns
+
+    # Ahead of the DRF routes of the same paths
+    urlpatterns = async_urlpatterns + urlpatterns
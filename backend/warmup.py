@@ -0,0 +1,45 @@
+"""
+Warm-up helpers for cold starts.
+
+Used by the gunicorn hooks in ``gunicorn.conf.py`` and by the
+``/healthz/ready`` endpoint so the first real request after a machine
+resumes does not pay for imports, the DB handshake or an empty cache.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.urls import get_resolver
+
+from .database import close_connection_pools
+
+
+def load_urlconf():
+    """Import the root URLconf and every view module it references"""
+    get_resolver().url_patterns
+
+
+def prime_database():
+    """Open the default DB connection and run a trivial query"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def prime_cache():
+    """Round-trip a key through the default cache (connects Redis if configured)"""
+    cache.set("healthz:ready", time.time(), 60)
+    cache.get("healthz:ready")
+
+
+def warm_up(close_connections=False):
+    """
+    Run every warm-up step. Pass ``close_connections=True`` in a process that
+    is about to fork so no DB socket is inherited by the workers.
+    """
+    load_urlconf()
+    prime_database()
+    prime_cache()
+    if close_connections:
+        connections.close_all()
+        close_connection_pools()
@@ -0,0 +1,143 @@
+"""
+ORM aggregates vs the columnar analytics engine for one large user.
+
+    python -m benchmarks.analytics [--rows 100000] [--repeat 5]
+
+Seeds ``--rows`` transactions over three years, then times the queries
+behind summary, time_series, category_stats and budget evaluation both as
+ORM aggregates and over the NumPy frame: cold (frame loaded from the
+database) and warm (frame served from the LRU). Results of both paths are
+compared (to the cent) before timing.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.harness import create_users, setup_django
+
+CATEGORIES = ["Food", "Rent", "Transport", "Utilities", "Fun", "Health", "Shopping", "Travel"]
+
+
+def seed(user, rows):
+    from django.utils import timezone
+    from django.db import router
+    from transactions.models import Transaction, assign_categories
+
+    rng = random.Random(0)
+    now = timezone.now()
+    transactions = [
+        Transaction(
+            user=user,
+            transaction_type="income" if rng.random() < 0.15 else "expense",
+            amount=Decimal(rng.randint(100, 200_000)) / 100,
+            category=rng.choice(CATEGORIES),
+            date=now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+        )
+        for _ in range(rows)
+    ]
+    assign_categories(transactions, router.db_for_write(Transaction))
+    Transaction.objects.bulk_create(transactions, batch_size=5000)
+
+
+def orm_queries(user, months):
+    from django.db.models import Sum
+    from django.db.models.functions import TruncMonth
+    from transactions.models import Transaction
+
+    qs = Transaction.objects.filter(user=user)
+    income = qs.filter(transaction_type="income").aggregate(total=Sum("amount"))["total"]
+    expenses = qs.filter(transaction_type="expense").aggregate(total=Sum("amount"))["total"]
+    by_category = {
+        row["category"]: row["total"]
+        for row in qs.filter(transaction_type="expense").values("category").annotate(total=Sum("amount"))
+    }
+    list(qs.filter(transaction_type="income").values("category").annotate(total=Sum("amount")))
+    series = [
+        (row["period"], row["total"])
+        for row in qs.filter(transaction_type="expense", date__gte=months[0][0])
+        .annotate(period=TruncMonth("date")).values("period").annotate(total=Sum("amount")).order_by("period")
+    ]
+    spent = [
+        qs.filter(transaction_type="expense", category=category, date__gte=start, date__lt=end)
+        .aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
+        for start, end in months for category in CATEGORIES
+    ]
+    return income, expenses, by_category, series, spent
+
+
+def frame_queries(user, months):
+    from transactions.analytics import get_frame
+
+    frame = get_frame(user.pk)
+    income, expenses = frame.select("income"), frame.select("expense")
+    by_category = {category: total for category, total, _ in frame.by_category(expenses)}
+    frame.by_category(income)
+    series = frame.by_period(frame.select("expense", start=months[0][0]), "month")
+    spent = [
+        frame.total(frame.select("expense", start=start, end=end, category=category))
+        for start, end in months for category in CATEGORIES
+    ]
+    return frame.total(income), frame.total(expenses), by_category, series, spent
+
+
+def cents(value):
+    """Round nested results to cents; SQLite sums decimals as floats"""
+    if isinstance(value, Decimal):
+        return value.quantize(Decimal("0.01"))
+    if isinstance(value, dict):
+        return {key: cents(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [cents(item) for item in value]
+    return value
+
+
+def timed(func, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.utils import timezone
+    from transactions.analytics import frames
+
+    user = create_users(1, prefix="analytics")[0]
+    started = time.perf_counter()
+    seed(user, args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    # Twelve calendar months of budget evaluation, like a yearly budget view
+    now = timezone.localtime()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    starts = []
+    for _ in range(12):
+        starts.insert(0, month_start)
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    months = list(zip(starts, starts[1:] + [(starts[-1] + timedelta(days=32)).replace(day=1)]))
+
+    assert cents(orm_queries(user, months)) == cents(frame_queries(user, months)), "engine and ORM disagree"
+
+    orm = timed(lambda: orm_queries(user, months), args.repeat)
+    cold = timed(lambda: frame_queries(user, months), args.repeat, before=frames.clear)
+    warm = timed(lambda: frame_queries(user, months), args.repeat)
+    for label, seconds in [("orm", orm), ("frame (cold)", cold), ("frame (warm)", warm)]:
+        print(f"{label:<14} {seconds * 1000:9.1f} ms  x{orm / seconds:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Analytics endpoints under the WSGI thread model vs the async views on ASGI.
+
+    python -m benchmarks.asgi [--users 50] [--concurrency 200] [--requests 20]
+
+Seeds ``--users`` users with transactions and a budget, then serves the
+app with one gunicorn worker in three ways: WSGI with 2 threads (the Docker
+image's default), ASGI running the DRF views, and ASGI with the async
+analytics views (``SERVER_INTERFACE=asgi``). ``--concurrency`` keep-alive
+connections each send ``--requests`` GETs spread over summary, time_series,
+budget summary and category stats of random users. Frames are warmed
+first, so this measures request handling, not loading. Reports throughput,
+latency percentiles and the worker's peak thread count and memory.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.cold_start import free_port
+from benchmarks.events import wait_for_server, worker_stats
+from benchmarks.harness import REPO_ROOT, Result, create_users, setup_django
+
+PATHS = [
+    "/api/transactions/summary/",
+    "/api/transactions/time_series/?period=week",
+    "/api/budgets/summary/",
+    "/api/budgets/category-stats/",
+]
+ASGI = ["backend.asgi:application", "--worker-class", "uvicorn_worker.UvicornWorker"]
+MODES = {
+    "wsgi, 2 threads": (["backend.wsgi:application", "--threads", "2"], "false"),
+    "asgi, DRF views": (ASGI, "false"),
+    "asgi, async views": (ASGI, "true"),
+}
+
+
+def seed(users, rows):
+    from django.utils import timezone
+    from django.db import router
+    from budgets.models import Budget
+    from transactions.models import Transaction, assign_categories
+
+    rng = random.Random(0)
+    now = timezone.now()
+    for user in users:
+        user_rows = [
+            Transaction(
+                user=user,
+                transaction_type="income" if rng.random() < 0.15 else "expense",
+                amount=Decimal(rng.randint(100, 50_000)) / 100,
+                category=rng.choice(["Food", "Rent", "Transport", "Fun"]),
+                date=now - timedelta(days=rng.randint(0, 365)),
+            )
+            for _ in range(rows)
+        ]
+        assign_categories(user_rows, router.db_for_write(Transaction))
+        Transaction.objects.bulk_create(user_rows)
+        Budget.objects.create(user=user, category="Food", amount=Decimal("400.00"))
+
+
+def session_cookies(users):
+    from django.conf import settings
+    from django.test import Client
+
+    cookies = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        cookies.append(f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}")
+    return cookies
+
+
+async def get(reader, writer, path, cookie):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = next(
+        int(line.split(b":", 1)[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:")
+    )
+    await reader.readexactly(length)
+    return status
+
+
+async def client(port, cookies, requests, rng, result):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                status = await get(reader, writer, rng.choice(PATHS), rng.choice(cookies))
+            except (OSError, asyncio.IncompleteReadError):
+                result.errors += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                continue
+            if status == 200:
+                result.latencies.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+    finally:
+        writer.close()
+
+
+async def load(port, cookies, concurrency, requests, name):
+    # One pass over every user and endpoint loads the frames
+    await asyncio.gather(*(client(port, [cookie], len(PATHS) * 2, random.Random(i), Result("warm"))
+                           for i, cookie in enumerate(cookies)))
+    result = Result(name)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, cookies, requests, random.Random(i), result) for i in range(concurrency)
+    ))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_mode(name, args, async_views, cookies, options):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "python:benchmarks.db_latency", *args,
+         "--bind", f"127.0.0.1:{port}", "--workers", "1",
+         "--keep-alive", "30", "--backlog", str(max(2048, options.concurrency))],
+        cwd=REPO_ROOT,
+        env={
+            **os.environ,
+            "DJANGO_ASYNC_ANALYTICS_VIEWS": async_views,
+            "BENCH_DB_LATENCY_MS": str(options.db_latency),
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    peak = [0, 0.0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.05):
+            try:
+                threads, rss = worker_stats(proc.pid)
+            except OSError:
+                continue
+            peak[0], peak[1] = max(peak[0], threads), max(peak[1], rss)
+
+    try:
+        wait_for_server(port)
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        result = asyncio.run(load(port, cookies, options.concurrency, options.requests, name))
+        done.set()
+        sampler.join()
+    finally:
+        done.set()
+        proc.terminate()
+        proc.wait()
+    print(f"{result.summary()}  p99 {result.percentile(99) * 1000:7.2f} ms  "
+          f"peak {peak[0]} threads, {peak[1]:.0f} MiB", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=500, help="transactions per user")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20, help="requests per connection")
+    parser.add_argument("--db-latency", type=float, default=2.0,
+                        help="milliseconds added to every query, like a network round trip (0 for none)")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    setup_django()
+    users = create_users(args.users, prefix="asgi")
+    seed(users, args.rows)
+    cookies = session_cookies(users)
+    print(
+        f"{args.users} users x {args.rows} transactions, {args.concurrency} connections x {args.requests} "
+        f"requests, {args.db_latency:g} ms per query"
+    )
+    for name, (server_args, async_views) in MODES.items():
+        run_mode(name, server_args, async_views, cookies, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Parallel writers on one user's balance.
+
+    python -m benchmarks.balances [--threads 16] [--iterations 200] [--mode api|model]
+
+Every thread posts, edits and deletes transactions for the same user
+through the API (or, with ``--mode model``, creates them straight through
+the ORM), then the profile balance is compared with the ledger (sum of
+income minus expenses). Lost updates show up as a mismatch and
+a non-zero exit status. SQLite runs with the tuning profile so writers
+queue on the busy timeout instead of failing.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.harness import create_users, ensure_ok, run_concurrent, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--mode", choices=["api", "model"], default="api")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SQLITE_TUNING", "true")
+    setup_django()
+    from decimal import Decimal
+
+    from django.contrib.auth.models import User
+    from django.db.models import Sum
+    from django.test import Client
+    from transactions.models import Transaction, UserProfile
+
+    user = create_users(1, prefix="balance")[0]
+
+    def setup(thread_index):
+        if args.mode == "model":
+            return User.objects.get(pk=user.pk)
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def model_worker(thread_user, i):
+        Transaction.objects.create(
+            user=thread_user, transaction_type="income" if i % 3 == 0 else "expense",
+            amount=Decimal(f"{1 + i % 50}.25"), category="Load",
+        )
+
+    def api_worker(client, i):
+        payload = {
+            "transaction_type": "income" if i % 3 == 0 else "expense",
+            "amount": f"{1 + i % 50}.25",
+            "category": "Load",
+        }
+        response = ensure_ok(client.post(
+            "/api/transactions/", json.dumps(payload), content_type="application/json",
+        ), 201)
+        if i % 5 == 0:
+            ensure_ok(client.patch(
+                f"/api/transactions/{response.json()['id']}/",
+                json.dumps({"amount": "7.00"}), content_type="application/json",
+            ))
+        elif i % 7 == 0:
+            ensure_ok(client.delete(f"/api/transactions/{response.json()['id']}/"), 204)
+
+    worker = model_worker if args.mode == "model" else api_worker
+    result = run_concurrent(f"parallel writers ({args.mode})", worker, args.threads, args.iterations, setup)
+    print(result.summary())
+
+    ledger = Transaction.objects.filter(user=user)
+    income = ledger.filter(transaction_type="income").aggregate(total=Sum("amount"))["total"] or 0
+    expenses = ledger.filter(transaction_type="expense").aggregate(total=Sum("amount"))["total"] or 0
+    balance = UserProfile.objects.get(user=user).balance
+    print(f"rows {ledger.count()}  ledger {income - expenses}  balance {balance}")
+    if balance != income - expenses:
+        print("MISMATCH: balance lost updates")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measure cold-start time-to-first-byte of the gunicorn server.
+
+    python -m benchmarks.cold_start [--runs 5] [--path /api/auth/whoami/]
+
+For each run a fresh gunicorn process is started (as the Docker image does)
+and the time from spawn to the first complete response is recorded, once
+with GUNICORN_PRELOAD=false and once with it on.
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import REPO_ROOT, setup_django
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_byte(path, env, timeout=60):
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "backend.wsgi:application",
+         "--bind", f"127.0.0.1:{port}", "--workers", "1", "--threads", "2"],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                conn.close()
+            except (ConnectionError, OSError):
+                time.sleep(0.005)
+                continue
+            if response.status >= 500:
+                raise RuntimeError(f"{path} returned {response.status}")
+            return time.perf_counter() - started
+        raise RuntimeError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/healthz/ready")
+    args = parser.parse_args()
+
+    # Migrate a throwaway database once; every gunicorn run reuses it
+    setup_django()
+    for preload in ("false", "true"):
+        env = {**os.environ, "GUNICORN_PRELOAD": preload}
+        samples = [time_to_first_byte(args.path, env) for _ in range(args.runs)]
+        print(
+            f"preload={preload:<5}  {args.path}  "
+            f"median {statistics.median(samples) * 1000:7.1f} ms  "
+            f"min {min(samples) * 1000:7.1f} ms  max {max(samples) * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Gunicorn config for benchmarks that adds a fixed delay to every SQL query,
+standing in for the network round trip to a managed PostgreSQL. The delay
+sleeps, so like a real round trip it holds the thread but not the GIL.
+
+    gunicorn -c python:benchmarks.db_latency ...   # BENCH_DB_LATENCY_MS=2
+"""
+
+import os
+import time
+
+LATENCY = float(os.environ.get("BENCH_DB_LATENCY_MS", "2")) / 1000
+
+
+def _delay(execute, sql, params, many, context):
+    time.sleep(LATENCY)
+    return execute(sql, params, many, context)
+
+
+def _add_delay(sender, connection, **kwargs):
+    connection.execute_wrappers.append(_delay)
+
+
+def post_worker_init(worker):
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_add_delay, weak=False)
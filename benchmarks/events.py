@@ -0,0 +1,155 @@
+"""
+Idle server-sent event streams held by one ASGI worker.
+
+    python -m benchmarks.events [--streams 2000] [--writes 5]
+
+Starts gunicorn with one uvicorn worker (as the Docker image does with
+SERVER_INTERFACE=asgi), opens ``--streams`` connections to /api/events/ for
+one user and keeps them idle. Then each write is posted through the API
+and the script times how long it takes to reach every stream. Reports the
+worker's threads and resident memory with all streams open.
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.cold_start import free_port
+from benchmarks.harness import REPO_ROOT, create_users, setup_django
+
+
+def worker_stats(pid):
+    """(threads, RSS in MiB) of every child of the gunicorn master ``pid``"""
+    threads = rss = 0
+    children = open(f"/proc/{pid}/task/{pid}/children").read().split()
+    for child in children:
+        status = dict(
+            line.split(":", 1) for line in open(f"/proc/{child}/status").read().splitlines() if ":" in line
+        )
+        threads += int(status["Threads"])
+        rss += int(status["VmRSS"].split()[0]) / 1024
+    return threads, rss
+
+
+def wait_for_server(port, timeout=60):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/healthz/ready")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server did not answer in time")
+
+
+async def open_stream(port, cookie):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /api/events/ HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n"
+        f"Cookie: {cookie}\r\n\r\n".encode()
+    )
+    await writer.drain()
+    # Headers, then the retry hint and the current balance
+    buffer = b""
+    while b"event: balance" not in buffer:
+        chunk = await reader.read(4096)
+        if not chunk:
+            raise RuntimeError(f"stream closed: {buffer[:200]!r}")
+        buffer += chunk
+    return reader, writer
+
+
+async def next_balance(reader):
+    buffer = b""
+    while b"event: balance" not in buffer:
+        buffer += await reader.read(4096)
+    return time.perf_counter()
+
+
+def post_transaction(port, cookie, csrf_token, amount):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    body = json.dumps({"transaction_type": "expense", "amount": amount, "category": "Load"})
+    conn.request("POST", "/api/transactions/", body, {
+        "Content-Type": "application/json", "Cookie": cookie, "X-CSRFToken": csrf_token,
+        "Referer": f"http://127.0.0.1:{port}/", "Host": f"127.0.0.1:{port}",
+    })
+    response = conn.getresponse()
+    response.read()
+    if response.status != 201:
+        raise RuntimeError(f"POST /api/transactions/ returned {response.status}")
+
+
+async def run(port, cookie, csrf_token, streams, writes, pid):
+    started = time.perf_counter()
+    connections = []
+    for start in range(0, streams, 200):
+        connections += await asyncio.gather(*(open_stream(port, cookie) for _ in range(start, min(streams, start + 200))))
+    print(f"opened {len(connections)} streams in {time.perf_counter() - started:.1f} s")
+    threads, rss = worker_stats(pid)
+    print(f"worker with streams open: {threads} threads, {rss:.0f} MiB RSS")
+
+    for i in range(writes):
+        waiting = [asyncio.create_task(next_balance(reader)) for reader, _ in connections]
+        sent = time.perf_counter()
+        await asyncio.to_thread(post_transaction, port, cookie, csrf_token, f"{i + 1}.00")
+        delays = sorted(received - sent for received in await asyncio.gather(*waiting))
+        print(
+            f"write {i + 1}: reached {len(delays)} streams  "
+            f"p50 {statistics.median(delays) * 1000:7.1f} ms  max {delays[-1] * 1000:7.1f} ms"
+        )
+    for _, writer in connections:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=5)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    setup_django()
+    from django.conf import settings
+    from django.middleware.csrf import _get_new_csrf_string
+    from django.test import Client
+
+    user = create_users(1, prefix="events")[0]
+    client = Client()
+    client.force_login(user)
+    csrf_token = _get_new_csrf_string()
+    cookie = (
+        f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; "
+        f"{settings.CSRF_COOKIE_NAME}={csrf_token}"
+    )
+
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "backend.asgi:application",
+         "--worker-class", "uvicorn_worker.UvicornWorker",
+         "--bind", f"127.0.0.1:{port}", "--workers", "1", "--backlog", str(max(2048, args.streams))],
+        cwd=REPO_ROOT,
+        env={**os.environ, "GUNICORN_PRELOAD": "false"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(port)
+        asyncio.run(run(port, cookie, csrf_token, args.streams, args.writes, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Shared helpers for the benchmark scripts in this package.
+
+Each script is run as a module from the repository root, e.g.
+``python -m benchmarks.sessions``. Unless DATABASE_URL is set, the harness
+points Django at a throwaway SQLite file so benchmarks never touch
+``db.sqlite3``.
+"""
+
+import atexit
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(migrate=True):
+    """Configure Django for a benchmark process and migrate a fresh database"""
+    if not os.environ.get("DATABASE_URL"):
+        db_dir = tempfile.mkdtemp(prefix="bench-")
+        atexit.register(shutil.rmtree, db_dir, ignore_errors=True)
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(db_dir) / 'bench.sqlite3'}"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    os.environ.setdefault("DJANGO_DEBUG", "true")
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+
+    import django
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+        call_command("migrate", verbosity=0)
+
+
+def create_users(count, prefix="bench", password="bench-pass"):
+    """Create ``count`` users (profiles are created by the post_save signal)"""
+    from django.contrib.auth.models import User
+
+    users = []
+    for i in range(count):
+        user = User.objects.create_user(username=f"{prefix}{i}", password=password)
+        users.append(user)
+    return users
+
+
+@dataclass
+class Result:
+    name: str
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def requests(self):
+        return len(self.latencies) + self.errors
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        ok = len(self.latencies)
+        rps = ok / self.elapsed if self.elapsed else 0.0
+        mean = statistics.fmean(self.latencies) if self.latencies else 0.0
+        return (
+            f"{self.name:<28} {ok:>6} ok {self.errors:>4} err  "
+            f"{rps:>8.1f} req/s  mean {mean * 1000:7.2f} ms  "
+            f"p50 {self.percentile(50) * 1000:7.2f} ms  "
+            f"p95 {self.percentile(95) * 1000:7.2f} ms"
+        )
+
+
+def run_concurrent(name, worker, threads, iterations, setup=None):
+    """
+    Call ``worker(state, i)`` ``iterations`` times from each of ``threads`` threads.
+
+    ``setup(thread_index)`` builds per-thread state (e.g. a logged-in test
+    client). A worker signals failure by raising; the exception is counted
+    as an error rather than aborting the run.
+    """
+    from django.db import connections
+
+    result = Result(name)
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def run(thread_index):
+        state = setup(thread_index) if setup else None
+        latencies, errors = [], 0
+        barrier.wait()
+        for i in range(iterations):
+            started = time.perf_counter()
+            try:
+                worker(state, i)
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+        connections.close_all()
+        with lock:
+            result.latencies.extend(latencies)
+            result.errors += errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run_variants(module, variants, extra_args=()):
+    """
+    Re-run ``module`` once per variant in a fresh interpreter.
+
+    Settings are read once at import, so comparing e.g. two session engines
+    needs one process per configuration. ``variants`` maps a label to the
+    environment overrides for that run.
+    """
+    for label, env in variants.items():
+        print(f"--- {label}", flush=True)
+        subprocess.run(
+            [sys.executable, "-m", module, "--child", *extra_args],
+            cwd=REPO_ROOT,
+            env={**os.environ, **env},
+            check=True,
+        )
+
+
+def ensure_ok(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f"unexpected status {response.status_code}")
+    return response
@@ -0,0 +1,63 @@
+"""
+Compare session engines under concurrent authenticated traffic.
+
+    python -m benchmarks.sessions [--threads 8] [--iterations 200]
+
+Every request loads the session; one in ten also writes to it (as an OTP
+verification does), which is where SQLite serializes writers.
+
+signed_cookies is left out: it has no server-side storage, so its save is
+not a round trip comparable to the others, and it cannot hold the OTP flag
+safely (see settings.py).
+"""
+
+import argparse
+
+from benchmarks.harness import create_users, ensure_ok, run_concurrent, run_variants, setup_django
+
+ENGINES = ["db", "cached_db", "cache"]
+
+
+def child(args):
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+
+    users = create_users(args.threads)
+
+    def setup(thread_index):
+        client = Client()
+        client.login(username=users[thread_index].username, password="bench-pass")
+        return client
+
+    def worker(client, i):
+        ensure_ok(client.get("/api/profiles/my_profile/"))
+        if i % 10 == 0:
+            session = client.session
+            session["otp_verified"] = True
+            session.save()
+            ensure_ok(client.get("/api/auth/whoami/"))
+
+    result = run_concurrent(settings.SESSION_ENGINE.rsplit(".", 1)[-1], worker, args.threads, args.iterations, setup)
+    print(result.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+    run_variants(
+        "benchmarks.sessions",
+        {engine: {"DJANGO_SESSION_ENGINE": engine} for engine in ENGINES},
+        ["--threads", str(args.threads), "--iterations", str(args.iterations)],
+    )
+
+
+if __name__ == "__main__":
+    main()
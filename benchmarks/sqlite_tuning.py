@@ -0,0 +1,64 @@
+"""
+Concurrent read/write load on SQLite with and without the tuning profile.
+
+    python -m benchmarks.sqlite_tuning [--threads 8] [--iterations 200] [--write-ratio 0.2]
+
+Each thread is a different user mixing summary reads with transaction
+writes. Without WAL and a busy timeout, readers wait behind writers and
+writers fail with "database is locked" (counted as errors).
+"""
+
+import argparse
+import json
+
+from benchmarks.harness import create_users, ensure_ok, run_concurrent, run_variants, setup_django
+
+
+def child(args):
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+
+    users = create_users(args.threads)
+    write_every = max(1, round(1 / args.write_ratio)) if args.write_ratio else 0
+    payload = json.dumps({"transaction_type": "expense", "amount": "12.50", "category": "Food"})
+
+    def setup(thread_index):
+        client = Client()
+        client.login(username=users[thread_index].username, password="bench-pass")
+        return client
+
+    def worker(client, i):
+        if write_every and i % write_every == 0:
+            ensure_ok(client.post("/api/transactions/", payload, content_type="application/json"), 201)
+        else:
+            ensure_ok(client.get("/api/transactions/summary/"))
+
+    label = "tuned" if settings.SQLITE_PRAGMAS else "default"
+    print(run_concurrent(label, worker, args.threads, args.iterations, setup).summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+    run_variants(
+        "benchmarks.sqlite_tuning",
+        {
+            "default": {"DJANGO_SQLITE_TUNING": "false"},
+            "tuned": {"DJANGO_SQLITE_TUNING": "true"},
+        },
+        ["--threads", str(args.threads), "--iterations", str(args.iterations),
+         "--write-ratio", str(args.write_ratio)],
+    )
+
+
+if __name__ == "__main__":
+    main()
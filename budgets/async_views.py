@@ -0,0 +1,58 @@
+"""Async versions of the budget analytics views (see transactions.async_views)"""
+
+import asyncio
+
+from backend.replica import use_read_replica
+from transactions.analytics import aget_frame
+from transactions.async_views import alist, analytics_view, respond
+from transactions.coalesce import acoalesced
+from transactions.dashboard import build_category_stats, summarize_budgets
+from .models import Budget
+from .views import year_month
+
+
+async def _budgets_and_frame(user, **filters):
+    budgets, frame = await asyncio.gather(
+        alist(Budget.objects.filter(user=user, is_active=True, **filters)), aget_frame(user.pk),
+    )
+    for budget in budgets:
+        # Spending is computed here, on the loop; a lookup could query
+        budget.use_frame(frame)
+    return budgets, frame
+
+
+@analytics_view
+@use_read_replica
+async def budget_summary(request):
+    """Get comprehensive budget summary for a specific period"""
+    try:
+        year, month = year_month(request.GET)
+    except ValueError:
+        return respond({'error': 'year and month must be integers'}, 400)
+    week = request.GET.get('week')
+    period = request.GET.get('period', 'monthly')
+    user = request.user
+
+    async def compute():
+        budgets, _ = await _budgets_and_frame(user, period=period)
+        return summarize_budgets(budgets, year, month, week, period)
+
+    params = {'year': year, 'month': month, 'week': week or '', 'period': period}
+    return respond(await acoalesced('budget_summary', user.pk, params, compute))
+
+
+@analytics_view
+@use_read_replica
+async def category_stats(request):
+    """Get spending statistics by category with budget comparison"""
+    try:
+        year, month = year_month(request.GET)
+    except ValueError:
+        return respond({'error': 'year and month must be integers'}, 400)
+    user = request.user
+
+    async def compute():
+        budgets, frame = await _budgets_and_frame(user, period='monthly')
+        return build_category_stats(frame, budgets, year, month)
+
+    return respond(await acoalesced('category_stats', user.pk, {'year': year, 'month': month}, compute))
@@ -0,0 +1,55 @@
+# Generated by Django 5.1 on 2026-10-19 02:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_existing_rows(apps, schema_editor):
+    """Give existing rows distinct change numbers so a first sync can page through them"""
+    db = schema_editor.connection.alias
+    UserProfile = apps.get_model('transactions', 'UserProfile')
+    synced = [
+        (apps.get_model('transactions', 'Transaction'), 'user_id'),
+        (apps.get_model('budgets', 'Budget'), 'user_id'),
+        (apps.get_model('budgets', 'BudgetAlert'), 'budget__user_id'),
+    ]
+    for profile in UserProfile.objects.using(db).order_by('pk').iterator():
+        seq = profile.change_seq
+        for model, lookup in synced:
+            rows = list(model.objects.using(db).filter(**{lookup: profile.user_id}).order_by('pk').only('pk'))
+            for row in rows:
+                seq += 1
+                row.change_seq = seq
+            model.objects.using(db).bulk_update(rows, ['change_seq'], batch_size=1000)
+        UserProfile.objects.using(db).filter(pk=profile.pk).update(change_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0001_initial'),
+        ('transactions', '0009_sync_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='budgetalert',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'change_seq'], name='budget_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetalert',
+            index=models.Index(fields=['budget', 'change_seq'], name='budget_alert_sync_idx'),
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-19 03:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0002_sync_sequence'),
+        ('transactions', '0010_categories'),
+    ]
+
+    operations = [
+        # Nullable until transactions 0011 has filled it in
+        migrations.AddField(
+            model_name='budget',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='budgets', to='transactions.category'),
+        ),
+    ]
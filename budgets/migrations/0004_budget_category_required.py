@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-19 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0003_budget_category_ref'),
+        ('transactions', '0011_normalize_categories'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='budget',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='budgets', to='transactions.category'),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'category_ref'], name='budget_category_idx'),
+        ),
+    ]
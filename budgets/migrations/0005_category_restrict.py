@@ -0,0 +1,20 @@
+# Generated by Django 5.1 on 2026-10-19 03:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0004_budget_category_required'),
+        ('transactions', '0013_category_restrict'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='budget',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.RESTRICT, related_name='budgets', to='transactions.category'),
+        ),
+    ]
@@ -1,11 +1,14 @@
-from django.db import models
+from django.db import models, router
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 import calendar
 
-class Budget(models.Model):
+from transactions.models import Category, ChangeTracked, assign_categories
+
+class Budget(ChangeTracked):
     PERIOD_CHOICES = [
         ('weekly', 'Weekly'),
         ('monthly', 'Monthly'),
@@ -21,6 +24,8 @@ class Budget(models.Model):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
     category = models.CharField(max_length=100)
+    # Set from ``category`` on save
+    category_ref = models.ForeignKey(Category, on_delete=models.RESTRICT, related_name='budgets', editable=False)
     amount = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -31,48 +36,85 @@ class Budget(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    sync_kind = 'budget'
+    
     class Meta:
         unique_together = ['user', 'category', 'period']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='budget_sync_idx'),
+            models.Index(fields=['user', 'category_ref'], name='budget_category_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.category} ({self.period}): ${self.amount}"
     
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'category' in update_fields:
+            assign_categories([self], kwargs.get('using') or router.db_for_write(Budget, instance=self))
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'category_ref'}
+        super().save(*args, **kwargs)
+    
+    def sync_tombstones(self):
+        # Alerts go with their budget
+        return super().sync_tombstones() + [('alert', pk) for pk in self.alerts.values_list('pk', flat=True)]
+    
     def get_spent_amount(self, year=None, month=None, week=None):
         """Calculate spent amount for the current period"""
-        from transactions.models import Transaction  # Avoid circular import
+        from transactions.analytics import get_frame  # Avoid circular import
         
+        # Derived fields (remaining, percentage, status...) all start from the
+        # spent amount, so remember it per period on this instance
+        cache_key = (self.category_ref_id, self.period, year, month, week)
+        spent_cache = self.__dict__.setdefault('_spent_cache', {})
+        if cache_key in spent_cache:
+            return spent_cache[cache_key]
+        
+        # Every budget of the user reads the same cached columnar frame; the
+        # async views hand it over up front (see use_frame)
+        start, end = self.get_period_bounds(year, month, week)
+        frame = self.__dict__.get('_frame')
+        if frame is None:
+            frame = get_frame(self.user_id)
+        spent_cache[cache_key] = frame.total(
+            frame.select('expense', start=start, end=end, category_id=self.category_ref_id)
+        )
+        return spent_cache[cache_key]
+    
+    def use_frame(self, frame):
+        """Compute spending from ``frame`` instead of looking it up"""
+        self.__dict__['_frame'] = frame
+    
+    def get_period_bounds(self, year=None, month=None, week=None):
+        """
+        Return the [start, end) datetimes of the period in the current time
+        zone. Plain range bounds map onto the date index and, on PostgreSQL,
+        monthly partitions, as well as onto the analytics frame's dates.
+        """
         # Get current date if not provided
         now = datetime.now()
         target_year = year or now.year
         target_month = month or now.month
-        
-        # Filter transactions based on period
-        transactions = Transaction.objects.filter(
-            user=self.user,
-            category=self.category,
-            transaction_type='expense',
-            date__year=target_year
-        )
+        year_start = datetime(target_year, 1, 1)
+        year_end = datetime(target_year + 1, 1, 1)
         
         if self.period == 'monthly':
-            transactions = transactions.filter(date__month=target_month)
+            start = datetime(target_year, target_month, 1)
+            end = datetime(target_year + target_month // 12, target_month % 12 + 1, 1)
         elif self.period == 'weekly':
             # Use provided ISO week or current week by default
-            import datetime as dt
-            iso_week = week
-            if not iso_week:
-                iso_week = datetime.isocalendar(now).week if hasattr(datetime, 'isocalendar') else now.isocalendar()[1]
-            week_start = dt.datetime.strptime(f"{target_year}-W{int(iso_week):02d}-1", "%Y-W%W-%w").date()
-            week_end = week_start + dt.timedelta(days=6)
-            transactions = transactions.filter(date__date__range=[week_start, week_end])
-        elif self.period == 'yearly':
-            # Already filtered by year
-            pass
+            iso_week = week or now.isocalendar()[1]
+            week_start = datetime.strptime(f"{target_year}-W{int(iso_week):02d}-1", "%Y-W%W-%w")
+            # Weeks are clipped to the target year
+            start = max(week_start, year_start)
+            end = min(week_start + timedelta(days=7), year_end)
+        else:
+            start, end = year_start, year_end
         
-        return transactions.aggregate(
-            total=models.Sum('amount')
-        )['total'] or Decimal('0.00')
+        tz = timezone.get_current_timezone()
+        return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
     
     def get_remaining_amount(self, year=None, month=None, week=None):
         """Calculate remaining budget amount"""
@@ -139,7 +181,7 @@ class Budget(models.Model):
         return remaining_amount / days_remaining if remaining_amount > 0 else Decimal('0.00')
 
 
-class BudgetAlert(models.Model):
+class BudgetAlert(ChangeTracked):
     ALERT_TYPES = [
         ('warning', 'Warning - 80% reached'),
         ('over', 'Over Budget'),
@@ -153,11 +195,18 @@ class BudgetAlert(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    sync_kind = 'alert'
+    sync_user_lookup = 'budget__user_id'
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['budget', 'change_seq'], name='budget_alert_sync_idx')]
     
     def __str__(self):
         return f"{self.budget.user.username} - {self.alert_type}: {self.budget.category}"
+    
+    def sync_user_id(self):
+        return self.budget.user_id
 
 
 class BudgetTemplate(models.Model):
@@ -0,0 +1,71 @@
+"""
+Budget recommendations from per-calendar-month spending.
+
+The user's expenses over the last ``months`` complete calendar months are
+grouped into a category x month matrix (zeros included) in one pass over
+the analytics frame. Each category is recommended its median month, moved
+by the least-squares trend projected one month ahead and kept between the
+25th and 90th percentile, so a single unusual month neither drives nor
+hides the amount.
+"""
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from transactions.analytics import cents_to_decimal, data_version, get_frame, period_index
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def recommend(frame, months=3, now=None):
+    import numpy as np
+
+    now = timezone.localtime(now)
+    current = int(period_index(np.array([now.replace(tzinfo=None)], dtype='datetime64[us]'), 'month')[0])
+    first = current - months
+    index = frame.period_index('month')
+    mask = frame.is_expense & (index >= first) & (index < current)
+    size = len(frame.categories)
+
+    matrix = np.zeros((size, months))
+    np.add.at(matrix, (frame.category_codes[mask], index[mask] - first), frame.cents[mask])
+    counts = np.bincount(frame.category_codes[mask], minlength=size)
+
+    median = np.median(matrix, axis=1)
+    low, high = np.percentile(matrix, [25, 90], axis=1)
+    x = np.arange(months) - (months - 1) / 2
+    slope = matrix @ x / (x @ x) if months > 1 else np.zeros(size)
+    # The median sits at the middle of the window; next month is
+    # (months + 1) / 2 months later
+    recommended = np.clip(median + slope * (months + 1) / 2, low, high)
+    totals = matrix.sum(axis=1)
+
+    recommendations = []
+    for code in np.argsort(-totals, kind='stable').tolist():
+        category = frame.categories[code]
+        if not counts[code] or not category:
+            continue
+        count = int(counts[code])
+        recommendations.append({
+            'category': category,
+            'recommended_amount': cents_to_decimal(round(recommended[code])),
+            'average_spending': cents_to_decimal(round(totals[code] / months)),
+            'median_spending': cents_to_decimal(round(median[code])),
+            'monthly_trend': cents_to_decimal(round(slope[code])),
+            'total_spent': cents_to_decimal(round(totals[code])),
+            'confidence': 'high' if count >= 10 else 'medium' if count >= 5 else 'low',
+            'months_analyzed': months,
+            'transaction_count': count,
+        })
+    return recommendations
+
+
+def cached_recommendations(user, months=3):
+    """recommend() for ``user``, cached until their data version or the month changes"""
+    now = timezone.localtime()
+    key = f"budget_recommendations:{user.pk}:{data_version(user.pk)}:{months}:{now:%Y-%m}"
+    result = cache.get(key)
+    if result is None:
+        result = recommend(get_frame(user.pk), months, now)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
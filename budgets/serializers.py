@@ -2,8 +2,10 @@ from rest_framework import serializers
 from .models import Budget, BudgetAlert, BudgetTemplate
 from decimal import Decimal
 from datetime import datetime
+from transactions.models import category_key
+from transactions.serializers import SparseFieldsMixin
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     spent = serializers.SerializerMethodField()
     remaining = serializers.SerializerMethodField()
     percentage = serializers.SerializerMethodField()
@@ -90,7 +92,7 @@ class BudgetSerializer(serializers.ModelSerializer):
         period = data.get('period', 'monthly')
         
         # For updates, exclude current instance
-        queryset = Budget.objects.filter(user=user, category=category, period=period)
+        queryset = Budget.objects.filter(user=user, category_ref__key=category_key(category or ''), period=period)
         if self.instance:
             queryset = queryset.exclude(pk=self.instance.pk)
         
@@ -149,6 +151,8 @@ class BudgetRecommendationSerializer(serializers.Serializer):
     category = serializers.CharField()
     recommended_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     average_spending = serializers.DecimalField(max_digits=10, decimal_places=2)
+    median_spending = serializers.DecimalField(max_digits=10, decimal_places=2)
+    monthly_trend = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_spent = serializers.DecimalField(max_digits=10, decimal_places=2)
     confidence = serializers.ChoiceField(choices=['low', 'medium', 'high'])
     months_analyzed = serializers.IntegerField()
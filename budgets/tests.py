@@ -0,0 +1,121 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from transactions.analytics import get_frame
+from transactions.models import Transaction
+from .models import Budget
+from .recommendations import recommend
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class BudgetPeriodTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gail', password='pw')
+        for when, amount in [
+            (aware(2024, 2, 29, 23, 59), '10.00'),   # last minute of February
+            (aware(2024, 3, 1, 0, 0), '20.00'),      # first minute of March
+            (aware(2024, 12, 30, 12, 0), '40.00'),   # week spanning the new year
+            (aware(2025, 1, 2, 12, 0), '80.00'),
+        ]:
+            Transaction.objects.create(
+                user=self.user, transaction_type='expense', amount=Decimal(amount),
+                category='Food', date=when,
+            )
+
+    def budget(self, period):
+        return Budget.objects.create(user=self.user, category='Food', amount=Decimal('500'), period=period)
+
+    def test_monthly_bounds(self):
+        budget = self.budget('monthly')
+        self.assertEqual(budget.get_spent_amount(2024, 2), Decimal('10.00'))
+        self.assertEqual(budget.get_spent_amount(2024, 3), Decimal('20.00'))
+        self.assertEqual(budget.get_spent_amount(2024, 12), Decimal('40.00'))
+
+    def test_weekly_bounds_are_clipped_to_year(self):
+        budget = self.budget('weekly')
+        # %W week 53 of 2024 starts Monday 2024-12-30
+        self.assertEqual(budget.get_spent_amount(2024, week='53'), Decimal('40.00'))
+
+    def test_yearly_bounds(self):
+        budget = self.budget('yearly')
+        self.assertEqual(budget.get_spent_amount(2024), Decimal('70.00'))
+        self.assertEqual(budget.get_spent_amount(2025), Decimal('80.00'))
+
+
+
+class BudgetRecommendationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gail', password='pw')
+        for month in range(1, 7):
+            for category, amount in [('Rent', 1000), ('Food', 100 * month)]:
+                Transaction.objects.create(
+                    user=self.user, transaction_type='expense', amount=Decimal(amount),
+                    category=category, date=aware(2026, month, 28, 23, 30),
+                )
+        # Current, incomplete month is left out
+        Transaction.objects.create(
+            user=self.user, transaction_type='expense', amount=Decimal('5000'),
+            category='Rent', date=aware(2026, 7, 1),
+        )
+
+    def test_median_trend_and_percentile_cap(self):
+        result = {row['category']: row for row in recommend(get_frame(self.user.pk), 6, aware(2026, 7, 15))}
+        self.assertEqual(result['Rent']['recommended_amount'], Decimal('1000.00'))
+        self.assertEqual(result['Rent']['monthly_trend'], Decimal('0.00'))
+        # Median 350 trending +100/month would project 700; capped at the 90th percentile
+        self.assertEqual(result['Food']['median_spending'], Decimal('350.00'))
+        self.assertEqual(result['Food']['monthly_trend'], Decimal('100.00'))
+        self.assertEqual(result['Food']['recommended_amount'], Decimal('550.00'))
+
+    def test_endpoint_validates_and_caches(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/budgets/recommendations/?months=0').status_code, 400)
+        self.assertEqual(client.get('/api/budgets/recommendations/').status_code, 200)
+        # Only the data version is read
+        with self.assertNumQueries(1):
+            client.get('/api/budgets/recommendations/')
+
+
+class BudgetCategoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='hana', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for amount, category in [('30.00', 'Food'), ('20.00', ' food '), ('5.00', 'Eating  Out')]:
+            self.client.post('/api/transactions/', {
+                'transaction_type': 'expense', 'amount': amount, 'category': category,
+            }, format='json')
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'income', 'amount': '900.00', 'category': 'Salary',
+        }, format='json')
+
+    def test_category_list_is_per_category(self):
+        response = self.client.get('/api/budgets/categories/')
+        self.assertEqual(response.json(), {'categories': ['Eating Out', 'Food']})
+
+    def test_budgets_join_spelling_variants(self):
+        response = self.client.post(
+            '/api/budgets/', {'category': 'FOOD', 'amount': '60.00', 'period': 'monthly'}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['category'], 'Food')
+        self.assertEqual(Decimal(str(response.json()['spent'])), Decimal('50.00'))
+        duplicate = self.client.post(
+            '/api/budgets/', {'category': 'food', 'amount': '10.00', 'period': 'monthly'}, format='json',
+        )
+        self.assertEqual(duplicate.status_code, 400)
+
+        stats = {row['category']: row for row in self.client.get('/api/budgets/category-stats/').json()['category_stats']}
+        self.assertEqual(set(stats), {'Food', 'Eating Out'})
+        self.assertEqual(stats['Food']['transaction_count'], 2)
+        self.assertTrue(stats['Food']['has_budget'])
+        self.assertFalse(stats['Eating Out']['has_budget'])
@@ -2,19 +2,27 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
-from datetime import datetime, timedelta
-from decimal import Decimal
 import calendar
 
 from .models import Budget, BudgetAlert, BudgetTemplate
 from .serializers import (
-    BudgetSerializer, BudgetSummarySerializer, BudgetAlertSerializer,
+    BudgetSerializer, BudgetAlertSerializer,
     BudgetTemplateSerializer, BudgetRecommendationSerializer,
-    CategoryStatsSerializer
 )
-from transactions.models import Transaction
+from transactions.models import Category, Transaction
+from backend.replica import use_read_replica
+from transactions.analytics import get_frame
+from transactions.coalesce import coalesced
+from transactions.dashboard import build_category_stats, summarize_budgets
+from .recommendations import cached_recommendations
+
+
+def year_month(params):
+    """The ``year`` and ``month`` query parameters, this month by default; raises ValueError"""
+    now = timezone.now()
+    return int(params.get('year', now.year)), int(params.get('month', now.month))
 
 
 class BudgetListCreateView(generics.ListCreateAPIView):
@@ -55,79 +63,24 @@ class BudgetDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_read_replica
 def budget_summary(request):
     """Get comprehensive budget summary for a specific period"""
     user = request.user
-    year = int(request.query_params.get('year', timezone.now().year))
-    month = int(request.query_params.get('month', timezone.now().month))
+    try:
+        year, month = year_month(request.query_params)
+    except ValueError:
+        return Response({'error': 'year and month must be integers'}, status=status.HTTP_400_BAD_REQUEST)
     week = request.query_params.get('week')
     period = request.query_params.get('period', 'monthly')
     
-    # Get user's active budgets
-    budgets = Budget.objects.filter(user=user, is_active=True, period=period)
-    
-    if not budgets.exists():
-        return Response({
-            'total_budgets': 0,
-            'total_budget_amount': '0.00',
-            'total_spent': '0.00',
-            'total_remaining': '0.00',
-            'average_percentage_used': 0,
-            'budgets_over_limit': 0,
-            'budgets_at_warning': 0,
-            'budgets_on_track': 0,
-            'period': period,
-            'year': year,
-            'month': month if period == 'monthly' else None,
-            'week': week if period == 'weekly' else None
-        })
-    
-    # Calculate summary statistics
-    total_budget_amount = Decimal('0.00')
-    total_spent = Decimal('0.00')
-    total_remaining = Decimal('0.00')
-    percentage_sum = 0
-    budgets_over_limit = 0
-    budgets_at_warning = 0
-    budgets_on_track = 0
-    
-    for budget in budgets:
-        spent = budget.get_spent_amount(year, month, week)
-        remaining = budget.get_remaining_amount(year, month, week)
-        percentage = budget.get_percentage_used(year, month, week)
-        status = budget.get_status(year, month, week)
-        
-        total_budget_amount += budget.amount
-        total_spent += spent
-        total_remaining += remaining
-        percentage_sum += percentage
-        
-        if status == 'over':
-            budgets_over_limit += 1
-        elif status in ['warning', 'caution']:
-            budgets_at_warning += 1
-        else:
-            budgets_on_track += 1
-    
-    average_percentage = percentage_sum / len(budgets) if budgets else 0
-    
-    summary_data = {
-        'total_budgets': len(budgets),
-        'total_budget_amount': total_budget_amount,
-        'total_spent': total_spent,
-        'total_remaining': total_remaining,
-        'average_percentage_used': round(average_percentage, 1),
-        'budgets_over_limit': budgets_over_limit,
-        'budgets_at_warning': budgets_at_warning,
-        'budgets_on_track': budgets_on_track,
-        'period': period,
-        'year': year,
-        'month': month if period == 'monthly' else None,
-        'week': week if period == 'weekly' else None
-    }
-    
-    serializer = BudgetSummarySerializer(summary_data)
-    return Response(serializer.data)
+    def compute():
+        # Get user's active budgets
+        budgets = list(Budget.objects.filter(user=user, is_active=True, period=period))
+        return summarize_budgets(budgets, year, month, week, period)
+
+    params = {'year': year, 'month': month, 'week': week or '', 'period': period}
+    return Response(coalesced('budget_summary', user.pk, params, compute))
 
 
 @api_view(['GET'])
@@ -136,14 +89,13 @@ def budget_categories(request):
     """Get available categories from user's transactions"""
     user = request.user
     
-    # Get categories from user's expense transactions
-    expense_categories = Transaction.objects.filter(
-        user=user,
-        transaction_type='expense'
-    ).values_list('category', flat=True).distinct().order_by('category')
-    
-    # Remove empty/null categories
-    categories = [cat for cat in expense_categories if cat and cat.strip()]
+    # Categories of the user's expense transactions; each is one probe of
+    # the (user, category, date) index
+    expenses = Transaction.objects.filter(user=user, category_ref=OuterRef('pk'), transaction_type='expense')
+    categories = list(
+        Category.objects.filter(user=user).exclude(key='').filter(Exists(expenses))
+        .order_by('name').values_list('name', flat=True)
+    )
     
     # If no categories, provide defaults
     if not categories:
@@ -154,56 +106,20 @@ def budget_categories(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_read_replica
 def budget_recommendations(request):
-    """Generate budget recommendations based on spending history"""
-    user = request.user
-    months = int(request.query_params.get('months', 3))
-    
-    # Calculate date range
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=months * 30)  # Approximate month calculation
-    
-    # Get transactions in the period
-    transactions = Transaction.objects.filter(
-        user=user,
-        transaction_type='expense',
-        date__range=[start_date, end_date]
-    ).exclude(category__isnull=True).exclude(category='')
-    
-    if not transactions.exists():
-        return Response({'recommendations': []})
-    
-    # Group by category and calculate stats
-    category_stats = transactions.values('category').annotate(
-        total_spent=Sum('amount'),
-        transaction_count=Count('id'),
-        avg_transaction=Avg('amount')
-    ).order_by('-total_spent')
+    """Generate budget recommendations from the last complete calendar months"""
+    try:
+        months = int(request.query_params.get('months', 3))
+    except ValueError:
+        months = 0
+    if not 1 <= months <= 24:
+        return Response(
+            {'error': 'months must be between 1 and 24'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    recommendations = []
-    for stat in category_stats:
-        category = stat['category']
-        total_spent = stat['total_spent']
-        transaction_count = stat['transaction_count']
-        
-        # Calculate average monthly spending
-        average_monthly = total_spent / months
-        
-        # Add 10% buffer for recommended budget
-        recommended_amount = average_monthly * Decimal('1.1')
-        
-        # Determine confidence level
-        confidence = 'high' if transaction_count >= 10 else 'medium' if transaction_count >= 5 else 'low'
-        
-        recommendations.append({
-            'category': category,
-            'recommended_amount': round(recommended_amount, 2),
-            'average_spending': round(average_monthly, 2),
-            'total_spent': total_spent,
-            'confidence': confidence,
-            'months_analyzed': months,
-            'transaction_count': transaction_count
-        })
+    recommendations = cached_recommendations(request.user, months)
     
     serializer = BudgetRecommendationSerializer(recommendations, many=True)
     return Response({'recommendations': serializer.data})
@@ -211,55 +127,20 @@ def budget_recommendations(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_read_replica
 def category_stats(request):
     """Get spending statistics by category with budget comparison"""
     user = request.user
-    year = int(request.query_params.get('year', timezone.now().year))
-    month = int(request.query_params.get('month', timezone.now().month))
-    
-    # Get transactions for the period
-    transactions = Transaction.objects.filter(
-        user=user,
-        transaction_type='expense',
-        date__year=year,
-        date__month=month
-    ).exclude(category__isnull=True).exclude(category='')
-    
-    # Group by category
-    category_spending = transactions.values('category').annotate(
-        total_spent=Sum('amount'),
-        transaction_count=Count('id'),
-        avg_transaction=Avg('amount')
-    ).order_by('-total_spent')
-    
-    # Get user's budgets
-    budgets = {b.category: b for b in Budget.objects.filter(
-        user=user, 
-        is_active=True, 
-        period='monthly'
-    )}
-    
-    stats = []
-    for spending in category_spending:
-        category = spending['category']
-        budget = budgets.get(category)
-        
-        stat_data = {
-            'category': category,
-            'total_spent': spending['total_spent'],
-            'transaction_count': spending['transaction_count'],
-            'average_transaction': spending['avg_transaction'],
-            'has_budget': budget is not None
-        }
-        
-        if budget:
-            stat_data['budget_amount'] = budget.amount
-            stat_data['budget_status'] = budget.get_status(year, month)
-        
-        stats.append(stat_data)
-    
-    serializer = CategoryStatsSerializer(stats, many=True)
-    return Response({'category_stats': serializer.data})
+    try:
+        year, month = year_month(request.query_params)
+    except ValueError:
+        return Response({'error': 'year and month must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    budgets = Budget.objects.filter(user=user, is_active=True, period='monthly')
+    return Response(coalesced(
+        'category_stats', user.pk, {'year': year, 'month': month},
+        lambda: build_category_stats(get_frame(user.pk), budgets, year, month),
+    ))
 
 
 # Budget Alert Views
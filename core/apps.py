@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self) -> None:
+        from django.contrib.auth.models import User
+        from backend.sharding import mirror_user_to_shard
+        from backend.sqlite import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas)
+        # core is listed before transactions, so this runs before the
+        # profile signal that needs the mirrored row on the shard
+        post_save.connect(mirror_user_to_shard, sender=User)
+        return super().ready()
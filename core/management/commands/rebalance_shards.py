@@ -0,0 +1,175 @@
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from backend.sharding import (
+    SHARDED_MODELS, copy_user_row, hash_shard_for_user, invalidate_shard_pin,
+    pin_cache_is_shared, shard_for_user,
+)
+from core.models import UserShard
+
+# Copy parents before children so foreign keys can be remapped
+MOVE_ORDER = [
+    ("transactions.userprofile", "user_id"),
+    # Before budgets and transactions, whose category_ref_id is remapped
+    ("transactions.category", "user_id"),
+    ("budgets.budget", "user_id"),
+    ("budgets.budgetalert", "budget__user_id"),
+    # Before transactions, whose recurring_id is remapped to the copies
+    ("transactions.recurringtransaction", "user_id"),
+    ("transactions.transaction", "user_id"),
+    ("transactions.transactionarchive", "user_id"),
+    ("transactions.archivedtotal", "archive__user_id"),
+    ("transactions.categorystatistics", "user_id"),
+    ("transactions.spendinganomaly", "user_id"),
+    ("transactions.balancecheckpoint", "user_id"),
+    ("transactions.synctombstone", "user_id"),
+    ("banking.connectedaccount", "user_id"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users between shards. Run with --pin before changing "
+        "DATABASE_SHARD_URLS, then without options to move pinned users to "
+        "their hash placement, or use --user/--to for a single user. Users "
+        "being moved should not write concurrently."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pin", action="store_true",
+                            help="Record every user's current shard so a config change moves nobody")
+        parser.add_argument("--user", type=int, help="Move a single user id")
+        parser.add_argument("--to", dest="target", help="Target shard alias for --user")
+        parser.add_argument("--limit", type=int, default=None, help="Move at most this many users")
+        parser.add_argument("--dry-run", action="store_true", help="Only report planned moves")
+        parser.add_argument("--single-process", action="store_true",
+                            help="Move users without a shared cache; only while no web workers are running")
+
+    def handle(self, *args, **options):
+        if not settings.SHARD_DATABASES:
+            raise CommandError("Sharding is not configured (DATABASE_SHARD_URLS is empty).")
+
+        if options["pin"]:
+            self.pin_all(options["dry_run"])
+            return
+
+        if options["user"] is not None:
+            target = options["target"]
+            if target not in settings.SHARD_DATABASES:
+                raise CommandError(f"--to must be one of: {', '.join(settings.SHARD_DATABASES)}")
+            moves = [(options["user"], shard_for_user(options["user"]), target)]
+        else:
+            moves = [
+                (pin.user_id, pin.alias, hash_shard_for_user(pin.user_id))
+                for pin in UserShard.objects.using(DEFAULT_DB_ALIAS).order_by("user_id")
+            ]
+            moves = [move for move in moves if move[1] != move[2]]
+        moves = moves[: options["limit"]] if options["limit"] else moves
+        if moves and not options["dry_run"] and not options["single_process"] and not pin_cache_is_shared():
+            # Workers would keep reading and writing the emptied source shard
+            # until their cached pin expires, orphaning those writes
+            raise CommandError(
+                "Moving users needs a shared cache (DJANGO_REDIS_URL) so every worker sees the new "
+                "placement at once. Stop the web workers and pass --single-process to move anyway."
+            )
+
+        for user_id, source, target in moves:
+            if options["dry_run"]:
+                self.stdout.write(f"Would move user {user_id}: {source} -> {target}")
+                continue
+            counts = self.move_user(user_id, source, target)
+            self.stdout.write(f"Moved user {user_id}: {source} -> {target} ({counts} rows)")
+        self.stdout.write(self.style.SUCCESS(f"{len(moves)} user(s) {'to move' if options['dry_run'] else 'moved'}."))
+
+    def pin_all(self, dry_run):
+        pinned = set(UserShard.objects.using(DEFAULT_DB_ALIAS).values_list("user_id", flat=True))
+        pins = [
+            UserShard(user_id=user_id, alias=shard_for_user(user_id))
+            for user_id in User.objects.using(DEFAULT_DB_ALIAS).values_list("pk", flat=True)
+            if user_id not in pinned
+        ]
+        if not dry_run:
+            UserShard.objects.using(DEFAULT_DB_ALIAS).bulk_create(pins, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Pinned {len(pins)} user(s) to their current shard."))
+
+    def move_user(self, user_id, source, target):
+        """
+        Copy the user's rows to ``target``, switch the pin, then delete them
+        from ``source``. Copies get new primary keys (ids are per shard).
+        Re-running after a failure first clears any partial copy on target.
+        """
+        if source == target:
+            return 0
+        models = [(apps.get_model(label), lookup) for label, lookup in MOVE_ORDER if self.installed(label)]
+        assert {model._meta.label_lower for model, _ in models} <= SHARDED_MODELS
+        user = User.objects.using(DEFAULT_DB_ALIAS).get(pk=user_id)
+        copied = 0
+
+        with transaction.atomic(using=target):
+            copy_user_row(user, target)
+            for model, lookup in reversed(models):
+                model._base_manager.using(target).filter(**{lookup: user_id}).delete()
+            pk_maps = {}
+            for model, lookup in models:
+                rows = list(model._base_manager.using(source).filter(**{lookup: user_id}).order_by("pk"))
+                pk_maps[model] = self.copy_rows(model, rows, target, pk_maps)
+                copied += len(rows)
+            # The copies have new ids, so sync cursors from before the move
+            # must start over
+            apps.get_model("transactions", "UserProfile").objects.using(target).filter(user_id=user_id).update(
+                change_seq=F("change_seq") + 1, sync_reset=F("change_seq") + 1, data_version=time.time_ns(),
+            )
+
+        # Switch reads and writes over before removing the source copy
+        if target == hash_shard_for_user(user_id):
+            UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).delete()
+        else:
+            UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+                user_id=user_id, defaults={"alias": target},
+            )
+        invalidate_shard_pin(user_id)
+
+        with transaction.atomic(using=source):
+            for model, lookup in reversed(models):
+                model._base_manager.using(source).filter(**{lookup: user_id}).delete()
+        return copied
+
+    def copy_rows(self, model, rows, target, pk_maps):
+        """bulk_create ``rows`` on ``target`` and return {old_pk: new_pk}"""
+        old_pks = [row.pk for row in rows]
+        preserved = []
+        for row in rows:
+            for field in model._meta.concrete_fields:
+                related = field.related_model
+                value = getattr(row, field.attname)
+                if related in pk_maps and value is not None:
+                    setattr(row, field.attname, pk_maps[related][value])
+            # auto_now(_add) fields are overwritten on insert; restore after
+            preserved.append({
+                field.attname: getattr(row, field.attname)
+                for field in model._meta.concrete_fields
+                if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+            })
+            row.pk = None
+            row._state.adding = True
+            row._state.db = None
+        created = model._base_manager.using(target).bulk_create(rows, batch_size=500)
+        for row, values in zip(created, preserved):
+            if values:
+                model._base_manager.using(target).filter(pk=row.pk).update(**values)
+        return dict(zip(old_pks, (row.pk for row in created)))
+
+    @staticmethod
+    def installed(label):
+        app_label, model_name = label.split(".")
+        try:
+            apps.get_model(app_label, model_name)
+        except LookupError:
+            return False
+        return True
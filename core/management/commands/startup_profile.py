@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import os
+import subprocess
+import sys
+
+# Imports the same modules a gunicorn worker loads before serving its first
+# request: Django setup, the WSGI app and the root URLconf.
+STARTUP_SCRIPT = """
+import django
+django.setup()
+import backend.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+
+class Command(BaseCommand):
+    help = "Report per-module import time of a cold start (python -X importtime)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=25,
+            help="Number of rows to print (default: 25)",
+        )
+        parser.add_argument(
+            "--by",
+            choices=["package", "module"],
+            default="package",
+            help="Group by top-level package (default) or report each module",
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings")}
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            self.stderr.write(proc.stderr[-2000:])
+            return
+
+        # Lines look like: "import time:  self [us] | cumulative | imported package"
+        totals = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            name = name.strip()
+            if options["by"] == "package":
+                key = name.split(".")[0]
+                totals[key] = totals.get(key, 0) + int(self_us)
+            else:
+                totals[name] = int(cumulative_us)
+
+        total_us = sum(totals.values()) if options["by"] == "package" else None
+        label = "self ms" if options["by"] == "package" else "cumulative ms"
+        self.stdout.write(f"{label:>14}  {'module':<50}")
+        for name, us in sorted(totals.items(), key=lambda item: -item[1])[: options["limit"]]:
+            self.stdout.write(f"{us / 1000:>14.1f}  {name:<50}")
+        if total_us is not None:
+            self.stdout.write(self.style.SUCCESS(f"Total import time: {total_us / 1000:.1f} ms"))
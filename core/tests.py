@@ -1,3 +1,196 @@
-from django.test import TestCase
+import os
+import runpy
+import sys
+import tempfile
+from io import StringIO
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.utils import load_backend
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from backend.replica import REPLICA_ALIAS, ReadReplicaRouter, use_read_replica
+from backend.sharding import hash_shard_for_user
+from budgets.models import Budget
+from core.models import UserShard
+from transactions.models import Transaction, UserProfile, assign_categories
+
+
+class HealthzReadyTests(TestCase):
+    def test_reports_database_and_cache(self):
+        response = self.client.get('/healthz/ready')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'ok')
+        self.assertTrue(body['checks']['database']['ok'])
+        self.assertTrue(body['checks']['cache']['ok'])
+
+    def test_cache_outage_is_unavailable(self):
+        class ConnectionError(Exception):
+            """Stand-in for a cache client's own exception type"""
+
+        with mock.patch('core.views.prime_cache', side_effect=ConnectionError):
+            response = self.client.get('/healthz/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['cache'], {'ok': False, 'error': 'ConnectionError'})
+        self.assertTrue(response.json()['checks']['database']['ok'])
+
+    def test_two_factor_urls_still_resolve(self):
+        response = self.client.get('/account/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('backend.two_factor_urls', sys.modules)
+
+    def test_includes_pool_stats_when_pooling(self):
+        # Stand-in for a psycopg_pool.ConnectionPool on a pooled alias
+        pooled = mock.Mock()
+        pooled.pool.get_stats.return_value = {'pool_size': 2, 'pool_available': 1}
+        fake_connections = mock.MagicMock()
+        fake_connections.__iter__.return_value = iter(['default'])
+        fake_connections.__getitem__.return_value = pooled
+        with mock.patch('backend.database.connections', fake_connections):
+            response = self.client.get('/healthz/ready')
+        self.assertEqual(response.json()['pools'], {'default': {'pool_size': 2, 'pool_available': 1}})
+
+    def test_no_pool_stats_without_pooling(self):
+        self.assertNotIn('pools', self.client.get('/healthz/ready').json())
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        self.request = RequestFactory().get('/')
+        self.request.user = mock.Mock(is_authenticated=True, pk=1)
+        patcher = mock.patch('backend.replica.replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def route_inside_view(self):
+        view = use_read_replica(lambda request: self.router.db_for_read(Transaction))
+        return view(self.request)
+
+    def test_only_opted_in_reads_use_replica(self):
+        self.assertIsNone(self.router.db_for_read(Transaction))
+        with mock.patch('backend.replica.has_recent_write', return_value=False):
+            self.assertEqual(self.route_inside_view(), REPLICA_ALIAS)
+        self.assertEqual(self.router.db_for_write(Transaction), 'default')
+
+    def test_recent_write_keeps_reads_on_primary(self):
+        with mock.patch('backend.replica.has_recent_write', return_value=True):
+            self.assertIsNone(self.route_inside_view())
+
+
+REPLICA_CONFIGURED = REPLICA_ALIAS in settings.DATABASES
+
+
+@skipUnless(REPLICA_CONFIGURED, 'set DATABASE_REPLICA_URL to run')
+class ReadReplicaIntegrationTests(TransactionTestCase):
+    # The test runner collects aliases even from skipped classes
+    databases = {'default', REPLICA_ALIAS} if REPLICA_CONFIGURED else {'default'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='dora', password='pw')
+        # Seed the replica directly (bulk_create skips the profile signal)
+        User.objects.using(REPLICA_ALIAS).bulk_create([User(pk=self.user.pk, username='dora')])
+        rows = [Transaction(user_id=self.user.pk, transaction_type='income', amount=Decimal('7.00'), category='Pay')]
+        assign_categories(rows, REPLICA_ALIAS)
+        Transaction.objects.using(REPLICA_ALIAS).bulk_create(rows)
+        self.client.login(username='dora', password='pw')
+
+    def test_analytics_read_replica_until_user_writes(self):
+        summary = self.client.get('/api/transactions/summary/').json()
+        self.assertEqual(Decimal(str(summary['total_income'])), Decimal('7.00'))
+
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'income', 'amount': '100.00', 'category': 'Pay',
+        })
+        summary = self.client.get('/api/transactions/summary/').json()
+        self.assertEqual(Decimal(str(summary['total_income'])), Decimal('100.00'))
+
+
+class SqliteTuningTests(SimpleTestCase):
+    def test_profile_is_applied_to_new_connections(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {'DJANGO_SQLITE_TUNING': 'true', 'DATABASE_URL': f'sqlite:///{directory.name}/tuned.sqlite3'}
+        with mock.patch.dict(os.environ, env):
+            # The settings module as a process started with that environment sees it
+            profile = runpy.run_path(str(settings.BASE_DIR / 'backend' / 'settings.py'))
+        database = connections.configure_settings({'default': profile['DATABASES']['default']})['default']
+        connection = load_backend(database['ENGINE']).DatabaseWrapper(database, 'tuned')
+        self.addCleanup(connection.close)
+
+        with override_settings(SQLITE_PRAGMAS=profile['SQLITE_PRAGMAS']):
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+                cursor.execute('PRAGMA synchronous')
+                # NORMAL
+                self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class HashShardPlacementTests(SimpleTestCase):
+    def test_placement_is_stable_and_spread(self):
+        shards = ['shard0', 'shard1', 'shard2']
+        placements = [hash_shard_for_user(user_id, shards) for user_id in range(300)]
+        self.assertEqual(placements, [hash_shard_for_user(user_id, shards) for user_id in range(300)])
+        for shard in shards:
+            self.assertGreater(placements.count(shard), 60)
+
+
+SHARDS = list(settings.SHARD_DATABASES)
+
+
+@skipUnless(len(SHARDS) >= 2, 'set DATABASE_SHARD_URLS to two or more databases to run')
+class UserShardingIntegrationTests(TransactionTestCase):
+    databases = {'default', *SHARDS}
+
+    def create_user_on(self, shard, prefix):
+        # Pick the next user id whose hash placement is ``shard``
+        for index in range(100):
+            user = User.objects.create_user(username=f'{prefix}{index}', password='pw')
+            if hash_shard_for_user(user.pk) == shard:
+                return user
+        self.fail(f'no user hashed to {shard}')
+
+    def test_user_data_lands_on_hash_shard(self):
+        user = self.create_user_on(SHARDS[1], 'erin')
+        self.client.login(username=user.username, password='pw')
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'income', 'amount': '50.00', 'category': 'Pay',
+        })
+        self.assertEqual(Transaction.objects.using(SHARDS[1]).filter(user_id=user.pk).count(), 1)
+        self.assertFalse(Transaction.objects.using('default').filter(user_id=user.pk).exists())
+        self.assertTrue(UserProfile.objects.using(SHARDS[1]).filter(user_id=user.pk).exists())
+        profile = self.client.get('/api/profiles/my_profile/').json()
+        self.assertEqual(Decimal(profile['balance']), Decimal('50.00'))
+        # Streamed after the request's shard context has ended
+        export = b''.join(self.client.get('/api/transactions/export/').streaming_content).decode()
+        self.assertEqual(len(export.splitlines()), 2)
+
+    def test_rebalance_moves_user_rows(self):
+        user = self.create_user_on(SHARDS[0], 'finn')
+        self.client.login(username=user.username, password='pw')
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'expense', 'amount': '12.00', 'category': 'Food',
+        })
+        self.client.post('/api/budgets/', {'category': 'Food', 'amount': '100.00'}, content_type='application/json')
+
+        with self.assertRaisesMessage(CommandError, 'shared cache'):
+            call_command('rebalance_shards', user=user.pk, target=SHARDS[1], stdout=StringIO())
+        self.assertTrue(Transaction.objects.using(SHARDS[0]).filter(user_id=user.pk).exists())
+
+        call_command('rebalance_shards', user=user.pk, target=SHARDS[1], single_process=True, stdout=StringIO())
+        self.assertEqual(UserShard.objects.get(user=user).alias, SHARDS[1])
+        self.assertFalse(Transaction.objects.using(SHARDS[0]).filter(user_id=user.pk).exists())
+        self.assertTrue(Budget.objects.using(SHARDS[1]).filter(user_id=user.pk).exists())
+        budgets = self.client.get('/api/budgets/').json()
+        self.assertEqual(budgets[0]['spent'], 12.0)
+        # Ids changed with the move, so older sync cursors start over
+        profile = UserProfile.objects.using(SHARDS[1]).get(user_id=user.pk)
+        self.assertEqual(profile.sync_reset, profile.change_seq)
+        self.assertTrue(self.client.get('/api/sync/', {'since': profile.change_seq - 1}).json()['reset'])
@@ -1,5 +1,13 @@
+import time
+
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET
+
+from backend.database import connection_pool_stats
+from backend.warmup import prime_cache, prime_database
 
 # Create your views here.
 
@@ -9,3 +17,33 @@ def index(request):
 
 def contact(request):
     return render(request,'core/contact.html' )
+
+
+@never_cache
+@require_GET
+def healthz_ready(request):
+    """
+    Readiness probe that doubles as a warm-up call after a cold start:
+    opens the DB connection and touches the cache, reporting each step.
+    Connection pool statistics are included when pooling is enabled.
+    """
+    checks = {}
+    healthy = True
+    for name, prime in (('database', prime_database), ('cache', prime_cache)):
+        started = time.perf_counter()
+        try:
+            prime()
+        except Exception as exc:
+            # Any backend's client error (e.g. redis) means not ready
+            checks[name] = {'ok': False, 'error': exc.__class__.__name__}
+            healthy = False
+        else:
+            checks[name] = {'ok': True, 'ms': round((time.perf_counter() - started) * 1000, 2)}
+    payload = {'status': 'ok' if healthy else 'unavailable', 'checks': checks}
+    pools = connection_pool_stats()
+    if pools:
+        payload['pools'] = pools
+    return JsonResponse(
+        payload,
+        status=200 if healthy else 503,
+    )
@@ -0,0 +1,44 @@
+"""
+Gunicorn settings picked up automatically from the working directory.
+
+The Dockerfile keeps passing the sizing flags on the command line; this file
+only adds what flags can't express: optional preloading and the hooks that
+keep database connections from leaking across fork().
+"""
+
+import os
+
+# Load Django (and warm the URLconf) once in the master so forked workers,
+# including those restarted by --max-requests, start warm.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+
+def when_ready(server):
+    if preload_app:
+        from backend.warmup import warm_up
+
+        # Runs in the master before workers are forked. A failed warm-up
+        # (e.g. the DB is still resuming) must not keep the server down.
+        try:
+            warm_up(close_connections=True)
+        except Exception as exc:
+            server.log.warning("Warm-up failed: %s", exc)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from django.db import connections
+
+        # Drop any connection handle inherited from the master; each worker
+        # opens its own on first use.
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from backend.warmup import warm_up
+
+        try:
+            warm_up()
+        except Exception as exc:
+            worker.log.warning("Warm-up failed: %s", exc)
@@ -0,0 +1,275 @@
+"""
+Columnar analytics over a user's transactions.
+
+``get_frame(user_id)`` loads the user's live transactions once into NumPy
+arrays (int64 cents, datetime64 dates in the current time zone, int32
+category codes) and keeps them in a size-bounded, process-local LRU keyed
+by user and *data version*. The summary, time series, category stats and
+budget endpoints then run vectorized group-bys over the frame instead of
+one aggregate query each.
+
+The data version is kept on the user's profile row
+(``UserProfile.data_version``), which every write of their transactions,
+archives, budgets and alerts moves in the writing transaction, whichever
+process makes it. It is read from the database the frame is then read
+from, so a frame from a lagging replica lands under the replica's older
+version. A stale frame is never read again and simply ages out of the LRU.
+Other per-user caches (forecasts, dashboards, recommendations) key on the
+same version.
+"""
+
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from backend.sharding import user_shard
+from .models import Category, Transaction, UserProfile
+
+
+def _version(user_id):
+    return UserProfile.objects.filter(user_id=user_id).values_list('data_version', flat=True)
+
+
+def data_version(user_id):
+    """Current data version of ``user_id``'s data"""
+    with user_shard(user_id):
+        return _version(user_id).first() or 0
+
+
+async def adata_version(user_id):
+    """data_version() for async views"""
+    with user_shard(user_id):
+        return await _version(user_id).afirst() or 0
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class TransactionFrame:
+    """One user's transactions as parallel column arrays"""
+
+    def __init__(self, cents, is_expense, dates, category_codes, categories, category_ids=None):
+        self.cents = cents
+        self.is_expense = is_expense
+        self.dates = dates
+        self.category_codes = category_codes
+        self.categories = categories
+        # Category id of each code, for frames loaded from the database
+        self.category_ids = category_ids
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a frame from (cents, transaction_type, category, date) tuples"""
+        import numpy as np
+
+        cents, types, categories, dates = list(zip(*rows)) or [(), (), (), ()]
+        category_codes = {}
+        codes = [category_codes.setdefault(category, len(category_codes)) for category in categories]
+        # Aware datetimes -> local wall-clock microseconds, without per-row
+        # timezone conversion when the current zone is UTC
+        micros = np.rint(np.array([date.timestamp() for date in dates]) * 1e6).astype(np.int64)
+        tz = timezone.get_current_timezone()
+        if timezone.get_current_timezone_name() != 'UTC':
+            micros += np.array(
+                [date.astimezone(tz).utcoffset().total_seconds() for date in dates], dtype=np.int64
+            ) * 1_000_000
+        return cls(
+            cents=np.array(cents, dtype=np.int64),
+            is_expense=np.array(types, dtype=object) == 'expense',
+            dates=micros.view('datetime64[us]'),
+            category_codes=np.array(codes, dtype=np.int32),
+            categories=list(category_codes),
+        )
+
+    def name_categories(self, names):
+        """Swap the category ids the frame was built from for their {id: name}"""
+        self.category_ids = self.categories
+        self.categories = [names[category_id] for category_id in self.category_ids]
+        return self
+
+    @property
+    def nbytes(self):
+        return (
+            self.cents.nbytes + self.is_expense.nbytes + self.dates.nbytes
+            + self.category_codes.nbytes + sum(len(category) for category in self.categories)
+        )
+
+    def __len__(self):
+        return len(self.cents)
+
+    def select(self, transaction_type=None, start=None, end=None, category=None, category_id=None):
+        """Boolean mask of rows matching the filters; ``end`` is exclusive"""
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        if transaction_type is not None:
+            mask &= self.is_expense if transaction_type == 'expense' else ~self.is_expense
+        if start is not None:
+            mask &= self.dates >= _local_datetime64(start)
+        if end is not None:
+            mask &= self.dates < _local_datetime64(end)
+        if category is not None:
+            if category not in self.categories:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.category_codes == self.categories.index(category)
+        if category_id is not None:
+            if category_id not in (self.category_ids or ()):
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.category_codes == self.category_ids.index(category_id)
+        return mask
+
+    def total(self, mask):
+        return cents_to_decimal(self.cents[mask].sum())
+
+    def by_category(self, mask):
+        """[(category, total, count)] for the masked rows, largest total first"""
+        import numpy as np
+
+        size = len(self.categories)
+        codes = self.category_codes[mask]
+        totals = np.bincount(codes, weights=self.cents[mask], minlength=size)
+        counts = np.bincount(codes, minlength=size)
+        groups = [
+            (self.categories[code], cents_to_decimal(round(totals[code])), int(counts[code]))
+            for code in np.flatnonzero(counts)
+        ]
+        return sorted(groups, key=lambda group: group[1], reverse=True)
+
+    def period_index(self, period):
+        """Integer period number of every row (days, Monday weeks or months since 1970)"""
+        return period_index(self.dates, period)
+
+    def by_period(self, mask, period):
+        """[(period start, total)] for the masked rows, oldest first"""
+        import numpy as np
+
+        keys, inverse = np.unique(self.period_index(period)[mask], return_inverse=True)
+        totals = np.bincount(inverse, weights=self.cents[mask], minlength=len(keys))
+        return [
+            (period_start(key, period), cents_to_decimal(round(total)))
+            for key, total in zip(keys.tolist(), totals)
+        ]
+
+
+def period_index(dates, period):
+    import numpy as np
+
+    if period == 'month':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    if period == 'week':
+        # Weeks start on Monday, like TruncWeek; 1970-01-01 was a Thursday
+        return (days + 3) // 7
+    return days
+
+
+def period_start(index, period):
+    """Aware start of the period numbered ``index`` (see period_index)"""
+    import numpy as np
+
+    if period == 'month':
+        start = np.datetime64(index, 'M')
+    elif period == 'week':
+        start = np.datetime64(index * 7 - 3, 'D')
+    else:
+        start = np.datetime64(index, 'D')
+    return timezone.make_aware(start.astype('datetime64[us]').item(), timezone.get_current_timezone())
+
+
+def _local_datetime64(value):
+    import numpy as np
+
+    if timezone.is_aware(value):
+        value = timezone.localtime(value).replace(tzinfo=None)
+    return np.datetime64(value, 'us')
+
+
+class FrameCache:
+    """Thread-safe LRU of frames bounded by their total size in bytes"""
+
+    def __init__(self):
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        max_bytes = settings.ANALYTICS_CACHE_MAX_BYTES
+        if frame.nbytes > max_bytes:
+            return
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._frames[key] = frame
+            self._bytes += frame.nbytes
+            while self._bytes > max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+
+frames = FrameCache()
+
+
+def _frame_rows(user_id):
+    # Cents are computed by the database, skipping a Decimal per row, and
+    # categories come as ids, named once per category
+    return Transaction.objects.filter(user_id=user_id).values_list(
+        Cast(Round(F('amount') * 100), BigIntegerField()), 'transaction_type', 'category_ref_id', 'date'
+    )
+
+
+def _category_names(user_id):
+    # Read after the rows: categories are never deleted, so every id is here
+    return Category.objects.filter(user_id=user_id).values_list('pk', 'name')
+
+
+def load_frame(user_id):
+    with user_shard(user_id):
+        frame = TransactionFrame.from_rows(_frame_rows(user_id).iterator(chunk_size=5000))
+        return frame.name_categories(dict(_category_names(user_id)))
+
+
+async def aload_frame(user_id):
+    with user_shard(user_id):
+        frame = TransactionFrame.from_rows([row async for row in _frame_rows(user_id)])
+        return frame.name_categories({pk: name async for pk, name in _category_names(user_id)})
+
+
+def get_frame(user_id):
+    """The user's frame for the current data version, loading it on a miss"""
+    version = data_version(user_id)
+    key = (user_id, version, timezone.get_current_timezone_name())
+    frame = frames.get(key)
+    if frame is None:
+        frame = load_frame(user_id)
+        frames.put(key, frame)
+    return frame
+
+
+async def aget_frame(user_id):
+    """get_frame() for async views"""
+    version = await adata_version(user_id)
+    key = (user_id, version, timezone.get_current_timezone_name())
+    frame = frames.get(key)
+    if frame is None:
+        frame = await aload_frame(user_id)
+        frames.put(key, frame)
+    return frame
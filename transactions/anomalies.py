@@ -0,0 +1,146 @@
+"""
+Spending anomaly detection.
+
+``compute_statistics`` is the batch half: a vectorized pass over the
+user's analytics frame that stores count, mean and standard deviation of
+each expense category over a rolling window (run it from cron through the
+``compute_spending_stats`` command). ``check_transaction`` is the write
+half: one indexed lookup of those stored numbers per new expense, flagging
+amounts far above the category norm and categories the user never used.
+``check_transactions`` does the same for rows inserted in bulk.
+"""
+
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import router, transaction as db_transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from backend.sharding import user_shard
+from .analytics import cents_to_decimal, get_frame
+from .models import CategoryStatistics, SpendingAnomaly
+
+WINDOW_DAYS = 180
+ZSCORE_THRESHOLD = 3.0
+MIN_SAMPLES = 5
+# Spread floor, as a share of the mean, so near-constant categories
+# (same subscription every month) do not flag a few cents of difference
+MIN_RELATIVE_STD = Decimal('0.10')
+
+
+def compute_statistics(user_id, window_days=WINDOW_DAYS, now=None):
+    """Replace ``user_id``'s stored category statistics; returns the number of categories"""
+    import numpy as np
+
+    frame = get_frame(user_id)
+    start = (now or timezone.now()) - timedelta(days=window_days)
+    mask = frame.select('expense', start=start)
+    size = len(frame.categories)
+    codes = frame.category_codes[mask]
+    cents = frame.cents[mask].astype(np.float64)
+    counts = np.bincount(codes, minlength=size)
+    sums = np.bincount(codes, weights=cents, minlength=size)
+    squares = np.bincount(codes, weights=cents * cents, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        stds = np.sqrt(np.maximum(squares / counts - means * means, 0))
+
+    rows = [
+        CategoryStatistics(
+            user_id=user_id,
+            category=frame.categories[code],
+            category_ref_id=frame.category_ids[code],
+            count=int(counts[code]),
+            mean=cents_to_decimal(round(means[code])),
+            std=cents_to_decimal(round(stds[code])),
+        )
+        for code in np.flatnonzero(counts).tolist()
+    ]
+    with user_shard(user_id):
+        with db_transaction.atomic(using=router.db_for_write(CategoryStatistics)):
+            CategoryStatistics.objects.filter(user_id=user_id).delete()
+            CategoryStatistics.objects.bulk_create(rows)
+    return len(rows)
+
+
+def check_transaction(transaction):
+    """Flag ``transaction`` against the stored statistics; returns the anomaly or None"""
+    if transaction.transaction_type != 'expense':
+        return None
+
+    # One query: the category's row if there is one, else any row of the user
+    # (telling us the batch has run and the category is new), else nothing
+    stats = (
+        CategoryStatistics.objects.filter(user_id=transaction.user_id)
+        .order_by(Case(When(category_ref=transaction.category_ref_id, then=Value(0)), default=Value(1),
+                       output_field=IntegerField()))
+        .first()
+    )
+    if stats is None:
+        return None
+    return _flag(transaction, stats if stats.category_ref_id == transaction.category_ref_id else None)
+
+
+def check_transactions(transactions):
+    """
+    Flag transactions inserted with bulk_create, which skips the post_save
+    check: one statistics query per user. Returns the anomalies.
+    """
+    expenses = defaultdict(list)
+    for transaction in transactions:
+        if transaction.transaction_type == 'expense':
+            expenses[transaction.user_id].append(transaction)
+
+    anomalies = []
+    for user_id, rows in expenses.items():
+        with user_shard(user_id):
+            stats = {row.category_ref_id: row for row in CategoryStatistics.objects.filter(user_id=user_id)}
+            if not stats:
+                continue
+            seeded = set()
+            for transaction in rows:
+                if transaction.category_ref_id in seeded:
+                    # Seeded by an earlier row of the batch, from one sample
+                    continue
+                if transaction.category_ref_id not in stats:
+                    seeded.add(transaction.category_ref_id)
+                anomaly = _flag(transaction, stats.get(transaction.category_ref_id))
+                if anomaly is not None:
+                    anomalies.append(anomaly)
+    return anomalies
+
+
+def _flag(transaction, stats):
+    """Anomaly for an expense given its category's statistics (None: a new category)"""
+    if stats is None:
+        # Seed the category so only its first transaction is reported; a
+        # concurrent first expense in it may have seeded it already
+        _, created = CategoryStatistics.objects.get_or_create(
+            user_id=transaction.user_id, category_ref_id=transaction.category_ref_id,
+            defaults={'category': transaction.category, 'count': 1, 'mean': transaction.amount, 'std': Decimal('0.00')},
+        )
+        if not created:
+            return None
+        return SpendingAnomaly.objects.create(
+            user_id=transaction.user_id, transaction=transaction, reason='new_category',
+            message=f"First expense in {transaction.category}: {transaction.amount}",
+        )
+
+    if stats.count < MIN_SAMPLES:
+        return None
+    spread = max(stats.std, stats.mean * MIN_RELATIVE_STD)
+    if not spread:
+        return None
+    score = float((Decimal(transaction.amount) - stats.mean) / spread)
+    if not math.isfinite(score) or score < ZSCORE_THRESHOLD:
+        return None
+    return SpendingAnomaly.objects.create(
+        user_id=transaction.user_id, transaction=transaction, reason='amount', score=round(score, 2),
+        message=(
+            f"{transaction.amount} in {transaction.category} is {score:.1f} standard deviations "
+            f"above the usual {stats.mean}"
+        ),
+    )
@@ -0,0 +1,212 @@
+"""
+Cold archival of closed years of transactions.
+
+A user's transactions for one local calendar year are written to a
+compressed NumPy ``.npz`` file with one array per column (cents as int64,
+UTC datetime64, category codes, UTF-8 description blob + offsets) and
+removed from the transaction table. ``ArchivedTotal`` rows keep per type/category
+sums so lifetime totals and the balance stay correct without opening the
+file. ``read_archive`` turns a file back into transaction dicts for the
+export endpoint and the restore command.
+
+NumPy is imported on use so it never lands on the request path.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import router, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from backend.sharding import user_shard
+from .models import (
+    ArchivedTotal, Category, SyncTombstone, Transaction, TransactionArchive, UserProfile, assign_categories,
+)
+
+TRANSACTION_TYPES = [code for code, _ in Transaction.TRANSACTION_TYPES]
+ROW_FIELDS = ['id', 'transaction_type', 'amount', 'category', 'description', 'date']
+
+
+def archive_storage():
+    return FileSystemStorage(location=settings.TRANSACTION_ARCHIVE_ROOT)
+
+
+def archive_path(user_id, year):
+    return f"transactions/{user_id}/{year}.npz"
+
+
+def year_bounds(year):
+    """Aware start and end of local calendar ``year``"""
+    return (
+        timezone.make_aware(datetime(year, 1, 1)),
+        timezone.make_aware(datetime(year + 1, 1, 1)),
+    )
+
+
+def rows_to_columns(rows):
+    """Encode transaction dicts (ROW_FIELDS) as compact column arrays"""
+    import numpy as np
+
+    categories = sorted({row['category'] for row in rows})
+    category_codes = {category: code for code, category in enumerate(categories)}
+    descriptions = [(row['description'] or '').encode() for row in rows]
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in descriptions])
+    return {
+        'id': np.array([row['id'] for row in rows], dtype=np.int64),
+        'type': np.array([TRANSACTION_TYPES.index(row['transaction_type']) for row in rows], dtype=np.int8),
+        'amount_cents': np.array([int(row['amount'] * 100) for row in rows], dtype=np.int64),
+        'date': np.array(
+            [row['date'].astimezone(dt_timezone.utc).replace(tzinfo=None) for row in rows],
+            dtype='datetime64[us]',
+        ),
+        'category_code': np.array([category_codes[row['category']] for row in rows], dtype=np.int32),
+        'categories': np.array(categories, dtype=str),
+        'description_blob': np.frombuffer(b''.join(descriptions), dtype=np.uint8),
+        'description_offsets': offsets,
+        'description_null': np.array([row['description'] is None for row in rows], dtype=bool),
+    }
+
+
+def columns_to_rows(columns):
+    """Decode arrays written by rows_to_columns back into transaction dicts"""
+    blob = columns['description_blob'].tobytes()
+    offsets = columns['description_offsets']
+    categories = columns['categories'].tolist()
+    rows = []
+    for i, (pk, type_code, cents, date, category_code, is_null) in enumerate(zip(
+        columns['id'].tolist(), columns['type'].tolist(), columns['amount_cents'].tolist(),
+        columns['date'].tolist(), columns['category_code'].tolist(), columns['description_null'].tolist(),
+    )):
+        rows.append({
+            'id': pk,
+            'transaction_type': TRANSACTION_TYPES[type_code],
+            'amount': Decimal(cents) / 100,
+            'category': categories[category_code],
+            'description': None if is_null else blob[offsets[i]:offsets[i + 1]].decode(),
+            'date': date.replace(tzinfo=dt_timezone.utc),
+        })
+    return rows
+
+
+def write_archive(user_id, year, rows):
+    """
+    Write ``rows`` to a new file and return its path. An existing file of
+    the year is left alone (the storage picks a free name), so the archive
+    stays valid until the database points at the new one.
+    """
+    import numpy as np
+
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **rows_to_columns(rows))
+    return archive_storage().save(archive_path(user_id, year), ContentFile(buffer.getvalue()))
+
+
+def read_archive(archive):
+    """Return the archived transactions of ``archive`` as dicts, oldest first"""
+    import numpy as np
+
+    with archive_storage().open(archive.path, 'rb') as handle:
+        with np.load(BytesIO(handle.read())) as data:
+            return columns_to_rows({name: data[name] for name in data.files})
+
+
+def archive_user_year(user, year):
+    """
+    Move ``user``'s transactions dated in ``year`` into the year's archive,
+    merging with an existing archive if rows were back-dated into it.
+    Returns the number of rows moved out of the table.
+    """
+    start, end = year_bounds(year)
+    with user_shard(user.pk):
+        live_rows = list(
+            Transaction.objects.filter(user=user, date__gte=start, date__lt=end)
+            .order_by('date', 'id')
+            .values(*ROW_FIELDS)
+        )
+        if not live_rows:
+            return 0
+        existing = TransactionArchive.objects.filter(user=user, year=year).first()
+        rows = (read_archive(existing) if existing else []) + live_rows
+        path = write_archive(user.pk, year, rows)
+
+        using = router.db_for_write(Transaction)
+        try:
+            with transaction.atomic(using=using):
+                # Older archives may hold spellings from before categories
+                categories = Category.resolve(user.pk, {row['category'] for row in rows}, using)
+                totals = defaultdict(lambda: [Decimal('0.00'), 0])
+                for row in rows:
+                    entry = totals[(row['transaction_type'], categories[row['category']])]
+                    entry[0] += row['amount']
+                    entry[1] += 1
+
+                archive, _ = TransactionArchive.objects.update_or_create(
+                    user=user, year=year, defaults={'path': path, 'row_count': len(rows)},
+                )
+                archive.totals.all().delete()
+                ArchivedTotal.objects.bulk_create([
+                    ArchivedTotal(archive=archive, transaction_type=transaction_type, category=category.name,
+                                  category_ref=category, total=total, count=count)
+                    for (transaction_type, category), (total, count) in totals.items()
+                ])
+                Transaction.objects.filter(pk__in=[row['id'] for row in live_rows]).delete()
+                # Archived rows leave the transaction list, so syncing clients drop them
+                first = UserProfile.record_changes(user.pk, using, changes=len(live_rows))
+                SyncTombstone.objects.bulk_create([
+                    SyncTombstone(user=user, kind='transaction', object_id=row['id'], change_seq=first + offset)
+                    for offset, row in enumerate(live_rows)
+                ])
+                if existing is not None:
+                    old_path = existing.path
+                    transaction.on_commit(lambda: archive_storage().delete(old_path), using=using)
+        except BaseException:
+            # Nothing was moved and the previous file is still the archive
+            archive_storage().delete(path)
+            raise
+    return len(live_rows)
+
+
+def restore_archive(archive):
+    """Put an archive's rows back into the transaction table and drop the archive"""
+    rows = read_archive(archive)
+    with user_shard(archive.user_id):
+        using = router.db_for_write(Transaction)
+        with transaction.atomic(using=using):
+            # bulk_create skips Transaction.save(), whose balance adjustment
+            # is already reflected through the archived totals
+            # Keep the original ids unless they were reused meanwhile (e.g.
+            # after the user was moved to another shard)
+            taken = set(
+                Transaction.objects.filter(pk__in=[row['id'] for row in rows]).values_list('pk', flat=True)
+            )
+            first = UserProfile.record_changes(archive.user_id, using, changes=len(rows))
+            restored = [
+                Transaction(
+                    user_id=archive.user_id, change_seq=first + offset,
+                    **dict(row, id=None if row['id'] in taken else row['id']),
+                )
+                for offset, row in enumerate(rows)
+            ]
+            assign_categories(restored, using)
+            Transaction.objects.bulk_create(restored, batch_size=1000)
+            path = archive.path
+            archive.delete()
+            transaction.on_commit(lambda: archive_storage().delete(path), using=using)
+    return len(rows)
+
+
+def archived_totals(user):
+    """Archived sums per (transaction_type, category) across all of ``user``'s archives"""
+    return (
+        ArchivedTotal.objects.filter(archive__user=user)
+        .values('transaction_type', 'category_ref', 'category')
+        .annotate(total=Sum('total'))
+        .order_by()
+    )
@@ -0,0 +1,117 @@
+"""
+Async versions of the read-heavy analytics views, for the ASGI server.
+
+DRF views are synchronous, so under ASGI each request holds a thread from
+the first middleware to the rendered response. These views await the cache
+and Django's async ORM instead: a request only takes a thread while one of
+its queries runs, and the frame group-bys, rendering and middleware run on
+the event loop. Reads that do not depend on each other are awaited
+together.
+
+``backend.async_urls`` maps them onto the paths of the DRF views when
+ASYNC_ANALYTICS_VIEWS is on (the default when serving ``backend.asgi``).
+They authenticate with the API's configured classes and render like DRF.
+"""
+
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from backend.replica import use_read_replica
+from .analytics import aget_frame
+from .archive import archived_totals
+from .coalesce import acoalesced
+from .balances import abalance_as_of
+from .dashboard import build_time_series, summarize_transactions
+from .views import balance_moment
+
+def respond(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+def _authenticate(request):
+    """
+    (user, None), or (None, error response), by running the API's
+    DEFAULT_AUTHENTICATION_CLASSES and IsAuthenticated as a DRF view would
+    """
+    authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        user = drf_request.user
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+    except (exceptions.AuthenticationFailed, exceptions.NotAuthenticated) as exc:
+        # Like APIView.handle_exception: 401 if the first class names a
+        # scheme for WWW-Authenticate, else 403
+        header = authenticators[0].authenticate_header(drf_request) if authenticators else None
+        response = respond({'detail': exc.detail}, 401 if header else 403)
+        if header:
+            response['WWW-Authenticate'] = header
+        return None, response
+    return user, None
+
+
+def analytics_view(view):
+    """
+    Make ``view`` a GET endpoint for signed-in users; ``request.user`` is
+    the authenticated user when it runs
+    """
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        if request.method != 'GET':
+            return respond({'detail': f'Method "{request.method}" not allowed.'}, 405)
+        user, error = await sync_to_async(_authenticate)(request)
+        if error is not None:
+            return error
+        # Also read by the shard router, in whichever thread a query runs
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapped
+
+
+@analytics_view
+@use_read_replica
+async def summary(request):
+    """Return a summary of transactions by category"""
+    user = request.user
+
+    async def compute():
+        frame, archived = await asyncio.gather(aget_frame(user.pk), alist(archived_totals(user)))
+        return summarize_transactions(frame, archived)
+
+    return respond(await acoalesced('summary', user.pk, {}, compute))
+
+
+@analytics_view
+@use_read_replica
+async def time_series(request):
+    """Return time-based data for charts"""
+    user_id = request.user.pk
+    period = request.GET.get('period', 'month')
+
+    async def compute():
+        return build_time_series(await aget_frame(user_id), period)
+
+    return respond(await acoalesced('time_series', user_id, {'period': period}, compute))
+
+
+@analytics_view
+@use_read_replica
+async def balance_at(request):
+    """Balance as of ?at=<datetime>, or the end of ?date=YYYY-MM-DD (now by default)"""
+    try:
+        at = balance_moment(request.GET)
+    except ValueError as exc:
+        return respond({'error': str(exc)}, 400)
+    return respond({'at': at, 'balance': await abalance_as_of(request.user.pk, at)})
@@ -1,6 +1,8 @@
 from rest_framework import authentication
 from rest_framework import exceptions
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django_otp import user_has_device, devices_for_user
 from django_otp.plugins.otp_totp.models import TOTPDevice
 
@@ -16,15 +18,16 @@ class TwoFactorAuthentication(authentication.BaseAuthentication):
         
         # If the user is already authenticated via session
         if user and user.is_authenticated:
+            # A session that already passed OTP needs no device lookups
+            if getattr(request._request, 'session', {}).get('otp_verified'):
+                return (user, None)
+
             # Check if the user has 2FA enabled
-            if user_has_device(user):
+            if cached_user_has_device(user):
                 # Get OTP from request headers
                 otp_token = request.META.get('HTTP_X_OTP_TOKEN')
                 
                 if not otp_token:
-                    # If no OTP token is provided, check if the session is already verified
-                    if getattr(request._request, 'session', {}).get('otp_verified'):
-                        return (user, None)
                     raise exceptions.AuthenticationFailed('OTP token required')
                 
                 # Verify the OTP token
@@ -54,4 +57,31 @@ def get_user_totp_device(user, confirmed=None):
     if confirmed is not None:
         devices = devices.filter(confirmed=confirmed)
     
-    return devices.first()
\ No newline at end of file
+    return devices.first()
+
+
+def _device_cache_key(user_id):
+    return f'otp:has_device:{user_id}'
+
+
+def cached_user_has_device(user):
+    """
+    Cached version of ``user_has_device`` for confirmed devices.
+
+    The entry is dropped whenever one of the user's OTP devices is saved or
+    deleted (see ``transactions.signals``). Only "has a device" is cached:
+    with a per-process cache the signal reaches only the writing worker, and
+    a stale "no device" elsewhere would skip OTP for a user who just
+    enrolled, while a stale "has a device" only keeps asking for a token.
+    """
+    key = _device_cache_key(user.pk)
+    has_device = cache.get(key)
+    if has_device is None:
+        has_device = user_has_device(user, confirmed=True)
+        if has_device:
+            cache.set(key, True, settings.OTP_DEVICE_CACHE_TIMEOUT)
+    return has_device
+
+
+def invalidate_user_device_cache(user_id):
+    cache.delete(_device_cache_key(user_id))
@@ -0,0 +1,162 @@
+"""
+Point-in-time balances.
+
+A BalanceCheckpoint holds the ledger balance at the start of a month.
+Every write moves the checkpoints after the written date in the same
+database transaction (``BalanceCheckpoint.shift``), so ``balance_as_of``
+is the nearest checkpoint plus one indexed sum over less than a month of
+transactions. ``build_checkpoints`` adds the months that started since the
+last run (run the ``checkpoint_balances`` command monthly) and
+``daily_balances`` turns a date range into a running balance with a window
+function.
+
+Archived years only exist as totals: they count in full towards every
+balance after the first live month, and a point inside an archived year
+gets the balance at the end of the archive.
+"""
+
+import asyncio
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import router, transaction as db_transaction
+from django.db.models import Case, DateField, DecimalField, F, Sum, When, Window
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .archive import archived_totals
+from .models import BalanceCheckpoint, Transaction, UserProfile
+
+CENT = Decimal('0.01')
+
+SIGNED_AMOUNT = Case(
+    When(transaction_type='expense', then=-F('amount')),
+    default=F('amount'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def day_start(day):
+    """Aware datetime of local midnight at the start of ``day``"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _net(transactions):
+    total = transactions.aggregate(total=Sum(SIGNED_AMOUNT))['total'] or 0
+    return Decimal(total).quantize(CENT)
+
+
+async def _anet(transactions):
+    total = (await transactions.aaggregate(total=Sum(SIGNED_AMOUNT)))['total'] or 0
+    return Decimal(total).quantize(CENT)
+
+
+def _archived_net(rows):
+    balance = Decimal('0.00')
+    for row in rows:
+        balance += row['total'] if row['transaction_type'] == 'income' else -row['total']
+    return balance
+
+
+def archived_balance(user_id):
+    """Net of every archived year: income minus expenses"""
+    return _archived_net(archived_totals(user_id))
+
+
+async def aarchived_balance(user_id):
+    return _archived_net([row async for row in archived_totals(user_id)])
+
+
+def balance_as_of(user_id, at):
+    """Balance from every transaction dated strictly before ``at``"""
+    checkpoint = (
+        BalanceCheckpoint.objects.filter(user_id=user_id, month__lte=timezone.localdate(at))
+        .order_by('-month').first()
+    )
+    transactions = Transaction.objects.filter(user_id=user_id, date__lt=at)
+    if checkpoint is None:
+        return archived_balance(user_id) + _net(transactions)
+    return checkpoint.balance + _net(transactions.filter(date__gte=day_start(checkpoint.month)))
+
+
+async def abalance_as_of(user_id, at):
+    """balance_as_of() for async views"""
+    checkpoint = await (
+        BalanceCheckpoint.objects.filter(user_id=user_id, month__lte=timezone.localdate(at))
+        .order_by('-month').afirst()
+    )
+    transactions = Transaction.objects.filter(user_id=user_id, date__lt=at)
+    if checkpoint is None:
+        archived, net = await asyncio.gather(aarchived_balance(user_id), _anet(transactions))
+        return archived + net
+    return checkpoint.balance + await _anet(transactions.filter(date__gte=day_start(checkpoint.month)))
+
+
+def daily_balances(user_id, start, end):
+    """Closing balance of every local day from ``start`` to ``end`` inclusive"""
+    opening = balance_as_of(user_id, day_start(start))
+    # Running sum over the range in the database; the last row of each day
+    # carries its closing balance
+    running = (
+        Transaction.objects.filter(
+            user_id=user_id, date__gte=day_start(start), date__lt=day_start(end + timedelta(days=1)),
+        )
+        .annotate(
+            day=TruncDate('date'),
+            running=Window(Sum(SIGNED_AMOUNT), order_by=[F('date').asc(), F('id').asc()]),
+        )
+        .order_by('date', 'id')
+        .values_list('day', 'running')
+    )
+    closing = dict(running)
+
+    series = []
+    change = 0
+    day = start
+    while day <= end:
+        change = closing.get(day, change)
+        series.append({'date': day, 'balance': (opening + Decimal(change)).quantize(CENT)})
+        day += timedelta(days=1)
+    return series
+
+
+def build_checkpoints(user_id, rebuild=False, now=None):
+    """Add checkpoints for every month started since the latest one; returns the count"""
+    current = timezone.localdate(now).replace(day=1)
+    using = router.db_for_write(BalanceCheckpoint)
+    with db_transaction.atomic(using=using):
+        # Writers update the profile row before they shift checkpoints, so
+        # holding its lock keeps the ledger still while it is summed
+        UserProfile.objects.using(using).select_for_update().filter(user_id=user_id).first()
+        checkpoints = BalanceCheckpoint.objects.using(using).filter(user_id=user_id)
+        transactions = Transaction.objects.using(using).filter(user_id=user_id)
+
+        latest = None if rebuild else checkpoints.order_by('-month').first()
+        if latest is not None:
+            month, balance = latest.month, latest.balance
+            transactions = transactions.filter(date__gte=day_start(month))
+        else:
+            checkpoints.delete()
+            month, balance = None, archived_balance(user_id)
+
+        totals = {
+            row['month']: Decimal(row['net']).quantize(CENT)
+            for row in transactions.annotate(month=TruncMonth('date', output_field=DateField()))
+            .values('month').annotate(net=Sum(SIGNED_AMOUNT)).order_by()
+        }
+        if month is None:
+            if not totals:
+                return 0
+            month = min(totals)
+
+        rows = []
+        while month < current:
+            balance += totals.get(month, 0)
+            month = next_month(month)
+            rows.append(BalanceCheckpoint(user_id=user_id, month=month, balance=balance.quantize(CENT)))
+        checkpoints.bulk_create(rows)
+    return len(rows)
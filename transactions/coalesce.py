@@ -0,0 +1,170 @@
+"""
+Single-flight for the analytics views.
+
+A React dashboard in strict mode, or several open tabs, asks for the same
+time series or budget summary several times at once. ``coalesced`` keys a
+computation by view, user, parameters and data version: the first request
+computes it, and identical requests that arrive meanwhile wait for that
+result instead of starting their own. Flights are per process and shared
+by the sync views and the async views (``acoalesced``). A request made
+after a write of the user's transactions or budgets reads the new data
+version, so it never joins an older flight.
+
+Stale-while-revalidate (ANALYTICS_STALE_SECONDS > 0) also keeps every
+result in the shared cache as the view's last value for that many seconds.
+Once a write has moved the data version on, a request gets the last value
+at once and one background computation replaces it. Requests for an
+unchanged version are always computed.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import CancelledError, Future
+from contextvars import copy_context
+from urllib.parse import urlencode
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .analytics import adata_version, data_version
+
+logger = logging.getLogger(__name__)
+
+LAST_VALUE_KEY = "analytics:last:{}"
+
+_flights = {}
+_lock = threading.Lock()
+# Background refreshes of async views, referenced until they finish
+_refreshing = set()
+
+
+def _key(name, user_id, params):
+    return f"{name}:{user_id}:{urlencode(sorted(params.items()))}"
+
+
+def _join(key, version):
+    """(future of the flight for ``key`` at ``version``, whether the caller leads it)"""
+    with _lock:
+        future = _flights.get((key, version))
+        if future is not None:
+            return future, False
+        future = _flights[(key, version)] = Future()
+        return future, True
+
+
+def _land(key, version, future, value=None, error=None):
+    with _lock:
+        _flights.pop((key, version), None)
+    if isinstance(error, asyncio.CancelledError):
+        # The leader's request went away; its followers start over
+        future.cancel()
+        return
+    if error is not None:
+        future.set_exception(error)
+        return
+    future.set_result(value)
+    if settings.ANALYTICS_STALE_SECONDS:
+        cache.set(
+            LAST_VALUE_KEY.format(key), {'version': version, 'value': value}, settings.ANALYTICS_STALE_SECONDS,
+        )
+
+
+def _flying(key, version):
+    with _lock:
+        return (key, version) in _flights
+
+
+def _fly(key, version, compute):
+    future, leader = _join(key, version)
+    if not leader:
+        try:
+            return future.result()
+        except CancelledError:
+            return _fly(key, version, compute)
+    try:
+        value = compute()
+    except BaseException as exc:
+        _land(key, version, future, error=exc)
+        raise
+    _land(key, version, future, value)
+    return value
+
+
+async def _afly(key, version, compute):
+    future, leader = _join(key, version)
+    if not leader:
+        try:
+            # Shielded, so a follower going away leaves the flight alone
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+        return await _afly(key, version, compute)
+    try:
+        value = await compute()
+    except BaseException as exc:
+        # No cache write on failure, so this may run on the event loop, and
+        # must not await while the task is being cancelled
+        _land(key, version, future, error=exc)
+        raise
+    await sync_to_async(_land)(key, version, future, value)
+    return value
+
+
+def _refresh(key, version, compute):
+    try:
+        _fly(key, version, compute)
+    except Exception:
+        logger.exception("Refreshing %s failed", key)
+    finally:
+        connections.close_all()
+
+
+async def _arefresh(key, version, compute):
+    # A context of its own: the request's thread goes away when it ends
+    async with ThreadSensitiveContext():
+        try:
+            await _afly(key, version, compute)
+        except Exception:
+            logger.exception("Refreshing %s failed", key)
+        finally:
+            await sync_to_async(connections.close_all)()
+
+
+def _stale_value(last, version):
+    if last is None or last['version'] == version:
+        return None
+    return last
+
+
+def coalesced(name, user_id, params, compute):
+    """``compute()``, shared with identical calls for the same data version"""
+    key = _key(name, user_id, params)
+    version = data_version(user_id)
+    if settings.ANALYTICS_STALE_SECONDS:
+        last = _stale_value(cache.get(LAST_VALUE_KEY.format(key)), version)
+        if last is not None:
+            if not _flying(key, version):
+                # Copied so the refresh routes its queries like this request
+                context = copy_context()
+                threading.Thread(target=context.run, args=(_refresh, key, version, compute), daemon=True).start()
+            return last['value']
+    return _fly(key, version, compute)
+
+
+async def acoalesced(name, user_id, params, compute):
+    """coalesced() for async views; ``compute`` is a coroutine function"""
+    key = _key(name, user_id, params)
+    version = await adata_version(user_id)
+    if settings.ANALYTICS_STALE_SECONDS:
+        last = _stale_value(await cache.aget(LAST_VALUE_KEY.format(key)), version)
+        if last is not None:
+            if not _flying(key, version):
+                task = asyncio.ensure_future(_arefresh(key, version, compute))
+                _refreshing.add(task)
+                task.add_done_callback(_refreshing.discard)
+            return last['value']
+    return await _afly(key, version, compute)
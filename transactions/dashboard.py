@@ -0,0 +1,245 @@
+"""
+Composite dashboard.
+
+The web dashboard shows the transaction summary, the recent transactions,
+the time series, the profile, the budget summary and the category stats.
+``/api/dashboard/`` computes any set of them in one request, and the
+standalone endpoints call the same functions. The inputs the widgets share
+are loaded at most once per request, and only for widgets that are not
+cached: the profile row, the analytics frame (every total is a group-by
+over it), the active budgets and the archived totals.
+
+A widget's result is cached under the user's data version (which budget
+and alert writes move too) and the local date, which the default periods
+follow.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import cached_property
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from budgets.models import Budget
+from budgets.serializers import BudgetSummarySerializer, CategoryStatsSerializer
+from .analytics import get_frame
+from .archive import archived_totals
+from .models import Transaction, UserProfile
+from .serializers import TransactionSerializer, UserProfileSerializer
+
+CACHE_TIMEOUT = 60 * 60
+RECENT_COUNT = 5
+# Days of history per time series period: 12 months, 12 weeks, 30 days
+TIME_SERIES_DAYS = {'month': 30 * 12, 'week': 7 * 12, 'day': 30}
+
+# Widget name -> the query parameters it takes (as ``<widget>.<param>``)
+WIDGETS = {
+    'summary': (),
+    'recent': (),
+    'time_series': ('period',),
+    'my_profile': (),
+    'budget_summary': ('year', 'month', 'week', 'period'),
+    'category_stats': ('year', 'month'),
+}
+
+
+def summarize_transactions(frame, archived):
+    """Income and expense totals, overall and per category, archived years included"""
+    income = frame.select('income')
+    expenses = frame.select('expense')
+
+    totals = {'income': frame.total(income), 'expense': frame.total(expenses)}
+    by_category = {
+        'income': {category: total for category, total, _ in frame.by_category(income)},
+        'expense': {category: total for category, total, _ in frame.by_category(expenses)},
+    }
+
+    # Fold in the pre-aggregated totals of archived years
+    for row in archived:
+        transaction_type = row['transaction_type']
+        totals[transaction_type] += row['total']
+        categories = by_category[transaction_type]
+        categories[row['category']] = categories.get(row['category'], 0) + row['total']
+
+    return {
+        'total_income': totals['income'],
+        'total_expenses': totals['expense'],
+        'expenses_by_category': [
+            {'category': category, 'total': total}
+            for category, total in by_category['expense'].items()
+        ],
+        'income_by_category': [
+            {'category': category, 'total': total}
+            for category, total in by_category['income'].items()
+        ],
+    }
+
+
+def build_time_series(frame, period='month', now=None):
+    """Income and expense totals per month, week or day for the charts"""
+    if period not in TIME_SERIES_DAYS:
+        period = 'month'
+    start_date = (now or timezone.now()) - timedelta(days=TIME_SERIES_DAYS[period])
+    return {
+        'income_series': [
+            {'period': start, 'total': total}
+            for start, total in frame.by_period(frame.select('income', start=start_date), period)
+        ],
+        'expense_series': [
+            {'period': start, 'total': total}
+            for start, total in frame.by_period(frame.select('expense', start=start_date), period)
+        ],
+    }
+
+
+def summarize_budgets(budgets, year, month, week=None, period='monthly'):
+    """Totals and status counts of ``budgets`` (all of one period) for a year, month or week"""
+    if not budgets:
+        return {
+            'total_budgets': 0,
+            'total_budget_amount': '0.00',
+            'total_spent': '0.00',
+            'total_remaining': '0.00',
+            'average_percentage_used': 0,
+            'budgets_over_limit': 0,
+            'budgets_at_warning': 0,
+            'budgets_on_track': 0,
+            'period': period,
+            'year': year,
+            'month': month if period == 'monthly' else None,
+            'week': week if period == 'weekly' else None
+        }
+
+    total_budget_amount = Decimal('0.00')
+    total_spent = Decimal('0.00')
+    total_remaining = Decimal('0.00')
+    percentage_sum = 0
+    budgets_over_limit = 0
+    budgets_at_warning = 0
+    budgets_on_track = 0
+
+    for budget in budgets:
+        spent = budget.get_spent_amount(year, month, week)
+        remaining = budget.get_remaining_amount(year, month, week)
+        percentage = budget.get_percentage_used(year, month, week)
+        status = budget.get_status(year, month, week)
+
+        total_budget_amount += budget.amount
+        total_spent += spent
+        total_remaining += remaining
+        percentage_sum += percentage
+
+        if status == 'over':
+            budgets_over_limit += 1
+        elif status in ['warning', 'caution']:
+            budgets_at_warning += 1
+        else:
+            budgets_on_track += 1
+
+    return BudgetSummarySerializer({
+        'total_budgets': len(budgets),
+        'total_budget_amount': total_budget_amount,
+        'total_spent': total_spent,
+        'total_remaining': total_remaining,
+        'average_percentage_used': round(percentage_sum / len(budgets), 1),
+        'budgets_over_limit': budgets_over_limit,
+        'budgets_at_warning': budgets_at_warning,
+        'budgets_on_track': budgets_on_track,
+        'period': period,
+        'year': year,
+        'month': month if period == 'monthly' else None,
+        'week': week if period == 'weekly' else None
+    }).data
+
+
+def build_category_stats(frame, budgets, year, month):
+    """A month's spending per category against the monthly ``budgets``"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime(year, month, 1), tz)
+    end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1), tz)
+    budgets = {budget.category_ref_id: budget for budget in budgets}
+    category_ids = dict(zip(frame.categories, frame.category_ids))
+
+    stats = []
+    for category, total, count in frame.by_category(frame.select('expense', start=start, end=end)):
+        if not category:
+            continue
+        budget = budgets.get(category_ids[category])
+        stat_data = {
+            'category': category,
+            'total_spent': total,
+            'transaction_count': count,
+            'average_transaction': total / count,
+            'has_budget': budget is not None
+        }
+        if budget:
+            stat_data['budget_amount'] = budget.amount
+            stat_data['budget_status'] = budget.get_status(year, month)
+        stats.append(stat_data)
+
+    return {'category_stats': CategoryStatsSerializer(stats, many=True).data}
+
+
+class Dashboard:
+    """The widgets of one user for one request"""
+
+    def __init__(self, user, now=None):
+        self.user = user
+        self.now = timezone.localtime(now)
+
+    @cached_property
+    def profile(self):
+        profile, _ = UserProfile.objects.select_related('user').get_or_create(
+            user=self.user, defaults={'balance': 0},
+        )
+        return profile
+
+    @cached_property
+    def frame(self):
+        return get_frame(self.user.pk)
+
+    @cached_property
+    def budgets(self):
+        """Every active budget; the budget widgets filter them by period"""
+        return list(Budget.objects.filter(user=self.user, is_active=True))
+
+    def widget(self, name, params):
+        """
+        Data of widget ``name`` with ``params`` (strings, as sent), from the
+        cache or computed; raises ValueError for a malformed parameter
+        """
+        key = "dashboard:{}:{}:{}:{}:{}".format(
+            self.user.pk, self.profile.data_version, self.now.date().isoformat(), name,
+            urlencode(sorted(params.items())),
+        )
+        data = cache.get(key)
+        if data is None:
+            data = getattr(self, name)(**params)
+            cache.set(key, data, CACHE_TIMEOUT)
+        return data
+
+    def summary(self):
+        return summarize_transactions(self.frame, archived_totals(self.user))
+
+    def recent(self):
+        rows = Transaction.objects.filter(user=self.user).select_related('user').order_by('-date')[:RECENT_COUNT]
+        return [dict(row) for row in TransactionSerializer(rows, many=True).data]
+
+    def time_series(self, period='month'):
+        return build_time_series(self.frame, period, self.now)
+
+    def my_profile(self):
+        return dict(UserProfileSerializer(self.profile).data)
+
+    def budget_summary(self, year=None, month=None, week=None, period='monthly'):
+        budgets = [budget for budget in self.budgets if budget.period == period]
+        return dict(summarize_budgets(
+            budgets, int(year or self.now.year), int(month or self.now.month), week, period,
+        ))
+
+    def category_stats(self, year=None, month=None):
+        budgets = [budget for budget in self.budgets if budget.period == 'monthly']
+        stats = build_category_stats(self.frame, budgets, int(year or self.now.year), int(month or self.now.month))
+        return {'category_stats': [dict(row) for row in stats['category_stats']]}
@@ -0,0 +1,135 @@
+"""
+ASGI endpoint of the /api/events/ server-sent events stream.
+
+``backend.asgi`` sends this path here instead of through Django's request
+handling, which gives every request a thread of its own for sync
+middleware and ORM calls and keeps it until the response ends (for a
+stream, never). Here the session, the user and the current balance are
+loaded in one short hop to Django's sync thread, and the open stream is
+only a coroutine waiting on its queue (see ``backend.events``).
+"""
+
+import asyncio
+import json
+from importlib import import_module
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+from backend.events import broker, format_event
+from backend.sharding import user_shard
+from .authentication import cached_user_has_device
+from .models import UserProfile
+
+PATH = '/api/events/'
+# Seconds between keep-alive comments on an idle stream, so proxies do not
+# drop it
+HEARTBEAT_SECONDS = 15
+OTP_AUTHENTICATION = 'transactions.authentication.TwoFactorAuthentication'
+
+
+def _authenticate(request):
+    """The session's user, or None if signed out or still owing an OTP check"""
+    close_old_connections()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    user = get_user(request)
+    if not user.is_authenticated:
+        return None
+    # Same rule as TwoFactorAuthentication; EventSource cannot send the OTP
+    # header, so only a session that already passed the check is accepted
+    if (
+        OTP_AUTHENTICATION in settings.REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES']
+        and not request.session.get('otp_verified')
+        and cached_user_has_device(user)
+    ):
+        return None
+    return user
+
+
+def _current_balance(user_id):
+    with user_shard(user_id):
+        profile = UserProfile.objects.filter(user_id=user_id).values('balance', 'change_seq').first()
+    close_old_connections()
+    return profile
+
+
+def _cors_headers(request):
+    origin = request.headers.get('Origin')
+    if origin not in settings.CORS_ALLOWED_ORIGINS:
+        return []
+    headers = [(b'access-control-allow-origin', origin.encode()), (b'vary', b'Origin')]
+    if settings.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+async def _respond(send, status, body, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def event_stream(scope, receive, send):
+    """
+    ``balance`` whenever the user's balance changes (the current one first)
+    and ``budget_alert`` for every new budget alert
+    """
+    request = ASGIRequest(scope, BytesIO())
+    cors = _cors_headers(request)
+    if request.method != 'GET':
+        await _respond(send, 405, {'detail': f'Method "{request.method}" not allowed.'}, cors)
+        return
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        await _respond(send, 401, {'detail': 'Authentication credentials were not provided.'}, cors)
+        return
+
+    # Subscribed before reading, so no change falls in between
+    queue = broker.subscribe(user.pk)
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    try:
+        profile = await sync_to_async(_current_balance)(user.pk)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *cors,
+            ],
+        })
+        frame = f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+        if profile is not None:
+            frame += format_event('balance', profile)
+        while True:
+            await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+            received = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {received, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                received.cancel()
+                return
+            if received in done:
+                frame = received.result()
+            else:
+                received.cancel()
+                frame = ": keep-alive\n\n"
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(user.pk, queue)
@@ -0,0 +1,113 @@
+"""
+Cash-flow forecast over the analytics frame.
+
+History is bucketed like ``time_series`` (Monday weeks or calendar months)
+into a (type, category) x period matrix. A series that shows up in most
+periods with a steady amount is treated as recurring and projected at its
+median; anything else is projected at its exponentially smoothed level.
+The current period only gets what is still expected on top of what already
+happened, and the balance is rolled forward from ``UserProfile.balance``.
+"""
+
+import warnings
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .analytics import cents_to_decimal, data_version, get_frame, period_index, period_start
+
+HISTORY_PERIODS = {'week': 26, 'month': 12}
+MAX_HORIZON = {'week': 52, 'month': 24}
+# Smoothing factor for non-recurring series; higher follows recent periods
+SMOOTHING = 0.5
+# Recurring: present in >= 75% of periods, amount varying by <= 25%
+RECURRING_PRESENCE = 0.75
+RECURRING_VARIATION = 0.25
+CACHE_TIMEOUT = 60 * 60
+
+
+def forecast(frame, balance, period='month', horizon=6, now=None):
+    import numpy as np
+
+    history = HISTORY_PERIODS[period]
+    now = timezone.localtime(now)
+    current = int(period_index(np.array([now.replace(tzinfo=None)], dtype='datetime64[us]'), period)[0])
+    index = frame.period_index(period)
+
+    # Row per (category, type): even rows income, odd rows expense
+    groups = frame.category_codes.astype(np.int64) * 2 + frame.is_expense
+    size = len(frame.categories) * 2
+    # Only count periods since the user's first transaction; future-dated
+    # transactions are no history
+    first = min(max(current - history, int(index.min()) if len(index) else current), current)
+    seen = (index >= first) & (index < current)
+    matrix = np.zeros((size, current - first))
+    np.add.at(matrix, (groups[seen], index[seen] - first), frame.cents[seen])
+
+    if matrix.shape[1]:
+        present = matrix > 0
+        amounts = np.where(present, matrix, np.nan)
+        # Rows that never occurred are all-NaN; they get median 0 and are not recurring
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nan_to_num(np.nanmedian(amounts, axis=1))
+            variation = np.nan_to_num(np.nanstd(amounts, axis=1) / np.nanmean(amounts, axis=1), nan=np.inf)
+        recurring = (
+            (present.mean(axis=1) >= RECURRING_PRESENCE)
+            & (variation <= RECURRING_VARIATION)
+            & (matrix.shape[1] >= 3)
+        )
+        level = matrix[:, 0]
+        for column in matrix.T[1:]:
+            level = SMOOTHING * column + (1 - SMOOTHING) * level
+        per_period = np.where(recurring, median, level)
+    else:
+        recurring = np.zeros(size, dtype=bool)
+        per_period = np.zeros(size)
+
+    in_current = index == current
+    so_far = np.bincount(groups[in_current], weights=frame.cents[in_current], minlength=size)
+    is_expense = np.arange(size) % 2 == 1
+
+    periods = []
+    running = int(balance * 100)
+    for offset in range(horizon):
+        expected = np.maximum(per_period - so_far, 0) if offset == 0 else per_period
+        income = round(expected[~is_expense].sum())
+        expenses = round(expected[is_expense].sum())
+        running += income - expenses
+        periods.append({
+            'period': period_start(current + offset, period),
+            'income': cents_to_decimal(income),
+            'expenses': cents_to_decimal(expenses),
+            'balance': cents_to_decimal(running),
+        })
+
+    categories = [
+        {
+            'category': frame.categories[group // 2],
+            'transaction_type': 'expense' if group % 2 else 'income',
+            'recurring': bool(recurring[group]),
+            'per_period': cents_to_decimal(round(per_period[group])),
+        }
+        for group in np.argsort(-per_period, kind='stable').tolist()
+        if round(per_period[group])
+    ]
+    return {
+        'period': period,
+        'horizon': horizon,
+        'starting_balance': balance,
+        'forecast': periods,
+        'categories': categories,
+    }
+
+
+def cached_forecast(user, period='month', horizon=6):
+    """forecast() for ``user``, cached until their data version or the day changes"""
+    now = timezone.localtime()
+    key = f"forecast:{user.pk}:{data_version(user.pk)}:{period}:{horizon}:{now.date().isoformat()}"
+    result = cache.get(key)
+    if result is None:
+        result = forecast(get_frame(user.pk), user.userprofile.balance, period, horizon, now)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,92 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A view method wrapped in ``idempotent`` runs in one database transaction
+together with the insert of its key row; the successful response is stored
+on that row. A retry with the same key replays the stored response without
+running the view, and a concurrent duplicate blocks on the unique
+(user, key) index until the first request commits, then replays. Failed
+requests store nothing, so the client may retry them with the same key.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _fingerprint(request):
+    # The parsed data rather than the body, which a multipart or streamed
+    # request no longer has once DRF has read it
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode()
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'error': f'{HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def _live_record(user, key):
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None and record.created_at < cutoff:
+        record.delete()
+        return None
+    return record
+
+
+def idempotent(view_method):
+    """Make a DRF view method replayable under the Idempotency-Key header"""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({'error': f'{HEADER} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        record = _live_record(request.user, key)
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        try:
+            with transaction.atomic(using=router.db_for_write(IdempotencyKey)):
+                record = IdempotencyKey.objects.create(user=request.user, key=key, fingerprint=fingerprint)
+                response = view_method(self, request, *args, **kwargs)
+                if not status.is_success(response.status_code):
+                    transaction.set_rollback(True)
+                    return response
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+                return response
+        except IntegrityError:
+            # Lost the race to a concurrent request with the same key
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                raise
+            return _replay(record, fingerprint)
+    return wrapper
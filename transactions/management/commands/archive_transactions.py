@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+
+from backend.sharding import user_shard
+from transactions.archive import archive_user_year
+from transactions.models import Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Move transactions from closed years into compressed per-user yearly "
+        "archives under TRANSACTION_ARCHIVE_ROOT, keeping per-category totals in "
+        "the database. Safe to re-run; late rows are merged into existing archives."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-years", type=int, default=2,
+                            help="Archive years that ended at least this many years ago (default: 2)")
+        parser.add_argument("--user", help="Only archive this username")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would be archived without changing anything")
+
+    def handle(self, *args, **options):
+        last_year = timezone.localdate().year - options["older_than_years"]
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+
+        moved = 0
+        for user in users.iterator():
+            with user_shard(user.pk):
+                first = Transaction.objects.filter(user=user).aggregate(first=Min("date"))["first"]
+            if first is None:
+                continue
+            for year in range(timezone.localtime(first).year, last_year + 1):
+                if options["dry_run"]:
+                    with user_shard(user.pk):
+                        count = Transaction.objects.filter(user=user, date__year=year).count()
+                else:
+                    count = archive_user_year(user, year)
+                if count:
+                    self.stdout.write(f"{user.username}: {year} -> {count} transactions")
+                    moved += count
+
+        verb = "Would archive" if options["dry_run"] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} transactions up to {last_year}."))
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from backend.sharding import user_shard
+from transactions.balances import build_checkpoints
+
+
+class Command(BaseCommand):
+    help = (
+        "Add monthly balance checkpoints for the months started since the "
+        "last run. Writes keep existing checkpoints current; run this monthly "
+        "(e.g. on the 1st)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only checkpoint this username")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recompute every checkpoint from the ledger")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+
+        total = 0
+        for user_id in users.values_list("pk", flat=True).iterator():
+            with user_shard(user_id):
+                total += build_checkpoints(user_id, rebuild=options["rebuild"])
+        self.stdout.write(self.style.SUCCESS(f"Created {total} balance checkpoints."))
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from transactions.anomalies import WINDOW_DAYS, compute_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-category expense statistics that new transactions "
+        "are checked against for anomalies. Run periodically (e.g. nightly)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only recompute this username")
+        parser.add_argument("--window-days", type=int, default=WINDOW_DAYS,
+                            help=f"Rolling window of expenses to use (default: {WINDOW_DAYS})")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+
+        total = 0
+        for user_id in users.values_list("pk", flat=True).iterator():
+            total += compute_statistics(user_id, options["window_days"])
+        self.stdout.write(self.style.SUCCESS(f"Stored statistics for {total} categories."))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from transactions.recurring import BATCH_SIZE, materialize_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Post every due occurrence of the users' recurring transactions. "
+        "Run periodically (e.g. hourly); re-running is always safe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                            help=f"Rules materialized per database transaction (default: {BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        total = 0
+        # Rules live next to their user's transactions, so walk every shard
+        for alias in settings.SHARD_DATABASES or [DEFAULT_DB_ALIAS]:
+            created = materialize_due(using=alias, batch_size=options["batch_size"])
+            if created:
+                self.stdout.write(f"{alias}: {created} transactions")
+            total += created
+        self.stdout.write(self.style.SUCCESS(f"Posted {total} recurring transactions."))
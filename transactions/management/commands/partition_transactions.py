@@ -0,0 +1,182 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from transactions.models import Category, RecurringTransaction, Transaction
+
+PARENT = Transaction._meta.db_table
+DEFAULT_PARTITION = f"{PARENT}_default"
+LEGACY_TABLE = f"{PARENT}_unpartitioned"
+SEQUENCE = f"{PARENT}_part_id_seq"
+
+
+def add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start):
+    return f"{PARENT}_p{month_start.year:04d}_{month_start.month:02d}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage monthly range partitions of the transaction table on PostgreSQL: "
+        "convert the table once with --convert, then run regularly to pre-create "
+        "future partitions and optionally detach old ones. No-op on other databases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS,
+                            help="Database alias to manage (e.g. a shard)")
+        parser.add_argument("--convert", action="store_true",
+                            help="Convert the existing table into a partitioned table (takes a lock)")
+        parser.add_argument("--ahead", type=int, default=3,
+                            help="Months of future partitions to keep ready (default: 3)")
+        parser.add_argument("--retain-months", type=int, default=None,
+                            help="Detach partitions that ended more than this many months ago")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "postgresql":
+            self.stdout.write(
+                f"{connection.vendor} does not support declarative partitioning; "
+                f"{PARENT} stays a single table."
+            )
+            return
+
+        with connection.cursor() as cursor:
+            self.cursor = cursor
+            partitioned = self.is_partitioned()
+            if options["convert"]:
+                if partitioned:
+                    self.stdout.write(f"{PARENT} is already partitioned.")
+                else:
+                    self.convert(connection, options["ahead"])
+                partitioned = True
+            if not partitioned:
+                raise CommandError(f"{PARENT} is not partitioned yet; run with --convert first.")
+
+            this_month = date.today().replace(day=1)
+            with transaction.atomic(using=connection.alias):
+                for offset in range(options["ahead"] + 1):
+                    self.ensure_partition(add_months(this_month, offset))
+            if options["retain_months"] is not None:
+                self.detach_older_than(add_months(this_month, -options["retain_months"]))
+
+    def is_partitioned(self):
+        self.cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [PARENT])
+        row = self.cursor.fetchone()
+        return bool(row) and row[0] == "p"
+
+    def existing_partitions(self):
+        self.cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT],
+        )
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def ensure_partition(self, month_start):
+        """
+        Create the partition for ``month_start``. Rows that landed in the
+        default partition for that month are moved into it before attaching.
+        """
+        name = partition_name(month_start)
+        if name in self.existing_partitions():
+            return
+        lower, upper = month_start.isoformat(), add_months(month_start, 1).isoformat()
+        self.cursor.execute(f'CREATE TABLE "{name}" (LIKE "{PARENT}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        self.cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM "{DEFAULT_PARTITION}"
+                WHERE date >= %s::timestamptz AND date < %s::timestamptz
+                RETURNING *
+            )
+            INSERT INTO "{name}" SELECT * FROM moved
+            """,
+            [f"{lower} 00:00:00+00", f"{upper} 00:00:00+00"],
+        )
+        self.cursor.execute(
+            f"""ALTER TABLE "{PARENT}" ATTACH PARTITION "{name}"
+            FOR VALUES FROM ('{lower} 00:00:00+00') TO ('{upper} 00:00:00+00')"""
+        )
+        self.stdout.write(f"Created partition {name}")
+
+    def detach_older_than(self, cutoff):
+        """Detach monthly partitions whose range ends on or before ``cutoff``"""
+        prefix = f"{PARENT}_p"
+        for name in sorted(self.existing_partitions()):
+            if not name.startswith(prefix):
+                continue
+            year, month = (int(part) for part in name[len(prefix):].split("_"))
+            if add_months(date(year, month, 1), 1) <= cutoff:
+                self.cursor.execute(f'ALTER TABLE "{PARENT}" DETACH PARTITION "{name}"')
+                self.stdout.write(f"Detached partition {name} (table kept for archival)")
+
+    def convert(self, connection, ahead):
+        """
+        Swap the plain table for a table partitioned by RANGE (date).
+
+        The primary key becomes (id, date), as PostgreSQL requires the
+        partition key in it; ids still come from a single sequence. The old
+        table is kept as ``<table>_unpartitioned`` until dropped by hand.
+        """
+        cursor = self.cursor
+        with transaction.atomic(using=connection.alias):
+            cursor.execute(f'LOCK TABLE "{PARENT}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1, MIN(date) FROM "{PARENT}"')
+            next_id, first_date = cursor.fetchone()
+            cursor.execute(f'ALTER TABLE "{PARENT}" RENAME TO "{LEGACY_TABLE}"')
+            cursor.execute(
+                f'CREATE TABLE "{PARENT}" (LIKE "{LEGACY_TABLE}" INCLUDING DEFAULTS) PARTITION BY RANGE (date)'
+            )
+            # The old table keeps its "<table>_pkey" name, so name this one explicitly
+            cursor.execute(f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{PARENT}_part_pkey" PRIMARY KEY (id, date)')
+            cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" START WITH {int(next_id)} OWNED BY "{PARENT}".id')
+            cursor.execute(f'ALTER TABLE "{PARENT}" ALTER COLUMN id SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+            cursor.execute(
+                f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{PARENT}_user_id_fk" '
+                f'FOREIGN KEY (user_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED'
+            )
+            cursor.execute(
+                f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{PARENT}_recurring_id_fk" '
+                f'FOREIGN KEY (recurring_id) REFERENCES "{RecurringTransaction._meta.db_table}" (id) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+            cursor.execute(
+                f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{PARENT}_category_ref_id_fk" '
+                f'FOREIGN KEY (category_ref_id) REFERENCES "{Category._meta.db_table}" (id) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+            # Includes the partition key, so it can stay a real constraint
+            cursor.execute(
+                f'ALTER TABLE "{PARENT}" ADD CONSTRAINT "{PARENT}_part_recurring_occurrence" '
+                f'UNIQUE (recurring_id, date)'
+            )
+            # Every per-user query is bounded by date
+            cursor.execute(f'CREATE INDEX "{PARENT}_user_date_idx" ON "{PARENT}" (user_id, date)')
+            # Category list and per-category spending
+            cursor.execute(
+                f'CREATE INDEX "{PARENT}_user_category_date_idx" ON "{PARENT}" (user_id, category_ref_id, date)'
+            )
+            # Serves /api/sync/
+            cursor.execute(f'CREATE INDEX "{PARENT}_user_change_seq_idx" ON "{PARENT}" (user_id, change_seq)')
+            cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{PARENT}" DEFAULT')
+
+            this_month = date.today().replace(day=1)
+            month = first_date.date().replace(day=1) if first_date else this_month
+            while month <= add_months(this_month, ahead):
+                self.ensure_partition(month)
+                month = add_months(month, 1)
+
+            cursor.execute(f'INSERT INTO "{PARENT}" SELECT * FROM "{LEGACY_TABLE}"')
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted {PARENT} to monthly partitions; drop {LEGACY_TABLE} once verified."
+        ))
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from backend.sharding import user_shard
+from transactions.views import update_user_balance
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate profile balances from the ledger (live and archived "
+        "transactions). Writes keep balances current; use this for repairs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only recompute this username")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+
+        count = 0
+        for user in users.iterator():
+            with user_shard(user.pk):
+                update_user_balance(user)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {count} balances."))
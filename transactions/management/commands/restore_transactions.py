@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.sharding import user_shard
+from transactions.archive import restore_archive
+from transactions.models import TransactionArchive
+
+
+class Command(BaseCommand):
+    help = "Move archived transactions of a user back into the transaction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username to restore")
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument("--year", type=int, help="Restore a single archived year")
+        group.add_argument("--all", action="store_true", help="Restore every archived year")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']!r}")
+
+        with user_shard(user.pk):
+            archives = TransactionArchive.objects.filter(user=user)
+            if options["year"] is not None:
+                archives = archives.filter(year=options["year"])
+            archives = list(archives)
+        if not archives:
+            raise CommandError(f"No archive to restore for {user.username}")
+
+        for archive in archives:
+            count = restore_archive(archive)
+            self.stdout.write(f"{user.username}: {archive.year} -> {count} transactions restored")
@@ -0,0 +1,86 @@
+# Generated by Django 5.1 on 2026-10-19 03:12
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+
+def category_key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def normalize_categories(apps, schema_editor):
+    """
+    Create one category per user and spelling up to case and spacing, named
+    after its most used spelling, and point transactions and budgets at it.
+    Of budgets that become duplicates (same category and period) one active
+    budget is kept; the others are deactivated under their old spelling.
+    """
+    db = schema_editor.connection.alias
+    Category = apps.get_model('transactions', 'Category')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    CategoryStatistics = apps.get_model('transactions', 'CategoryStatistics')
+    UserProfile = apps.get_model('transactions', 'UserProfile')
+    Budget = apps.get_model('budgets', 'Budget')
+
+    user_ids = set(Transaction.objects.using(db).values_list('user_id', flat=True).distinct())
+    user_ids |= set(Budget.objects.using(db).values_list('user_id', flat=True).distinct())
+    for user_id in sorted(user_ids):
+        transactions = Transaction.objects.using(db).filter(user_id=user_id)
+        spellings = [
+            name for name, _, _ in transactions.order_by().values_list('category')
+            .annotate(uses=Count('pk'), first=Min('pk')).order_by('-uses', 'first')
+        ]
+        budgets = list(Budget.objects.using(db).filter(user_id=user_id).order_by('created_at', 'pk'))
+        names = {}
+        for name in spellings + [budget.category for budget in budgets]:
+            names.setdefault(category_key(name), ' '.join(name.split()))
+        Category.objects.using(db).bulk_create([
+            Category(user_id=user_id, name=name, key=key) for key, name in names.items()
+        ])
+        ids = dict(Category.objects.using(db).filter(user_id=user_id).values_list('key', 'pk'))
+        # Among duplicates, keep an active budget, preferably one spelled like its category
+        budgets.sort(key=lambda budget: (not budget.is_active, budget.category != names[category_key(budget.category)]))
+
+        changed = False
+        for name in spellings:
+            key = category_key(name)
+            transactions.filter(category=name).update(category=names[key], category_ref_id=ids[key])
+            changed |= name != names[key]
+        if changed:
+            # Recomputed by compute_spending_stats under the new names
+            CategoryStatistics.objects.using(db).filter(user_id=user_id).delete()
+
+        kept = set()
+        spelled = {(budget.category, budget.period) for budget in budgets}
+        for budget in budgets:
+            key = category_key(budget.category)
+            budget.category_ref_id = ids[key]
+            if (key, budget.period) in kept:
+                budget.is_active = False
+                changed = True
+                continue
+            kept.add((key, budget.period))
+            # Unless a deactivated duplicate already has the name
+            if budget.category != names[key] and (names[key], budget.period) not in spelled:
+                budget.category = names[key]
+                changed = True
+        Budget.objects.using(db).bulk_update(budgets, ['category', 'category_ref', 'is_active'], batch_size=1000)
+
+        if changed:
+            # Rows changed without new change numbers, so sync cursors from
+            # before must start over
+            UserProfile.objects.using(db).filter(user_id=user_id).update(
+                change_seq=F('change_seq') + 1, sync_reset=F('change_seq') + 1,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_categories'),
+        ('budgets', '0003_budget_category_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-19 03:10
+
+import time
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_category_restrict'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='data_version',
+            field=models.BigIntegerField(default=time.time_ns),
+        ),
+    ]
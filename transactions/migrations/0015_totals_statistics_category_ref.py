@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-19 04:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0014_profile_data_version'),
+    ]
+
+    operations = [
+        # Nullable until 0016 has filled them in
+        migrations.AddField(
+            model_name='archivedtotal',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='archived_totals', to='transactions.category'),
+        ),
+        migrations.AddField(
+            model_name='categorystatistics',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='statistics', to='transactions.category'),
+        ),
+    ]
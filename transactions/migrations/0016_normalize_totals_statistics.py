@@ -0,0 +1,71 @@
+# Generated by Django 5.1 on 2026-10-19 04:04
+
+from django.db import migrations
+
+
+def category_key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def normalize_totals_statistics(apps, schema_editor):
+    """
+    Point archived totals and spending statistics at the user's category
+    for their spelling, creating categories only ever used in archived
+    years. Archived totals of one archive, type and category are merged;
+    of statistics that become duplicates only the one with the most samples
+    is kept until compute_spending_stats runs again.
+    """
+    db = schema_editor.connection.alias
+    Category = apps.get_model('transactions', 'Category')
+    ArchivedTotal = apps.get_model('transactions', 'ArchivedTotal')
+    CategoryStatistics = apps.get_model('transactions', 'CategoryStatistics')
+
+    totals = list(ArchivedTotal.objects.using(db).select_related('archive').order_by('pk'))
+    statistics = list(CategoryStatistics.objects.using(db).order_by('-count', 'pk'))
+    names = {}
+    for user_id, name in [(row.archive.user_id, row.category) for row in totals] + [
+        (row.user_id, row.category) for row in statistics
+    ]:
+        names.setdefault((user_id, category_key(name)), ' '.join(name.split()))
+    categories = {
+        (category.user_id, category.key): category
+        for category in Category.objects.using(db).filter(user_id__in={user_id for user_id, _ in names})
+    }
+    Category.objects.using(db).bulk_create([
+        Category(user_id=user_id, name=name, key=key)
+        for (user_id, key), name in names.items() if (user_id, key) not in categories
+    ])
+    categories = {
+        (category.user_id, category.key): category
+        for category in Category.objects.using(db).filter(user_id__in={user_id for user_id, _ in names})
+    }
+
+    merged = {}
+    for row in totals:
+        category = categories[(row.archive.user_id, category_key(row.category))]
+        kept = merged.setdefault((row.archive_id, row.transaction_type, category.pk), row)
+        if kept is not row:
+            kept.total += row.total
+            kept.count += row.count
+        kept.category, kept.category_ref_id = category.name, category.pk
+    ArchivedTotal.objects.using(db).exclude(pk__in=[row.pk for row in merged.values()]).delete()
+    ArchivedTotal.objects.using(db).bulk_update(merged.values(), ['category', 'category_ref', 'total', 'count'], batch_size=1000)
+
+    kept = {}
+    for row in statistics:
+        category = categories[(row.user_id, category_key(row.category))]
+        row.category, row.category_ref_id = category.name, category.pk
+        kept.setdefault((row.user_id, category.pk), row)
+    CategoryStatistics.objects.using(db).exclude(pk__in=[row.pk for row in kept.values()]).delete()
+    CategoryStatistics.objects.using(db).bulk_update(kept.values(), ['category', 'category_ref'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0015_totals_statistics_category_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_totals_statistics, migrations.RunPython.noop),
+    ]
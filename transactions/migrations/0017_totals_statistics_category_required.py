@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-19 04:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0016_normalize_totals_statistics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedtotal',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.RESTRICT, related_name='archived_totals', to='transactions.category'),
+        ),
+        migrations.AlterField(
+            model_name='categorystatistics',
+            name='category_ref',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.RESTRICT, related_name='statistics', to='transactions.category'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categorystatistics',
+            unique_together={('user', 'category_ref')},
+        ),
+    ]
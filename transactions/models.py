@@ -1,7 +1,74 @@
-from django.db import models
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import models, router, transaction
+from django.db.models import Case, DecimalField, F, Max, Sum, When
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from backend.events import publish
+
+
+def category_key(name):
+    """Case- and whitespace-insensitive form of a category name"""
+    return ' '.join(name.split()).casefold()
+
+
+class Category(models.Model):
+    """
+    One of a user's categories. Transactions, budgets, archived totals and
+    spending statistics keep its name in ``category`` and refer to it by id,
+    so spellings that differ only in case or spacing are one category and
+    grouping runs on integers.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories')
+    # The first spelling used, with spacing collapsed
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name_plural = 'categories'
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='unique_category_key')]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.name}"
+
+    @classmethod
+    def resolve(cls, user_id, names, using):
+        """{name: Category} for ``names`` of ``user_id``, creating the missing ones"""
+        spellings = {}
+        for name in names:
+            spellings.setdefault(category_key(name), ' '.join(name.split()))
+        categories = cls.objects.using(using).filter(user_id=user_id, key__in=spellings)
+        found = {category.key: category for category in categories}
+        missing = [
+            cls(user_id=user_id, name=name, key=key) for key, name in spellings.items() if key not in found
+        ]
+        if missing:
+            # A concurrent writer may create the same ones
+            cls.objects.using(using).bulk_create(missing, ignore_conflicts=True)
+            categories = cls.objects.using(using).filter(user_id=user_id, key__in=[row.key for row in missing])
+            found.update((category.key, category) for category in categories)
+        return {name: found[category_key(name)] for name in names}
+
+
+def assign_categories(rows, using):
+    """
+    Point transactions or budgets at their users' categories before they
+    are saved (bulk_create skips save()), spelling ``category`` like the
+    category does
+    """
+    names = defaultdict(set)
+    for row in rows:
+        names[row.user_id].add(row.category)
+    resolved = {user_id: Category.resolve(user_id, user_names, using) for user_id, user_names in names.items()}
+    for row in rows:
+        row.category_ref = resolved[row.user_id][row.category]
+        row.category = row.category_ref.name
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = (
         ('income', 'Income'),
@@ -16,30 +83,364 @@ class Transaction(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     # Category of income or expense
     category = models.CharField(max_length=50)
+    # Set from ``category`` on save
+    category_ref = models.ForeignKey(
+        Category, on_delete=models.RESTRICT, related_name='transactions', editable=False
+    )
     description = models.TextField(blank=True, null=True)
     # Allow client to provide a specific datetime; default to now
     date = models.DateTimeField(default=timezone.now)
+    # Set on occurrences materialized from a recurring rule
+    recurring = models.ForeignKey(
+        'RecurringTransaction', on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences'
+    )
+    # Last write, as a time and as a number in the user's change sequence
+    # (see UserProfile.record_changes)
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0)
 
-    def save(self, *args, **kwargs):
-        # Get the user's profile to update the balance
-        user_profile = self.user.userprofile
+    class Meta:
+        constraints = [
+            # One occurrence per rule and due date, so the scheduler never double-posts
+            models.UniqueConstraint(fields=['recurring', 'date'], name='unique_recurring_occurrence'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'change_seq'], name='transaction_sync_idx'),
+            models.Index(fields=['user', 'category_ref', 'date'], name='transaction_category_idx'),
+        ]
 
-        # Adjust balance based on transaction type
-        if self.transaction_type == 'income':
-            user_profile.balance += self.amount
-        elif self.transaction_type == 'expense':
-            user_profile.balance -= self.amount
+    def signed_amount(self):
+        return self.amount if self.transaction_type == 'income' else -self.amount
 
-        user_profile.save()
-        super(Transaction, self).save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        # Move the balance by this write's delta with a single
+        # UPDATE ... SET balance = balance + delta in the same database
+        # transaction as the row, so parallel writers never lose updates.
+        # Balance checkpoints after the old and new dates move the same way.
+        using = kwargs.get('using') or router.db_for_write(Transaction, instance=self)
+        with transaction.atomic(using=using):
+            changes = [(self.date, self.signed_amount())]
+            if not self._state.adding:
+                previous = (
+                    Transaction.objects.using(using).select_for_update()
+                    .filter(pk=self.pk).values_list('transaction_type', 'amount', 'date').first()
+                )
+                if previous is not None:
+                    changes.append((previous[2], previous[1] if previous[0] == 'expense' else -previous[1]))
+            self.change_seq = UserProfile.record_changes(
+                self.user_id, using, balance_delta=sum(amount for _, amount in changes)
+            )
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or 'category' in update_fields:
+                assign_categories([self], using)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'updated_at', 'change_seq'}
+                if 'category' in update_fields:
+                    kwargs['update_fields'].add('category_ref')
+            super(Transaction, self).save(*args, **kwargs)
+            BalanceCheckpoint.shift(self.user_id, changes, using)
 
-    def __str__(self):
-        return f"{self.user.username}: {self.transaction_type.capitalize()} of {self.amount}"
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Transaction, instance=self)
+        with transaction.atomic(using=using):
+            # Like save(), go by the locked row rather than this instance, so
+            # a concurrent edit or delete of it is not counted twice
+            current = (
+                Transaction.objects.using(using).select_for_update()
+                .filter(pk=self.pk).values_list('transaction_type', 'amount', 'date').first()
+            )
+            if current is None:
+                return 0, {}
+            transaction_type, amount, date = current
+            delta = amount if transaction_type == 'expense' else -amount
+            change_seq = UserProfile.record_changes(self.user_id, using, balance_delta=delta)
+            SyncTombstone.objects.using(using).create(
+                user_id=self.user_id, kind='transaction', object_id=self.pk, change_seq=change_seq,
+            )
+            result = super(Transaction, self).delete(*args, **kwargs)
+            BalanceCheckpoint.shift(self.user_id, [(date, delta)], using)
+        return result
 
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Last number handed out to a write of the user's transactions, budgets
+    # or alerts; /api/sync/ cursors point into this sequence
+    change_seq = models.BigIntegerField(default=0)
+    # Sequence number at which the user's rows were last renumbered (moved
+    # to another shard); older cursors must sync from scratch
+    sync_reset = models.BigIntegerField(default=0)
+    # Time of the last write, as the analytics data version. Unlike
+    # change_seq it never repeats after a rollback, so results cached from
+    # an uncommitted write are not reused
+    data_version = models.BigIntegerField(default=time.time_ns)
 
     def __str__(self):
         return f'{self.user.username} - Balance: {self.balance}'
+
+    @classmethod
+    def record_changes(cls, user_id, using, changes=1, balance_delta=0):
+        """
+        Reserve ``changes`` numbers of the user's change sequence, moving the
+        balance by ``balance_delta`` and the data version in the same UPDATE
+        (and announcing the new balance to the user's event streams); returns
+        the first number.
+        Call it inside the writing transaction: the profile row stays locked
+        until commit, so writes commit in sequence order. A missing profile
+        is rebuilt first (``rebuilt_defaults``).
+        """
+        profile = cls.objects.using(using).filter(user_id=user_id)
+        updates = {'change_seq': F('change_seq') + changes, 'data_version': time.time_ns()}
+        if balance_delta:
+            updates['balance'] = F('balance') + balance_delta
+        if not profile.update(**updates):
+            cls.objects.using(using).get_or_create(user_id=user_id, defaults=cls.rebuilt_defaults(user_id, using))
+            profile.update(**updates)
+        current = profile.values_list('change_seq', 'balance').first()
+        if balance_delta:
+            publish(user_id, 'balance', {'balance': current[1], 'change_seq': current[0]}, using)
+        return current[0] - changes + 1
+
+    @classmethod
+    def rebuilt_defaults(cls, user_id, using):
+        """
+        Profile fields of a user whose profile row is gone, as of the
+        current ledger: the balance of the live and archived transactions,
+        and a change sequence past every number already handed out, which
+        also makes every sync cursor start over.
+        """
+        from .archive import archived_totals  # archive imports this module
+
+        transactions = Transaction.objects.using(using).filter(user_id=user_id)
+        balance = transactions.aggregate(total=Sum(Case(
+            When(transaction_type='expense', then=-F('amount')), default=F('amount'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )))['total'] or 0
+        for row in archived_totals(user_id).using(using):
+            balance += row['total'] if row['transaction_type'] == 'income' else -row['total']
+
+        sources = [transactions, SyncTombstone.objects.using(using).filter(user_id=user_id)] + [
+            model.objects.using(using).filter(**{model.sync_user_lookup: user_id})
+            for model in ChangeTracked.__subclasses__()
+        ]
+        change_seq = max(source.aggregate(high=Max('change_seq'))['high'] or 0 for source in sources) + 1
+        return {'balance': balance, 'change_seq': change_seq, 'sync_reset': change_seq}
+
+
+class SyncTombstone(models.Model):
+    """A deleted transaction, budget or alert, reported by /api/sync/"""
+    KINDS = (
+        ('transaction', 'Transaction'),
+        ('budget', 'Budget'),
+        ('alert', 'Budget alert'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_tombstones')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'change_seq'], name='tombstone_sync_idx')]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.kind} {self.object_id} deleted at {self.change_seq}"
+
+
+class ChangeTracked(models.Model):
+    """
+    Numbers every save in the owner's change sequence and leaves a
+    SyncTombstone on delete, for /api/sync/
+    """
+    change_seq = models.BigIntegerField(default=0)
+
+    # SyncTombstone kind of this model
+    sync_kind = None
+    # Lookup of the owner's id, for queries over the model
+    sync_user_lookup = 'user_id'
+
+    class Meta:
+        abstract = True
+
+    def sync_user_id(self):
+        return self.user_id
+
+    def sync_tombstones(self):
+        """(kind, id) of every synced row this delete removes"""
+        return [(self.sync_kind, self.pk)]
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            self.change_seq = UserProfile.record_changes(self.sync_user_id(), using)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            user_id = self.sync_user_id()
+            removed = self.sync_tombstones()
+            first = UserProfile.record_changes(user_id, using, changes=len(removed))
+            SyncTombstone.objects.using(using).bulk_create([
+                SyncTombstone(user_id=user_id, kind=kind, object_id=object_id, change_seq=first + offset)
+                for offset, (kind, object_id) in enumerate(removed)
+            ])
+            return super().delete(*args, **kwargs)
+
+
+class TransactionArchive(models.Model):
+    """A closed year of a user's transactions moved to a compressed columnar file"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transaction_archives')
+    year = models.PositiveSmallIntegerField()
+    # Path relative to TRANSACTION_ARCHIVE_ROOT
+    path = models.CharField(max_length=255)
+    row_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'year']
+        ordering = ['year']
+
+    def __str__(self):
+        return f"{self.user_id}: {self.year} ({self.row_count} transactions)"
+
+
+class ArchivedTotal(models.Model):
+    """Pre-aggregated sums of an archive, so lifetime totals never read the file"""
+    archive = models.ForeignKey(TransactionArchive, on_delete=models.CASCADE, related_name='totals')
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=50)
+    category_ref = models.ForeignKey(
+        Category, on_delete=models.RESTRICT, related_name='archived_totals', editable=False
+    )
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.archive}: {self.transaction_type} {self.category} = {self.total}"
+
+
+class CategoryStatistics(models.Model):
+    """Rolling per-category expense statistics, refreshed by compute_spending_stats"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_statistics')
+    category = models.CharField(max_length=50)
+    category_ref = models.ForeignKey(
+        Category, on_delete=models.RESTRICT, related_name='statistics', editable=False
+    )
+    count = models.PositiveIntegerField()
+    mean = models.DecimalField(max_digits=12, decimal_places=2)
+    std = models.DecimalField(max_digits=12, decimal_places=2)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'category_ref']
+
+    def __str__(self):
+        return f"{self.user_id}: {self.category} mean {self.mean} ± {self.std} (n={self.count})"
+
+
+class SpendingAnomaly(models.Model):
+    REASONS = (
+        ('amount', 'Unusually large amount'),
+        ('new_category', 'New category'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spending_anomalies')
+    # No database constraint: a partitioned transaction table has the primary
+    # key (id, date) and cannot be referenced by id alone. Deletes still
+    # cascade through the ORM.
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.CASCADE, related_name='anomalies', db_constraint=False
+    )
+    reason = models.CharField(max_length=20, choices=REASONS)
+    message = models.TextField()
+    # Standard deviations above the category mean, for 'amount' anomalies
+    score = models.FloatField(null=True, blank=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user_id}: {self.reason} on transaction {self.transaction_id}"
+
+
+class RecurringTransaction(models.Model):
+    """A rule that the materialize_recurring command turns into transactions"""
+    FREQUENCIES = (
+        ('weekly', 'Every N weeks'),
+        ('monthly', 'Every N months on a day of the month'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_transactions')
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    category = models.CharField(max_length=50)
+    description = models.TextField(blank=True, null=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES, default='monthly')
+    interval = models.PositiveSmallIntegerField(default=1)
+    # Monthly rules: 1-31, clamped to the last day of shorter months
+    day_of_month = models.PositiveSmallIntegerField(null=True, blank=True)
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField(null=True, blank=True)
+    next_due = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['next_due']
+        indexes = [models.Index(fields=['is_active', 'next_due'], name='recurring_due_idx')]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.transaction_type} of {self.amount} {self.frequency}"
+
+
+class IdempotencyKey(models.Model):
+    """Response snapshot of a write sent with an Idempotency-Key header"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body; a reused key with another request is rejected
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key} ({self.status_code})"
+
+
+class BalanceCheckpoint(models.Model):
+    """Ledger balance at the start of a month: every transaction dated before it"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    # First day of the month, in the site time zone
+    month = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        unique_together = ['user', 'month']
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} at {self.month}"
+
+    @classmethod
+    def shift(cls, user_id, changes, using):
+        """Apply (date, delta) ledger changes to the checkpoints after each date"""
+        deltas = {}
+        for date, delta in changes:
+            day = timezone.localdate(date)
+            boundary = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+            deltas[boundary] = deltas.get(boundary, 0) + delta
+        for boundary, delta in sorted(deltas.items()):
+            if delta:
+                cls.objects.using(using).filter(user_id=user_id, month__gte=boundary).update(
+                    balance=F('balance') + delta
+                )
@@ -0,0 +1,112 @@
+"""
+Materialization of recurring transaction rules.
+
+``materialize_due`` works in batches of due rules (one query on the
+(is_active, next_due) index). Each batch runs in one database transaction:
+one ``bulk_create`` for every occurrence that fell due, one ``bulk_update``
+moving the rules' ``next_due`` forward and, per user, one profile update
+(balance, change numbers and the analytics data version, so web workers
+see the new rows), one checkpoint update and one anomaly check. A crash
+rolls the whole batch back, and the unique (recurring, date) constraint rejects a
+concurrent run posting the same occurrence, so re-running never
+double-posts.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .anomalies import check_transactions
+from .models import BalanceCheckpoint, RecurringTransaction, Transaction, UserProfile, assign_categories
+
+BATCH_SIZE = 500
+# Occurrences posted per rule per batch; a rule further behind is picked up
+# again by the next batch
+MAX_CATCH_UP = 400
+
+
+def add_months(value, months, day):
+    index = value.year * 12 + value.month - 1 + months
+    year, month = index // 12, index % 12 + 1
+    return value.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+
+
+def first_occurrence(rule):
+    """First due date on or after the rule's start_date"""
+    start = timezone.localtime(rule.start_date)
+    if rule.frequency != 'monthly':
+        return start
+    candidate = add_months(start, 0, rule.day_of_month)
+    return candidate if candidate >= start else add_months(start, 1, rule.day_of_month)
+
+
+def next_occurrence(rule, current):
+    current = timezone.localtime(current)
+    if rule.frequency == 'weekly':
+        return current + timedelta(weeks=rule.interval)
+    return add_months(current, rule.interval, rule.day_of_month)
+
+
+def due_dates(rule, now):
+    """Occurrences of ``rule`` due by ``now`` and the next due date after them"""
+    dates = []
+    due = rule.next_due
+    while due <= now and (rule.end_date is None or due <= rule.end_date) and len(dates) < MAX_CATCH_UP:
+        dates.append(due)
+        due = next_occurrence(rule, due)
+    return dates, due
+
+
+def materialize_due(now=None, using=DEFAULT_DB_ALIAS, batch_size=BATCH_SIZE):
+    """Post every occurrence due by ``now`` on database ``using``; returns the count"""
+    now = now or timezone.now()
+    created = 0
+    while True:
+        with transaction.atomic(using=using):
+            rules = list(
+                RecurringTransaction.objects.using(using)
+                .select_for_update(skip_locked=True)
+                .filter(is_active=True, next_due__lte=now)
+                .order_by('next_due')[:batch_size]
+            )
+            if not rules:
+                return created
+
+            occurrences = defaultdict(list)
+            deltas = defaultdict(Decimal)
+            for rule in rules:
+                dates, rule.next_due = due_dates(rule, now)
+                if rule.end_date is not None and rule.next_due > rule.end_date:
+                    rule.is_active = False
+                occurrences[rule.user_id].extend(
+                    Transaction(
+                        user_id=rule.user_id, recurring=rule, transaction_type=rule.transaction_type,
+                        amount=rule.amount, category=rule.category, description=rule.description, date=date,
+                    )
+                    for date in dates
+                )
+                sign = 1 if rule.transaction_type == 'income' else -1
+                deltas[rule.user_id] += sign * rule.amount * len(dates)
+
+            # bulk_create skips Transaction.save(), so balances, change
+            # numbers and checkpoints move here
+            rows = []
+            for user_id, user_rows in occurrences.items():
+                if not user_rows:
+                    continue
+                first = UserProfile.record_changes(
+                    user_id, using, changes=len(user_rows), balance_delta=deltas[user_id]
+                )
+                for offset, row in enumerate(user_rows):
+                    row.change_seq = first + offset
+                BalanceCheckpoint.shift(user_id, [(row.date, row.signed_amount()) for row in user_rows], using)
+                rows.extend(user_rows)
+            assign_categories(rows, using)
+            Transaction.objects.using(using).bulk_create(rows)
+            check_transactions(rows)
+            RecurringTransaction.objects.using(using).bulk_update(rules, ['next_due', 'is_active'])
+        created += len(rows)
@@ -1,6 +1,42 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Transaction, UserProfile
+from django.utils import timezone
+from .models import RecurringTransaction, SpendingAnomaly, Transaction, UserProfile
+from .recurring import first_occurrence
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients trim the response with ``?fields=a,b`` and ``?omit=c``.
+
+    Dropped fields are removed before serialization, so method fields and
+    nested objects are only evaluated when they are actually requested.
+    Only applied to GET requests so writes keep their full field set.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        keep = self.requested_fields(request)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+    @staticmethod
+    def _parse_field_list(value):
+        return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Return the field names that will be rendered for this request"""
+        names = set(cls.Meta.fields)
+        params = getattr(request, 'query_params', request.GET)
+        only = cls._parse_field_list(params.get('fields'))
+        if only:
+            names &= only
+        return names - cls._parse_field_list(params.get('omit'))
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -19,14 +55,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     username = serializers.SerializerMethodField()
     
     class Meta:
         model = Transaction
-        fields = ['id', 'user', 'username', 'transaction_type', 'amount', 'category', 'description', 'date']
-        read_only_fields = ['id', 'user']
+        fields = ['id', 'user', 'username', 'transaction_type', 'amount', 'category', 'description', 'date', 'updated_at']
+        read_only_fields = ['id', 'user', 'updated_at']
     
     def get_username(self, obj):
         return obj.user.username
@@ -39,21 +75,66 @@ class TransactionSerializer(serializers.ModelSerializer):
         if 'user' in validated_data:
             validated_data.pop('user')
         
-        # Create transaction
-        transaction = Transaction.objects.create(
+        # Transaction.save() moves the profile balance atomically
+        return Transaction.objects.create(
             user=user,
             **validated_data
         )
+
+
+class SpendingAnomalySerializer(serializers.ModelSerializer):
+    amount = serializers.DecimalField(source='transaction.amount', max_digits=10, decimal_places=2, read_only=True)
+    category = serializers.CharField(source='transaction.category', read_only=True)
+    date = serializers.DateTimeField(source='transaction.date', read_only=True)
+    
+    class Meta:
+        model = SpendingAnomaly
+        fields = ['id', 'transaction', 'amount', 'category', 'date', 'reason', 'message', 'score', 'is_read', 'created_at']
+        read_only_fields = fields
+
+
+class RecurringTransactionSerializer(serializers.ModelSerializer):
+    SCHEDULE_FIELDS = ('frequency', 'interval', 'day_of_month', 'start_date')
+    
+    class Meta:
+        model = RecurringTransaction
+        fields = [
+            'id', 'transaction_type', 'amount', 'category', 'description', 'frequency', 'interval',
+            'day_of_month', 'start_date', 'end_date', 'next_due', 'is_active', 'created_at',
+        ]
+        read_only_fields = ['id', 'next_due', 'created_at']
+    
+    def validate(self, attrs):
+        if self.instance is not None:
+            # Posted occurrences are keyed by rule and date; a new schedule
+            # could collide with them
+            changed = [
+                field for field in self.SCHEDULE_FIELDS
+                if field in attrs and attrs[field] != getattr(self.instance, field)
+            ]
+            if changed:
+                raise serializers.ValidationError(
+                    {field: 'Create a new rule to change the schedule.' for field in changed}
+                )
+            return attrs
         
-        # Update user profile balance
-        profile = UserProfile.objects.get(user=user)
-        if transaction.transaction_type == 'income':
-            profile.balance += transaction.amount
-        else:  # expense
-            profile.balance -= transaction.amount
-        profile.save()
-        
-        return transaction
+        if attrs.get('interval', 1) < 1:
+            raise serializers.ValidationError({'interval': 'Must be at least 1.'})
+        if attrs.get('frequency', 'monthly') == 'monthly':
+            day = attrs.get('day_of_month') or timezone.localtime(attrs['start_date']).day
+            if not 1 <= day <= 31:
+                raise serializers.ValidationError({'day_of_month': 'Must be between 1 and 31.'})
+            attrs['day_of_month'] = day
+        else:
+            attrs['day_of_month'] = None
+        return attrs
+    
+    def create(self, validated_data):
+        rule = RecurringTransaction(user=self.context['request'].user, **validated_data)
+        rule.next_due = first_occurrence(rule)
+        rule.save()
+        return rule
+
 
 class RegisterSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(required=True)
@@ -1,15 +1,49 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django_otp import device_classes
+from .anomalies import check_transaction
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from .authentication import invalidate_user_device_cache
+from .tfa_views import invalidate_device_qr_codes
+from backend.events import publish
+from budgets.models import BudgetAlert
+from budgets.serializers import BudgetAlertSerializer
+from .models import Transaction, UserProfile
 
 # Automatically create a profile when a new user is created
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
+        # Instance save so the router can place it by its user
+        UserProfile(user=instance).save(force_insert=True)
 
-# Automatically save the profile when the user is saved
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
+# Drop the cached "has 2FA device" flag whenever a user's devices change
+def invalidate_otp_device_cache(sender, instance, **kwargs):
+    invalidate_user_device_cache(instance.user_id)
+
+for _device_model in device_classes():
+    post_save.connect(invalidate_otp_device_cache, sender=_device_model)
+    post_delete.connect(invalidate_otp_device_cache, sender=_device_model)
+
+# A QR code is only needed until its device is confirmed
+@receiver(post_save, sender=TOTPDevice)
+def drop_confirmed_device_qr_codes(sender, instance, **kwargs):
+    if instance.confirmed:
+        invalidate_device_qr_codes(instance)
+
+@receiver(post_delete, sender=TOTPDevice)
+def drop_deleted_device_qr_codes(sender, instance, **kwargs):
+    invalidate_device_qr_codes(instance)
+
+# Check new expenses against the precomputed category statistics
+@receiver(post_save, sender=Transaction)
+def flag_spending_anomaly(sender, instance, created, **kwargs):
+    if created:
+        check_transaction(instance)
+
+# Push new budget alerts to the user's event streams
+@receiver(post_save, sender=BudgetAlert)
+def publish_budget_alert(sender, instance, created, using, **kwargs):
+    if created:
+        publish(instance.budget.user_id, 'budget_alert', BudgetAlertSerializer(instance).data, using)
@@ -1,3 +1,1100 @@
-from django.test import TestCase
+import asyncio
+import base64
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from rest_framework.test import APIClient
+
+from backend.events import broker
+from .analytics import FrameCache, TransactionFrame, data_version, get_frame
+from .archive import archive_storage, archive_user_year, read_archive, write_archive
+from .balances import balance_as_of, build_checkpoints
+from .authentication import TwoFactorAuthentication
+from .coalesce import LAST_VALUE_KEY, acoalesced, coalesced
+from .forecasting import forecast
+from .recurring import materialize_due
+from .sync import changes_since
+from .models import (
+    BalanceCheckpoint, Category, CategoryStatistics, IdempotencyKey, RecurringTransaction, SpendingAnomaly,
+    Transaction, TransactionArchive, UserProfile, assign_categories,
+)
+from .views import TransactionViewSet
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for amount in ('10.00', '20.00'):
+            Transaction.objects.create(
+                user=self.user, transaction_type='expense',
+                amount=Decimal(amount), category='Food',
+            )
+
+    def test_fields_limits_payload(self):
+        response = self.client.get('/api/transactions/?fields=id,amount,date')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id', 'amount', 'date'})
+
+    def test_omit_removes_fields(self):
+        response = self.client.get('/api/transactions/?omit=user,username')
+        self.assertNotIn('user', response.data[0])
+        self.assertIn('category', response.data[0])
+
+    def test_nested_user_not_loaded_when_omitted(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/transactions/?fields=id,amount')
+        self.assertFalse(any('auth_user' in q['sql'] for q in ctx.captured_queries))
+
+    def test_budget_derived_fields_only_when_requested(self):
+        self.client.post('/api/budgets/', {'category': 'Food', 'amount': '100.00'}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/budgets/?fields=id,category,amount')
+        self.assertEqual(set(response.data[0]), {'id', 'category', 'amount'})
+        self.assertFalse(any('SUM' in q['sql'] for q in ctx.captured_queries))
+
+        response = self.client.get('/api/budgets/?fields=id,spent,remaining')
+        self.assertEqual(response.data[0]['spent'], 30.0)
+        self.assertEqual(response.data[0]['remaining'], 70.0)
+
+
+class TwoFactorAuthenticationCacheTests(TestCase):
+    def setUp(self):
+        # Same effect as DJANGO_ENFORCE_2FA=true, which is read at import time
+        patcher = mock.patch.object(
+            TransactionViewSet, 'authentication_classes', [TwoFactorAuthentication],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.user = User.objects.create_user(username='bob', password='pw')
+        self.client.login(username='bob', password='pw')
+        self.device = TOTPDevice.objects.create(user=self.user, name='Default', confirmed=True)
+
+    def otp_queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        return response, [q for q in ctx.captured_queries if 'otp_' in q['sql']]
+
+    def test_unverified_session_requires_token(self):
+        response, _ = self.otp_queries('/api/transactions/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_verified_session_adds_no_otp_queries(self):
+        session = self.client.session
+        session['otp_verified'] = True
+        session.save()
+        response, queries = self.otp_queries('/api/transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_device_lookup_is_cached_and_invalidated(self):
+        self.otp_queries('/api/transactions/')
+        _, queries = self.otp_queries('/api/transactions/')
+        self.assertEqual(queries, [])
+
+        self.device.delete()
+        response, queries = self.otp_queries('/api/transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(queries, [])
+
+    def test_enrolling_elsewhere_is_seen_at_once(self):
+        self.device.delete()
+        self.assertEqual(self.otp_queries('/api/transactions/')[0].status_code, 200)
+        # Confirmed in another worker, whose signal does not reach this cache
+        TOTPDevice.objects.bulk_create([TOTPDevice(user=self.user, name='Phone', confirmed=True)])
+        self.assertEqual(self.otp_queries('/api/transactions/')[0].status_code, 401)
+
+
+class TOTPCreateViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='carol', password='pw')
+        self.client.login(username='carol', password='pw')
+
+    def test_single_format(self):
+        data = self.client.get('/api/2fa/create/?qr=svg').json()
+        self.assertTrue(data['qr_svg'].startswith('data:image/svg+xml;base64,'))
+        self.assertNotIn('qr_code', data)
+
+    def test_reuse_keeps_unconfirmed_device(self):
+        first = self.client.get('/api/2fa/create/?qr=png').json()
+        second = self.client.get('/api/2fa/create/?qr=png&reuse=true').json()
+        self.assertEqual(first['device_id'], second['device_id'])
+        self.assertEqual(first['qr_code'], second['qr_code'])
+        self.assertEqual(TOTPDevice.objects.filter(user=self.user).count(), 1)
+
+    def test_qr_is_cached_until_device_is_confirmed(self):
+        with mock.patch('transactions.tfa_views.render_qr_code', return_value='data:') as render:
+            self.client.get('/api/2fa/create/?qr=png')
+            self.client.get('/api/2fa/create/?qr=png&reuse=true')
+            self.assertEqual(render.call_count, 1)
+
+            device = TOTPDevice.objects.get(user=self.user)
+            device.confirmed = True
+            device.save()
+            device.confirmed = False
+            device.save()
+            self.client.get('/api/2fa/create/?qr=png&reuse=true')
+            self.assertEqual(render.call_count, 2)
+
+            # A new device (new key) is rendered afresh too
+            self.client.get('/api/2fa/create/?qr=png')
+            self.assertEqual(render.call_count, 3)
+
+    def test_without_reuse_replaces_device(self):
+        first = self.client.get('/api/2fa/create/').json()
+        second = self.client.get('/api/2fa/create/').json()
+        self.assertNotEqual(first['device_id'], second['device_id'])
+        self.assertIn('qr_code', second)
+        self.assertIn('qr_svg', second)
+
+
+class PartitionTransactionsCommandTests(TestCase):
+    def test_sqlite_falls_back_to_single_table(self):
+        out = StringIO()
+        call_command('partition_transactions', stdout=out)
+        self.assertIn('stays a single table', out.getvalue())
+
+
+class TransactionArchiveTests(TestCase):
+    def setUp(self):
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings_override = override_settings(TRANSACTION_ARCHIVE_ROOT=archive_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        old = datetime(2015, 6, 1, 12, 30, tzinfo=dt_timezone.utc)
+        for transaction_type, amount, category, description in [
+            ('income', '1000.00', 'Salary', 'June pay'),
+            ('expense', '12.34', 'Food', None),
+            ('expense', '5.00', 'Café', 'flat white ☕'),
+        ]:
+            Transaction.objects.create(
+                user=self.user, transaction_type=transaction_type, amount=Decimal(amount),
+                category=category, description=description, date=old,
+            )
+        Transaction.objects.create(
+            user=self.user, transaction_type='expense', amount=Decimal('20.00'), category='Food',
+        )
+        self.before = self.client.get('/api/transactions/summary/').data
+
+    def test_archive_keeps_summary_balance_and_export(self):
+        call_command('archive_transactions', stdout=StringIO())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+        archive = TransactionArchive.objects.get(user=self.user, year=2015)
+        self.assertEqual(archive.row_count, 3)
+
+        after = self.client.get('/api/transactions/summary/').data
+        self.assertEqual(after['total_income'], self.before['total_income'])
+        self.assertEqual(after['total_expenses'], self.before['total_expenses'])
+        food = {row['category']: row['total'] for row in after['expenses_by_category']}
+        self.assertEqual(food['Food'], Decimal('32.34'))
+
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'income', 'amount': '1.00', 'category': 'Gift',
+        }, format='json')
+        self.user.userprofile.refresh_from_db()
+        self.assertEqual(self.user.userprofile.balance, Decimal('963.66'))
+
+        response = self.client.get('/api/transactions/export/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 5)
+        self.assertIn('flat white ☕', lines[1] + lines[2] + lines[3])
+
+    def test_restore_round_trip(self):
+        # Restoring is a new write as far as syncing clients are concerned
+        fields = [
+            field.attname for field in Transaction._meta.concrete_fields
+            if field.name not in ('updated_at', 'change_seq')
+        ]
+        originals = list(Transaction.objects.filter(user=self.user).order_by('id').values(*fields))
+        call_command('archive_transactions', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('restore_transactions', user='alice', all=True, stdout=StringIO())
+        self.assertFalse(TransactionArchive.objects.exists())
+        restored = list(Transaction.objects.filter(user=self.user).order_by('id').values(*fields))
+        self.assertEqual(restored, originals)
+
+    def test_failed_merge_keeps_previous_archive(self):
+        call_command('archive_transactions', stdout=StringIO())
+        archive = TransactionArchive.objects.get(user=self.user, year=2015)
+        Transaction.objects.create(
+            user=self.user, transaction_type='expense', amount=Decimal('3.00'), category='Food',
+            date=datetime(2015, 7, 1, tzinfo=dt_timezone.utc),
+        )
+        with mock.patch('transactions.archive.SyncTombstone.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive_user_year(self.user, 2015)
+        archive.refresh_from_db()
+        self.assertEqual(archive.row_count, 3)
+        self.assertEqual(len(read_archive(archive)), 3)
+        self.assertEqual(archive_storage().listdir(f'transactions/{self.user.pk}')[1], [archive.path.rsplit('/', 1)[1]])
+
+        old_path = archive.path
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_user_year(self.user, 2015)
+        archive.refresh_from_db()
+        self.assertEqual(len(read_archive(archive)), 4)
+        self.assertFalse(archive_storage().exists(old_path))
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_years_are_local(self):
+        # Already 2017 in UTC
+        Transaction.objects.create(
+            user=self.user, transaction_type='expense', amount=Decimal('4.00'), category='Food',
+            date=timezone.make_aware(datetime(2016, 12, 31, 22, 0)),
+        )
+        call_command('archive_transactions', stdout=StringIO())
+        self.assertEqual(
+            list(TransactionArchive.objects.filter(user=self.user).values_list('year', 'row_count').order_by('year')),
+            [(2015, 3), (2016, 1)],
+        )
+
+    def test_older_archive_spellings_join_their_category(self):
+        # A file written before categories existed, under another spelling
+        path = write_archive(self.user.pk, 2014, [{
+            'id': 999, 'transaction_type': 'expense', 'amount': Decimal('7.00'), 'category': 'FOOD ',
+            'description': None, 'date': datetime(2014, 3, 1, tzinfo=dt_timezone.utc),
+        }])
+        TransactionArchive.objects.create(user=self.user, year=2014, path=path, row_count=1)
+        Transaction.objects.create(
+            user=self.user, transaction_type='expense', amount=Decimal('3.00'), category='Food',
+            date=datetime(2014, 7, 1, tzinfo=dt_timezone.utc),
+        )
+        archive_user_year(self.user, 2014)
+
+        food = Category.objects.get(user=self.user, key='food')
+        totals = TransactionArchive.objects.get(user=self.user, year=2014).totals.get()
+        self.assertEqual((totals.category_ref, totals.category, totals.total), (food, 'Food', Decimal('10.00')))
+        after = self.client.get('/api/transactions/summary/').data
+        food_total = {row['category']: row['total'] for row in after['expenses_by_category']}['Food']
+        self.assertEqual(food_total, Decimal('42.34'))
+
+
+class AnalyticsFrameTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for transaction_type, amount, category, day in [
+            ('income', '100.00', 'Salary', 1), ('expense', '0.10', 'Food', 2),
+            ('expense', '0.20', 'Food', 9), ('expense', '7.00', 'Rent', 16),
+        ]:
+            Transaction.objects.create(
+                user=self.user, transaction_type=transaction_type, amount=Decimal(amount),
+                category=category, date=timezone.now() - timedelta(days=day),
+            )
+
+    def test_matches_orm_aggregates(self):
+        frame = get_frame(self.user.pk)
+        expenses = frame.select('expense')
+        self.assertEqual(frame.total(expenses), Decimal('7.30'))
+        self.assertEqual(frame.by_category(expenses), [('Rent', Decimal('7.00'), 1), ('Food', Decimal('0.30'), 2)])
+        expected = [
+            (row['period'], row['total'])
+            for row in Transaction.objects.filter(user=self.user, transaction_type='expense')
+            .annotate(period=TruncWeek('date')).values('period').annotate(total=Sum('amount')).order_by('period')
+        ]
+        self.assertEqual(frame.by_period(expenses, 'week'), expected)
+
+    def test_writes_invalidate_cached_frame(self):
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], Decimal('7.30'))
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'expense', 'amount': '2.70', 'category': 'Food',
+        }, format='json')
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], Decimal('10.00'))
+        # Only the data version is read
+        with self.assertNumQueries(1):
+            get_frame(self.user.pk)
+
+    def test_writes_without_signals_invalidate_cached_frame(self):
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], Decimal('7.30'))
+        # As another process (a command, another worker) would write: no
+        # signal or cache entry of this process sees it
+        rows = [Transaction(user=self.user, transaction_type='expense', amount=Decimal('2.70'), category='Food')]
+        with db_transaction.atomic():
+            rows[0].change_seq = UserProfile.record_changes(self.user.pk, 'default', balance_delta=Decimal('-2.70'))
+            assign_categories(rows, 'default')
+            Transaction.objects.bulk_create(rows)
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], Decimal('10.00'))
+
+    @override_settings(ANALYTICS_CACHE_MAX_BYTES=1000)
+    def test_lru_is_bounded_by_size(self):
+        frames = FrameCache()
+        frame = TransactionFrame.from_rows(
+            (100, 'expense', 'Food', timezone.now()) for _ in range(30)
+        )
+        for key in range(5):
+            frames.put(key, frame)
+        self.assertLessEqual(frames._bytes, 1000)
+        self.assertIsNone(frames.get(0))
+        self.assertIs(frames.get(4), frame)
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = datetime(2026, 7, 15, 12, tzinfo=dt_timezone.utc)
+        for month in range(1, 7):
+            for transaction_type, amount, category in [
+                ('income', '3000.00', 'Salary'), ('expense', '1000.00', 'Rent'),
+                ('expense', str(50 * month), 'Fun'),
+            ]:
+                Transaction.objects.create(
+                    user=self.user, transaction_type=transaction_type, amount=Decimal(amount),
+                    category=category, date=datetime(2026, month, 2, tzinfo=dt_timezone.utc),
+                )
+        Transaction.objects.create(
+            user=self.user, transaction_type='expense', amount=Decimal('1000.00'),
+            category='Rent', date=datetime(2026, 7, 2, tzinfo=dt_timezone.utc),
+        )
+
+    def test_recurring_series_and_balance(self):
+        self.user.userprofile.refresh_from_db()
+        result = forecast(get_frame(self.user.pk), self.user.userprofile.balance, 'month', 3, self.now)
+        categories = {row['category']: row for row in result['categories']}
+        self.assertTrue(categories['Salary']['recurring'])
+        self.assertEqual(categories['Rent']['per_period'], Decimal('1000.00'))
+        self.assertFalse(categories['Fun']['recurring'])
+
+        july, august, _ = result['forecast']
+        self.assertEqual(july['period'], datetime(2026, 7, 1, tzinfo=dt_timezone.utc))
+        # July's rent is already paid; salary and fun spending are still due
+        self.assertEqual(july['income'], Decimal('3000.00'))
+        self.assertEqual(july['expenses'], categories['Fun']['per_period'])
+        self.assertEqual(
+            august['balance'],
+            july['balance'] + Decimal('3000.00') - Decimal('1000.00') - categories['Fun']['per_period'],
+        )
+
+    def test_endpoint_validates_and_caches(self):
+        self.assertEqual(self.client.get('/api/transactions/forecast/?period=day').status_code, 400)
+        self.assertEqual(self.client.get('/api/transactions/forecast/?horizon=99').status_code, 400)
+        response = self.client.get('/api/transactions/forecast/?period=week&horizon=4')
+        self.assertEqual(len(response.data['forecast']), 4)
+        # Only the data version is read
+        with self.assertNumQueries(1):
+            self.client.get('/api/transactions/forecast/?period=week&horizon=4')
+
+    def test_only_future_transactions(self):
+        other = User.objects.create_user(username='bob', password='pw')
+        Transaction.objects.create(
+            user=other, transaction_type='expense', amount=Decimal('20.00'),
+            category='Rent', date=datetime(2030, 1, 2, tzinfo=dt_timezone.utc),
+        )
+        self.client.force_authenticate(other)
+        response = self.client.get('/api/transactions/forecast/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['categories'], [])
+
+
+class SpendingAnomalyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for amount in ('10.00', '12.00', '11.00', '9.00', '13.00', '10.50'):
+            Transaction.objects.create(
+                user=self.user, transaction_type='expense', amount=Decimal(amount), category='Food',
+            )
+
+    def post(self, amount, category):
+        return self.client.post('/api/transactions/', {
+            'transaction_type': 'expense', 'amount': amount, 'category': category,
+        }, format='json')
+
+    def test_nothing_flagged_before_statistics_exist(self):
+        self.post('500.00', 'Food')
+        self.assertFalse(SpendingAnomaly.objects.exists())
+
+    def test_flags_outliers_and_new_categories_once(self):
+        call_command('compute_spending_stats', stdout=StringIO())
+        self.post('11.50', 'Food')
+        self.post('95.00', 'Food')
+        self.post('40.00', 'Travel')
+        self.post('45.00', 'Travel')
+
+        anomalies = self.client.get('/api/anomalies/').data
+        self.assertEqual([(row['reason'], row['amount']) for row in anomalies],
+                         [('new_category', '40.00'), ('amount', '95.00')])
+        self.assertGreater(anomalies[1]['score'], 3)
+
+        self.client.post(f"/api/anomalies/{anomalies[0]['id']}/mark_read/")
+        self.assertEqual(len(self.client.get('/api/anomalies/?unread=true').data), 1)
+
+    def test_bulk_paths_are_checked(self):
+        call_command('compute_spending_stats', stdout=StringIO())
+        response = self.client.post('/api/transactions/bulk/', [
+            {'transaction_type': 'expense', 'amount': amount, 'category': category}
+            for amount, category in [('95.00', 'Food'), ('40.00', 'Travel'), ('45.00', 'Travel')]
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.post('/api/recurring/', {
+            'transaction_type': 'expense', 'amount': '800.00', 'category': 'Rent',
+            'start_date': '2026-01-01T00:00:00Z',
+        }, format='json')
+        materialize_due(datetime(2026, 3, 15, tzinfo=dt_timezone.utc))
+
+        anomalies = SpendingAnomaly.objects.order_by('transaction__amount')
+        self.assertEqual([(row.reason, row.transaction.amount) for row in anomalies],
+                         [('new_category', Decimal('40.00')), ('amount', Decimal('95.00')),
+                          ('new_category', Decimal('800.00'))])
+
+    def test_concurrent_new_category_is_seeded_once(self):
+        call_command('compute_spending_stats', stdout=StringIO())
+        food = CategoryStatistics.objects.get(user=self.user, category_ref__key='food')
+        self.post('40.00', 'Travel')
+        # A second first expense that looked the statistics up before the seed
+        transaction = Transaction(user=self.user, transaction_type='expense', amount=Decimal('45.00'), category='Travel')
+        with mock.patch.object(CategoryStatistics.objects, 'filter') as lookup:
+            lookup.return_value.order_by.return_value.first.return_value = food
+            transaction.save()
+        self.assertEqual(SpendingAnomaly.objects.filter(reason='new_category').count(), 1)
+        self.assertEqual(CategoryStatistics.objects.filter(user=self.user, category_ref__key='travel').count(), 1)
+
+    def test_check_is_a_single_query(self):
+        call_command('compute_spending_stats', stdout=StringIO())
+        transaction = Transaction(user=self.user, transaction_type='expense', amount=Decimal('11.00'), category='Food')
+        with CaptureQueriesContext(connection) as queries:
+            transaction.save()
+        self.assertEqual(sum('categorystatistics' in query['sql'] for query in queries), 1)
+
+
+class RecurringTransactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_rule(self, **data):
+        response = self.client.post('/api/recurring/', {
+            'transaction_type': 'expense', 'amount': '1000.00', 'category': 'Rent', **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_monthly_rule_clamps_day_and_is_idempotent(self):
+        rule = self.create_rule(start_date='2026-01-15T09:00:00Z', day_of_month=31)
+        self.assertEqual(rule['next_due'], '2026-01-31T09:00:00Z')
+        self.create_rule(transaction_type='income', amount='50.00', category='Side gig',
+                         frequency='weekly', interval=2, start_date='2026-03-02T00:00:00Z')
+
+        now = datetime(2026, 4, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(materialize_due(now), 3 + 3)
+        self.assertEqual(materialize_due(now), 0)
+
+        rent_dates = Transaction.objects.filter(category='Rent').order_by('date').values_list('date', flat=True)
+        self.assertEqual([date.date().isoformat() for date in rent_dates], ['2026-01-31', '2026-02-28', '2026-03-31'])
+        self.user.userprofile.refresh_from_db()
+        self.assertEqual(self.user.userprofile.balance, Decimal('-2850.00'))
+
+    def test_scheduled_command_shows_in_cached_analytics(self):
+        self.create_rule(start_date='2026-01-01T00:00:00Z', end_date='2026-02-15T00:00:00Z')
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], 0)
+        call_command('materialize_recurring', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/transactions/summary/').data['total_expenses'], Decimal('2000.00'))
+
+    def test_end_date_deactivates_rule(self):
+        self.create_rule(start_date='2026-01-01T00:00:00Z', end_date='2026-02-15T00:00:00Z')
+        materialize_due(datetime(2026, 6, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertFalse(RecurringTransaction.objects.get().is_active)
+
+    def test_schedule_cannot_be_changed(self):
+        rule = self.create_rule(start_date='2026-01-01T00:00:00Z')
+        response = self.client.patch(f"/api/recurring/{rule['id']}/", {'interval': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f"/api/recurring/{rule['id']}/", {'amount': '1100.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {'transaction_type': 'expense', 'amount': '12.50', 'category': 'Food'}
+
+    def post(self, path, data, key):
+        return self.client.post(path, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_without_writing(self):
+        first = self.post('/api/transactions/', self.payload, 'abc')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.post('/api/transactions/', self.payload, 'abc')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.user.userprofile.refresh_from_db()
+        self.assertEqual(self.user.userprofile.balance, Decimal('-12.50'))
+
+    def test_key_reused_for_other_request_is_rejected(self):
+        self.post('/api/transactions/', self.payload, 'abc')
+        response = self.post('/api/transactions/', {**self.payload, 'amount': '99.00'}, 'abc')
+        self.assertEqual(response.status_code, 422)
+
+    def test_multipart_retry_replays(self):
+        # The session's CSRF check reads the form before the view runs
+        client = APIClient(enforce_csrf_checks=True)
+        client.login(username='alice', password='pw')
+        token = 'a' * 32
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        for _ in range(2):
+            response = client.post(
+                '/api/transactions/', {**self.payload, 'csrfmiddlewaretoken': token},
+                format='multipart', HTTP_IDEMPOTENCY_KEY='abc',
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_failed_request_does_not_consume_key(self):
+        self.assertEqual(self.post('/api/transactions/', {'amount': 'x'}, 'abc').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('/api/transactions/', self.payload, 'abc').status_code, 201)
+
+    def test_bulk_is_idempotent(self):
+        items = [self.payload, {**self.payload, 'transaction_type': 'income', 'amount': '100.00'}]
+        self.assertEqual(len(self.post('/api/transactions/bulk/', items, 'batch-1').data), 2)
+        self.post('/api/transactions/bulk/', items, 'batch-1')
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.user.userprofile.refresh_from_db()
+        self.assertEqual(self.user.userprofile.balance, Decimal('87.50'))
+
+
+class BalanceDeltaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def balance(self):
+        return UserProfile.objects.get(user=self.user).balance
+
+    def test_create_update_delete_move_balance_by_delta(self):
+        response = self.client.post('/api/transactions/', {
+            'transaction_type': 'expense', 'amount': '30.00', 'category': 'Food',
+        }, format='json')
+        self.assertEqual(self.balance(), Decimal('-30.00'))
+        url = f"/api/transactions/{response.data['id']}/"
+        self.client.patch(url, {'transaction_type': 'income', 'amount': '45.00'}, format='json')
+        self.assertEqual(self.balance(), Decimal('45.00'))
+        self.client.delete(url)
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+    def test_stale_profile_instances_do_not_lose_updates(self):
+        # Two writers holding their own User objects, as two threads would
+        first, second = User.objects.get(pk=self.user.pk), User.objects.get(pk=self.user.pk)
+        for user in (first, second, first):
+            Transaction.objects.create(user=user, transaction_type='income', amount=Decimal('10.00'), category='Gift')
+        self.assertEqual(self.balance(), Decimal('30.00'))
+
+    def test_stale_instances_delete_by_the_stored_row(self):
+        created = Transaction.objects.create(user=self.user, transaction_type='expense', amount=Decimal('10.00'), category='Food')
+        first, second = Transaction.objects.get(pk=created.pk), Transaction.objects.get(pk=created.pk)
+        created.amount = Decimal('25.00')
+        created.save()
+        first.delete()
+        self.assertEqual(second.delete(), (0, {}))
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+
+class BalanceCheckpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for day, transaction_type, amount in [
+            (datetime(2026, 1, 5, 12, tzinfo=dt_timezone.utc), 'income', '1000.00'),
+            (datetime(2026, 1, 20, 12, tzinfo=dt_timezone.utc), 'expense', '200.50'),
+            (datetime(2026, 2, 1, 0, tzinfo=dt_timezone.utc), 'expense', '100.00'),
+            (datetime(2026, 3, 15, 9, tzinfo=dt_timezone.utc), 'income', '50.25'),
+        ]:
+            Transaction.objects.create(
+                user=self.user, transaction_type=transaction_type, amount=Decimal(amount),
+                category='Misc', date=day,
+            )
+        build_checkpoints(self.user.pk, now=datetime(2026, 4, 10, tzinfo=dt_timezone.utc))
+
+    def replayed(self, at):
+        balance = Decimal('0.00')
+        for row in Transaction.objects.filter(user=self.user, date__lt=at):
+            balance += row.signed_amount()
+        return balance
+
+    def checkpoints(self):
+        return {row.month.month: row.balance for row in BalanceCheckpoint.objects.filter(user=self.user)}
+
+    def test_checkpoints_hold_balance_before_each_month(self):
+        self.assertEqual(self.checkpoints(), {
+            2: Decimal('799.50'), 3: Decimal('699.50'), 4: Decimal('749.75'),
+        })
+        # Already up to date
+        self.assertEqual(build_checkpoints(self.user.pk, now=datetime(2026, 4, 30, tzinfo=dt_timezone.utc)), 0)
+
+    def test_balance_as_of_matches_replaying_the_ledger(self):
+        for at in [
+            datetime(2026, 1, 1, tzinfo=dt_timezone.utc),
+            datetime(2026, 1, 31, tzinfo=dt_timezone.utc),
+            datetime(2026, 2, 1, 0, tzinfo=dt_timezone.utc),
+            datetime(2026, 2, 1, 0, 1, tzinfo=dt_timezone.utc),
+            datetime(2026, 3, 20, tzinfo=dt_timezone.utc),
+            datetime(2026, 6, 1, tzinfo=dt_timezone.utc),
+        ]:
+            self.assertEqual(balance_as_of(self.user.pk, at), self.replayed(at), at)
+        # Nearest checkpoint plus one delta sum
+        with self.assertNumQueries(2):
+            balance_as_of(self.user.pk, datetime(2026, 3, 20, tzinfo=dt_timezone.utc))
+
+    def test_writes_shift_later_checkpoints(self):
+        january = Transaction.objects.get(user=self.user, amount=Decimal('200.50'))
+        url = f'/api/transactions/{january.pk}/'
+        # Move it from January to March with another amount
+        self.client.patch(url, {'amount': '80.00', 'date': '2026-03-02T10:00:00Z'}, format='json')
+        self.client.post('/api/transactions/bulk/', [
+            {'transaction_type': 'income', 'amount': '10.00', 'category': 'Gift', 'date': '2026-02-10T10:00:00Z'},
+        ], format='json')
+        self.client.delete(f"/api/transactions/{Transaction.objects.get(user=self.user, amount=Decimal('50.25')).pk}/")
+
+        shifted = self.checkpoints()
+        build_checkpoints(self.user.pk, rebuild=True, now=datetime(2026, 4, 10, tzinfo=dt_timezone.utc))
+        self.assertEqual(shifted, self.checkpoints())
+        self.assertEqual(shifted[4], UserProfile.objects.get(user=self.user).balance)
+
+    def test_balance_endpoints(self):
+        response = self.client.get('/api/transactions/balance_at/', {'date': '2026-01-31'})
+        self.assertEqual(Decimal(response.data['balance']), Decimal('799.50'))
+        response = self.client.get('/api/transactions/balance_at/', {'date': '2026-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/transactions/balance_series/', {'start': '2026-01-31', 'end': '2026-02-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['date'].isoformat(), Decimal(row['balance'])) for row in response.data],
+            [('2026-01-31', Decimal('799.50')), ('2026-02-01', Decimal('699.50')), ('2026-02-02', Decimal('699.50'))],
+        )
+        response = self.client.get('/api/transactions/balance_series/', {'start': '2026-02-02', 'end': '2026-01-31'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.ids = [
+            self.client.post('/api/transactions/', {
+                'transaction_type': 'expense', 'amount': f'{10 + i}.00', 'category': 'Food',
+            }, format='json').data['id']
+            for i in range(3)
+        ]
+        self.budget_id = self.client.post('/api/budgets/', {
+            'category': 'Food', 'amount': '300.00', 'period': 'monthly',
+        }, format='json').data['id']
+        from budgets.models import BudgetAlert
+        self.alert = BudgetAlert.objects.create(budget_id=self.budget_id, alert_type='warning', message='80%')
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/', {} if since is None else {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_missing_profile_is_rebuilt_on_write(self):
+        cursor = int(self.sync()['cursor'])
+        UserProfile.objects.filter(user=self.user).delete()
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'expense', 'amount': '5.00', 'category': 'Food',
+        }, format='json')
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.balance, Decimal('-38.00'))
+        # Numbered after the alert, the last write before the profile was lost
+        self.assertEqual(profile.change_seq, cursor + 2)
+        self.assertTrue(self.sync(cursor)['reset'])
+
+    def test_full_then_delta_sync_with_tombstones(self):
+        full = self.sync()
+        self.assertTrue(full['reset'])
+        self.assertFalse(full['has_more'])
+        self.assertEqual(sorted(row['id'] for row in full['transactions']), sorted(self.ids))
+        self.assertEqual([row['id'] for row in full['budgets']], [self.budget_id])
+        self.assertEqual([row['id'] for row in full['alerts']], [self.alert.pk])
+        self.assertEqual(full['balance'], Decimal('-33.00'))
+
+        self.assertEqual(self.sync(full['cursor'])['transactions'], [])
+        self.client.patch(f'/api/transactions/{self.ids[0]}/', {'amount': '1.00'}, format='json')
+        self.client.delete(f'/api/transactions/{self.ids[1]}/')
+        self.client.delete(f'/api/budgets/{self.budget_id}/')
+
+        delta = self.sync(full['cursor'])
+        self.assertFalse(delta['reset'])
+        self.assertEqual([(row['id'], row['amount']) for row in delta['transactions']], [(self.ids[0], '1.00')])
+        self.assertEqual(delta['budgets'], [])
+        self.assertEqual(delta['deleted'], {
+            'transactions': [self.ids[1]], 'budgets': [self.budget_id], 'alerts': [self.alert.pk],
+        })
+        self.assertEqual(self.sync(delta['cursor'])['deleted'], {'transactions': [], 'budgets': [], 'alerts': []})
+
+    def test_pages_never_split_a_change_number(self):
+        seen = []
+        since = None
+        while True:
+            page = changes_since(self.user, since, limit=2)
+            seen += [row.change_seq for name in ('transactions', 'budgets', 'alerts') for row in page[name]]
+            since = page['cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(sorted(seen), list(range(1, UserProfile.objects.get(user=self.user).change_seq + 1)))
+
+    def test_cursor_from_before_a_renumbering_resets(self):
+        cursor = self.sync()['cursor']
+        UserProfile.objects.filter(user=self.user).update(sync_reset=int(cursor) + 1, change_seq=int(cursor) + 1)
+        self.assertTrue(self.sync(cursor)['reset'])
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'x'}).status_code, 400)
+
+
+class DashboardTests(TestCase):
+    STANDALONE = {
+        'summary': '/api/transactions/summary/',
+        'recent': '/api/transactions/recent/',
+        'time_series': '/api/transactions/time_series/?period=week',
+        'my_profile': '/api/profiles/my_profile/',
+        'budget_summary': '/api/budgets/summary/',
+        'category_stats': '/api/budgets/category-stats/',
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for amount, category in [('40.00', 'Food'), ('25.00', 'Travel'), ('12.50', 'Food')]:
+            self.client.post('/api/transactions/', {
+                'transaction_type': 'expense', 'amount': amount, 'category': category,
+            }, format='json')
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'income', 'amount': '500.00', 'category': 'Salary',
+        }, format='json')
+        self.client.post('/api/budgets/', {'category': 'Food', 'amount': '60.00', 'period': 'monthly'}, format='json')
+
+    def dashboard(self, **params):
+        response = self.client.get('/api/dashboard/', {'time_series.period': 'week', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_widgets_match_the_standalone_endpoints(self):
+        widgets = self.dashboard()['widgets']
+        self.assertEqual(list(widgets), list(self.STANDALONE))
+        for name, url in self.STANDALONE.items():
+            self.assertEqual(widgets[name], self.client.get(url).json(), name)
+
+    def test_cached_until_the_next_write(self):
+        first = self.dashboard(widgets='budget_summary,category_stats')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.dashboard(widgets='budget_summary,category_stats'), first)
+        # Only the profile row, for the cache key
+        self.assertEqual(len(queries), 1)
+
+        self.client.post('/api/budgets/', {'category': 'Travel', 'amount': '20.00', 'period': 'monthly'}, format='json')
+        widgets = self.dashboard(widgets='budget_summary,category_stats')['widgets']
+        self.assertEqual(widgets['budget_summary']['total_budgets'], 2)
+        self.assertEqual(widgets['budget_summary']['total_spent'], '77.50')
+        self.assertEqual(widgets, {
+            'budget_summary': self.client.get('/api/budgets/summary/').json(),
+            'category_stats': self.client.get('/api/budgets/category-stats/').json(),
+        })
+
+    def test_rejects_unknown_widgets_and_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/dashboard/', {'widgets': 'summary,weather'}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/dashboard/', {'widgets': 'category_stats', 'category_stats.month': 'may'}).status_code,
+            400,
+        )
+
+
+class CoalesceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh', release=None):
+        def run():
+            self.calls += 1
+            if release is not None:
+                release.wait(5)
+            return value
+        return run
+
+    def test_concurrent_identical_requests_compute_once(self):
+        release = threading.Event()
+        results = []
+
+        def request():
+            results.append(coalesced('summary', 1, {'period': 'week'}, self.compute(release=release)))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 5)
+        self.assertEqual(self.calls, 1)
+
+        # A finished flight is not reused, nor are other parameters joined
+        coalesced('summary', 1, {'period': 'week'}, self.compute())
+        coalesced('summary', 1, {'period': 'month'}, self.compute())
+        self.assertEqual(self.calls, 3)
+
+    def test_async_requests_share_a_flight(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return 'fresh'
+
+        async def requests():
+            return await asyncio.gather(*(acoalesced('time_series', 1, {}, compute) for _ in range(4)))
+
+        self.assertEqual(async_to_sync(requests)(), ['fresh'] * 4)
+        self.assertEqual(self.calls, 1)
+
+    def test_cancelled_leader_hands_over_the_flight(self):
+        started = asyncio.Event()
+
+        async def stuck():
+            started.set()
+            await asyncio.sleep(5)
+
+        async def compute():
+            self.calls += 1
+            return 'fresh'
+
+        async def requests():
+            leader = asyncio.ensure_future(acoalesced('time_series', 1, {}, stuck))
+            await started.wait()
+            follower = asyncio.ensure_future(acoalesced('time_series', 1, {}, compute))
+            await asyncio.sleep(0)
+            leader.cancel()
+            result = await asyncio.wait_for(follower, 1)
+            return result, await asyncio.wait_for(acoalesced('time_series', 1, {}, compute), 1)
+
+        self.assertEqual(async_to_sync(requests)(), ('fresh', 'fresh'))
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_while_revalidate(self):
+        user = User.objects.create_user(username='kim', password='pw')
+        key = LAST_VALUE_KEY.format(f'summary:{user.pk}:')
+        with self.settings(ANALYTICS_STALE_SECONDS=60):
+            self.assertEqual(coalesced('summary', user.pk, {}, self.compute('old')), 'old')
+            self.assertEqual(coalesced('summary', user.pk, {}, self.compute('old')), 'old')
+            self.assertEqual(self.calls, 2)
+
+            UserProfile.record_changes(user.pk, 'default')
+            self.assertEqual(coalesced('summary', user.pk, {}, self.compute('new')), 'old')
+            for _ in range(100):
+                latest = cache.get(key)
+                if latest['value'] == 'new':
+                    break
+                time.sleep(0.01)
+            self.assertEqual(latest, {'version': data_version(user.pk), 'value': 'new'})
+        self.assertEqual(self.calls, 3)
+
+
+class CategoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ines', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_spelling_variants_share_a_category(self):
+        self.client.post('/api/transactions/', {
+            'transaction_type': 'expense', 'amount': '12.00', 'category': 'Eating  out',
+        }, format='json')
+        response = self.client.post('/api/transactions/bulk/', [
+            {'transaction_type': 'expense', 'amount': '8.00', 'category': ' eating OUT'},
+            {'transaction_type': 'expense', 'amount': '3.00', 'category': 'Coffee'},
+        ], format='json')
+        self.assertEqual([row['category'] for row in response.json()], ['Eating out', 'Coffee'])
+        self.assertEqual(
+            list(Category.objects.filter(user=self.user).order_by('pk').values_list('name', 'key')),
+            [('Eating out', 'eating out'), ('Coffee', 'coffee')],
+        )
+
+        transaction = Transaction.objects.get(category='Coffee')
+        transaction.category = 'eating out'
+        transaction.save(update_fields=['category'])
+        self.assertEqual(transaction.category, 'Eating out')
+        self.assertEqual(Transaction.objects.filter(category_ref__key='eating out').count(), 3)
+
+        summary = self.client.get('/api/transactions/summary/').json()
+        self.assertEqual(summary['expenses_by_category'], [{'category': 'Eating out', 'total': 23.0}])
+
+    def test_categories_are_per_user(self):
+        other = User.objects.create_user(username='jo', password='pw')
+        for user in [self.user, other]:
+            Transaction.objects.create(user=user, transaction_type='expense', amount=Decimal('1.00'), category='Fun')
+        self.assertEqual(Category.objects.filter(key='fun').count(), 2)
+        frame = get_frame(other.pk)
+        self.assertEqual(frame.categories, ['Fun'])
+        self.assertEqual(frame.category_ids, [Category.objects.get(user=other).pk])
+
+    def test_deleting_user_removes_their_categories(self):
+        Transaction.objects.create(user=self.user, transaction_type='expense', amount=Decimal('5.00'), category='Fun')
+        response = self.client.post('/api/budgets/', {'category': 'Fun', 'amount': '50.00'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.user.delete()
+        self.assertFalse(Category.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+
+
+class AsyncAnalyticsViewTests(TestCase):
+    PATHS = [
+        '/api/transactions/summary/',
+        '/api/transactions/time_series/?period=week',
+        '/api/transactions/balance_at/?date=2030-01-01',
+        '/api/budgets/summary/',
+        '/api/budgets/category-stats/',
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_login(self.user)
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.user)
+        for amount, category in [('40.00', 'Food'), ('25.00', 'Travel'), ('12.50', 'Food')]:
+            Transaction.objects.create(
+                user=self.user, transaction_type='expense', amount=Decimal(amount), category=category,
+            )
+        Transaction.objects.create(
+            user=self.user, transaction_type='income', amount=Decimal('500.00'), category='Salary',
+        )
+        self.client.post('/api/budgets/', {'category': 'Food', 'amount': '60.00', 'period': 'monthly'})
+
+    def get_async(self, path, client=None, **extra):
+        with self.settings(ROOT_URLCONF='backend.async_urls'):
+            return async_to_sync((client or self.async_client).get)(path, **extra)
+
+    def test_same_payloads_as_the_drf_views(self):
+        for path in self.PATHS:
+            response = self.get_async(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response.json(), self.client.get(path).json(), path)
+        self.assertEqual(self.get_async('/api/transactions/balance_at/?date=soon').status_code, 400)
+
+    def test_same_errors_as_the_drf_views(self):
+        def basic(credentials):
+            return {'headers': {'Authorization': 'Basic ' + base64.b64encode(credentials).decode()}}
+
+        anonymous = (Client(), AsyncClient())
+        for path, (sync_client, async_client), extra in [
+            (self.PATHS[0], anonymous, {}),
+            (self.PATHS[0], anonymous, basic(b'alice:pw')),
+            (self.PATHS[0], anonymous, basic(b'alice:wrong')),
+            ('/api/budgets/summary/?year=next', (self.client, self.async_client), {}),
+            ('/api/budgets/category-stats/?month=may', (self.client, self.async_client), {}),
+        ]:
+            expected = sync_client.get(path, **extra)
+            response = self.get_async(path, async_client, **extra)
+            self.assertEqual(
+                (response.status_code, response.json()), (expected.status_code, expected.json()), (path, extra),
+            )
+
+    def test_otp_authentication(self):
+        TOTPDevice.objects.create(user=self.user, name='Default', confirmed=True)
+        otp = {**settings.REST_FRAMEWORK, 'DEFAULT_AUTHENTICATION_CLASSES': [
+            'transactions.authentication.TwoFactorAuthentication',
+        ]}
+        with self.settings(REST_FRAMEWORK=otp):
+            self.assertEqual(self.get_async(self.PATHS[0]).status_code, 401)
+            session = self.client.session
+            session['otp_verified'] = True
+            session.save()
+            self.async_client.cookies = self.client.cookies
+            self.assertEqual(self.get_async(self.PATHS[0]).status_code, 200)
+
+
+class EventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+
+    def write(self):
+        Transaction.objects.create(user=self.user, category='Food', transaction_type='expense', amount=Decimal('12.50'))
+
+    def alert(self):
+        from budgets.models import Budget, BudgetAlert
+        budget = Budget.objects.create(user=self.user, category='Food', amount=Decimal('100.00'))
+        BudgetAlert.objects.create(budget=budget, alert_type='warning', message='80% of Food used')
+
+    async def open_stream(self, cookie=''):
+        from backend.asgi import application
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/events/', 'query_string': b'',
+            'headers': [(b'cookie', cookie.encode())], 'scheme': 'http', 'root_path': '',
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        }
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        task = asyncio.create_task(application(scope, inbox.get, outbox.put))
+        return task, inbox, outbox
+
+    async def next_message(self, outbox):
+        return await asyncio.wait_for(outbox.get(), 5)
+
+    async def test_stream_pushes_balance_changes_and_alerts(self):
+        await self.async_client.aforce_login(self.user)
+        cookie = f"sessionid={self.async_client.cookies['sessionid'].value}"
+        task, inbox, outbox = await self.open_stream(cookie)
+        start = await self.next_message(outbox)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        first = (await self.next_message(outbox))['body']
+        self.assertTrue(first.startswith(b'retry:'))
+        self.assertIn(b'event: balance\ndata: {"balance": "0.00", "change_seq": 0}\n\n', first)
+
+        # Written from another thread, as a worker serving a request would
+        await sync_to_async(self.write)()
+        frame = (await self.next_message(outbox))['body']
+        self.assertEqual(frame, b'event: balance\ndata: {"balance": "-12.50", "change_seq": 1}\n\n')
+
+        await sync_to_async(self.alert)()
+        frame = (await self.next_message(outbox))['body']
+        self.assertTrue(frame.startswith(b'event: budget_alert\n'))
+        self.assertIn(b'"message": "80% of Food used"', frame)
+
+        await inbox.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, 5)
+        self.assertNotIn(self.user.pk, broker._subscribers)
+
+    async def test_stream_requires_login(self):
+        task, _, outbox = await self.open_stream()
+        self.assertEqual((await self.next_message(outbox))['status'], 401)
+        await asyncio.wait_for(task, 5)
+
+    def test_wsgi_does_not_hold_streams(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/events/').status_code, 501)
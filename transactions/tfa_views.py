@@ -3,14 +3,67 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from django.core.cache import cache
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django_otp.util import random_hex
-import qrcode
-import qrcode.image.svg
 from io import BytesIO
 import base64
+import hashlib
 from .authentication import get_user_totp_device
 
+QR_FORMATS = ('png', 'svg')
+# Rendered QR codes of unconfirmed devices are kept for the setup window
+QR_CACHE_TIMEOUT = 600
+
+
+def render_qr_code(url, qr_format):
+    """
+    Render an otpauth URL as a base64 data URI.
+
+    qrcode (and Pillow for PNG) are imported here rather than at module load,
+    since they are only needed while a user is setting up 2FA.
+    """
+    import qrcode
+
+    buffer = BytesIO()
+    if qr_format == 'svg':
+        import qrcode.image.svg
+        # SVG is more lightweight and universally renderable
+        qrcode.make(url, image_factory=qrcode.image.svg.SvgImage).save(buffer)
+        mime_type = 'image/svg+xml'
+    else:
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(url)
+        qr.make(fit=True)
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+        mime_type = 'image/png'
+    return f"data:{mime_type};base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def _qr_cache_key(device, qr_format):
+    key_hash = hashlib.sha256(device.key.encode()).hexdigest()[:16]
+    return f'totp:qr:{device.pk}:{key_hash}:{qr_format}'
+
+
+def get_device_qr_code(device, qr_format):
+    """Return the device's QR code, rendering it at most once per device key"""
+    cache_key = _qr_cache_key(device, qr_format)
+    data_uri = cache.get(cache_key)
+    if data_uri is None:
+        data_uri = render_qr_code(device.config_url, qr_format)
+        cache.set(cache_key, data_uri, QR_CACHE_TIMEOUT)
+    return data_uri
+
+
+def invalidate_device_qr_codes(device):
+    """Drop the cached QR codes once the device is confirmed or deleted"""
+    cache.delete_many([_qr_cache_key(device, qr_format) for qr_format in QR_FORMATS])
+
 
 class TOTPCreateView(APIView):
     """
@@ -21,51 +74,47 @@ class TOTPCreateView(APIView):
     authentication_classes = [SessionAuthentication, BasicAuthentication]
     
     def get(self, request, format=None):
+        """
+        Query params:
+        - qr: 'png' or 'svg' to render a single QR format (default: both)
+        - reuse: 'true' to return the existing unconfirmed device, if any,
+          instead of replacing it
+        """
         user = request.user
+        qr_param = request.query_params.get('qr', '').lower()
+        if qr_param and qr_param not in QR_FORMATS:
+            return Response({
+                'error': f"qr must be one of: {', '.join(QR_FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        qr_formats = [qr_param] if qr_param else list(QR_FORMATS)
+        reuse = request.query_params.get('reuse', '').lower() in ('1', 'true', 'yes')
         
-        # Clean up any previous unconfirmed devices, keep confirmed ones
-        TOTPDevice.objects.filter(user=user, confirmed=False).delete()
-        
-        # Create a new TOTP device
-        device = TOTPDevice.objects.create(
-            user=user,
-            name='Default',
-            confirmed=False
-        )
+        device = get_user_totp_device(user, confirmed=False) if reuse else None
+        if device is None:
+            # Clean up any previous unconfirmed devices, keep confirmed ones
+            TOTPDevice.objects.filter(user=user, confirmed=False).delete()
+            
+            # Create a new TOTP device
+            device = TOTPDevice.objects.create(
+                user=user,
+                name='Default',
+                confirmed=False
+            )
         
         # URL for QR code
         url = device.config_url
         
-        # Generate QR code (PNG)
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
-        img_png = qr.make_image(fill_color="black", back_color="white")
-
-        # Save PNG
-        png_buffer = BytesIO()
-        img_png.save(png_buffer, format='PNG')
-        qr_png_b64 = base64.b64encode(png_buffer.getvalue()).decode()
-
-        # Also generate SVG (more lightweight and universally renderable)
-        svg_img = qrcode.make(url, image_factory=qrcode.image.svg.SvgImage)
-        svg_buffer = BytesIO()
-        svg_img.save(svg_buffer)
-        qr_svg_b64 = base64.b64encode(svg_buffer.getvalue()).decode()
-        
         # Return the device info and QR code
-        resp = Response({
+        data = {
             'device_id': device.id,
-            'qr_code': f"data:image/png;base64,{qr_png_b64}",
-            'qr_svg': f"data:image/svg+xml;base64,{qr_svg_b64}",
             'secret_key': device.key,  # Should be shown to user for manual entry
             'otpauth_url': url
-        })
+        }
+        if 'png' in qr_formats:
+            data['qr_code'] = get_device_qr_code(device, 'png')
+        if 'svg' in qr_formats:
+            data['qr_svg'] = get_device_qr_code(device, 'svg')
+        resp = Response(data)
         resp['Cache-Control'] = 'no-store'
         return resp
 
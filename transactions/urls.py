@@ -1,18 +1,23 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TransactionViewSet, UserProfileViewSet, RegisterView
+from .views import TransactionViewSet, UserProfileViewSet, RegisterView, SpendingAnomalyViewSet, RecurringTransactionViewSet
 from .tfa_views import TOTPCreateView, TOTPVerifyView, TOTPDeleteView, has_2fa
-from .views import CustomLoginView, LogoutView, get_csrf, WhoAmIView
+from .views import CustomLoginView, LogoutView, get_csrf, WhoAmIView, SyncView, DashboardView, event_stream
 
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
 router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'profiles', UserProfileViewSet, basename='profile')
+router.register(r'anomalies', SpendingAnomalyViewSet, basename='anomaly')
+router.register(r'recurring', RecurringTransactionViewSet, basename='recurring')
 
 # The API URLs are determined automatically by the router
 urlpatterns = [
     path('', include(router.urls)),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('events/', event_stream, name='events'),
     
     # Two-factor authentication endpoints
     path('2fa/create/', TOTPCreateView.as_view(), name='2fa-create'),
@@ -1,27 +1,45 @@
 from rest_framework import viewsets, permissions, filters, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import router, transaction as db_transaction
 from django.db.models import Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from datetime import timedelta
-from .models import Transaction, UserProfile
-from .serializers import TransactionSerializer, UserProfileSerializer, RegisterSerializer, UserSerializer
-from django.db.models.functions import TruncMonth, TruncWeek, TruncDay
+from .models import BalanceCheckpoint, RecurringTransaction, SpendingAnomaly, Transaction, UserProfile, assign_categories
+from .serializers import TransactionSerializer, UserProfileSerializer, RegisterSerializer, UserSerializer, SpendingAnomalySerializer, RecurringTransactionSerializer
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
-from django_otp import user_has_device
+from .authentication import cached_user_has_device
 from django.http import JsonResponse
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_GET
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.middleware.csrf import get_token
+from backend.replica import use_read_replica
+from backend.sharding import user_shard
+from .analytics import get_frame
+from .anomalies import check_transactions
+from .idempotency import idempotent
+from .archive import archived_totals, read_archive
+from .forecasting import MAX_HORIZON, cached_forecast
+from .balances import balance_as_of, daily_balances, day_start
+from .sync import changes_since
+from .coalesce import coalesced
+from .dashboard import WIDGETS, Dashboard, build_time_series, summarize_transactions
+from budgets.serializers import BudgetAlertSerializer, BudgetSerializer
+import csv
+from backend.events import publish
+from itertools import chain
+from django.http import StreamingHttpResponse
 
 
 def update_user_balance(user):
-    # Calculate balance from all transactions
+    # Recalculate the balance from the ledger. Writes keep it current
+    # incrementally; this is for repairing a drifted balance.
     income = Transaction.objects.filter(
         user=user, 
         transaction_type='income'
@@ -31,15 +49,61 @@ def update_user_balance(user):
         user=user, 
         transaction_type='expense'
     ).aggregate(total=Sum('amount'))['total'] or 0
+
+    # Closed years moved to the cold archive still count towards the balance
+    for row in archived_totals(user):
+        if row['transaction_type'] == 'income':
+            income += row['total']
+        else:
+            expenses += row['total']
     
     # Update user profile balance
     profile, created = UserProfile.objects.get_or_create(user=user, defaults={'balance': 0})
     profile.balance = income - expenses
-    profile.save()
+    profile.save(update_fields=['balance'])
+    publish(user.pk, 'balance', {'balance': profile.balance, 'change_seq': profile.change_seq}, profile._state.db)
     
     return profile
 
 
+class Echo:
+    """File-like object that hands csv.writer rows straight back for streaming"""
+    def write(self, value):
+        return value
+
+
+BULK_LIMIT = 500
+
+# Longest range of the daily balance series, in days
+MAX_SERIES_DAYS = 731
+
+
+def _parse(parser, value):
+    # parse_date/parse_datetime return None for bad formats but raise on
+    # well-formed impossible values such as 2024-02-30
+    try:
+        return parser(value)
+    except ValueError:
+        return None
+
+
+def balance_moment(params):
+    """The moment asked for by ?date= or ?at= (now by default); ValueError if malformed"""
+    if 'date' in params:
+        day = _parse(parse_date, params['date'])
+        if day is None:
+            raise ValueError('date must be YYYY-MM-DD')
+        return day_start(day + timedelta(days=1))
+    if 'at' in params:
+        at = _parse(parse_datetime, params['at'])
+        if at is None:
+            raise ValueError('at must be an ISO 8601 datetime')
+        return timezone.make_aware(at) if timezone.is_naive(at) else at
+    return timezone.now()
+
+EXPORT_FIELDS = ['id', 'date', 'transaction_type', 'amount', 'category', 'description']
+
+
 class TransactionViewSet(viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -54,58 +118,145 @@ class TransactionViewSet(viewsets.ModelViewSet):
         for the currently authenticated user.
         """
         user = self.request.user
-        return Transaction.objects.filter(user=user)
+        queryset = Transaction.objects.filter(user=user)
+        # Only join the user row when the nested user/username is rendered
+        if {'user', 'username'} & TransactionSerializer.requested_fields(self.request):
+            queryset = queryset.select_related('user')
+        return queryset
     
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
+    # Transaction.save()/delete() apply the balance delta atomically, so
+    # writes no longer recompute the balance from the whole ledger
     def perform_create(self, serializer):
-        transaction = serializer.save(user=self.request.user)
-        update_user_balance(self.request.user)
-
-    def perform_update(self, serializer):
-        transaction = serializer.save()
-        update_user_balance(transaction.user)
-
-    def perform_destroy(self, instance):
-        user = instance.user
-        instance.delete()
-        update_user_balance(user)
+        serializer.save(user=self.request.user)
             
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        """Create up to BULK_LIMIT transactions from a list in one request"""
+        if not isinstance(request.data, list) or not 1 <= len(request.data) <= BULK_LIMIT:
+            return Response({
+                'error': f'Expected a list of 1 to {BULK_LIMIT} transactions'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        rows = [Transaction(user=user, **item) for item in serializer.validated_data]
+        using = router.db_for_write(Transaction)
+        with db_transaction.atomic(using=using):
+            # One profile update and one insert; bulk_create skips the
+            # per-row save() and post_save signals, so anomalies are checked here
+            first = UserProfile.record_changes(
+                user.pk, using, changes=len(rows), balance_delta=sum(row.signed_amount() for row in rows)
+            )
+            for offset, row in enumerate(rows):
+                row.change_seq = first + offset
+            assign_categories(rows, using)
+            created = Transaction.objects.bulk_create(rows)
+            BalanceCheckpoint.shift(user.pk, [(row.date, row.signed_amount()) for row in rows], using)
+            check_transactions(created)
+        return Response(self.get_serializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'])
+    @use_read_replica
     def summary(self, request):
         """
         Return a summary of transactions by category
         """
         user = request.user
-        
-        # Get total income and expenses
-        income = Transaction.objects.filter(
-            user=user, 
-            transaction_type='income'
-        ).aggregate(total=Sum('amount'))
-        
-        expenses = Transaction.objects.filter(
-            user=user, 
-            transaction_type='expense'
-        ).aggregate(total=Sum('amount'))
-        
-        # Get expenses by category
-        expenses_by_category = Transaction.objects.filter(
-            user=user, 
-            transaction_type='expense'
-        ).values('category').annotate(total=Sum('amount'))
-        
-        # Get income by category
-        income_by_category = Transaction.objects.filter(
-            user=user, 
-            transaction_type='income'
-        ).values('category').annotate(total=Sum('amount'))
-        
-        return Response({
-            'total_income': income['total'] or 0,
-            'total_expenses': expenses['total'] or 0,
-            'expenses_by_category': expenses_by_category,
-            'income_by_category': income_by_category,
-        })
+        return Response(coalesced(
+            'summary', user.pk, {},
+            lambda: summarize_transactions(get_frame(user.pk), archived_totals(user)),
+        ))
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream every transaction as CSV, archived years first"""
+        user = request.user
+        # The body is streamed after the middleware has left the user's
+        # shard, so resolve the archives and the database up front
+        with user_shard(user.pk):
+            archives = list(user.transaction_archives.all())
+            using = router.db_for_read(Transaction)
+
+        def rows():
+            for archive in archives:
+                yield from read_archive(archive)
+            yield from Transaction.objects.using(using).filter(user=user).order_by('date', 'id').values(
+                *EXPORT_FIELDS
+            ).iterator()
+
+        writer = csv.writer(Echo())
+        lines = (
+            writer.writerow([
+                row['date'].isoformat() if field == 'date' else row[field]
+                for field in EXPORT_FIELDS
+            ])
+            for row in rows()
+        )
+        response = StreamingHttpResponse(
+            chain([writer.writerow(EXPORT_FIELDS)], lines),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    @use_read_replica
+    def forecast(self, request):
+        """Project balance and per-category amounts for the next weeks or months"""
+        period = request.query_params.get('period', 'month')
+        if period not in MAX_HORIZON:
+            return Response({
+                'error': f"period must be one of: {', '.join(MAX_HORIZON)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            horizon = int(request.query_params.get('horizon', 6))
+        except ValueError:
+            horizon = 0
+        if not 1 <= horizon <= MAX_HORIZON[period]:
+            return Response({
+                'error': f"horizon must be between 1 and {MAX_HORIZON[period]}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(cached_forecast(request.user, period, horizon))
+
+    @action(detail=False, methods=['get'])
+    @use_read_replica
+    def balance_at(self, request):
+        """
+        Balance as of ?at=<datetime>, or the end of ?date=YYYY-MM-DD
+        (now by default), from the nearest monthly checkpoint
+        """
+        try:
+            at = balance_moment(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'at': at, 'balance': balance_as_of(request.user.pk, at)})
+
+    @action(detail=False, methods=['get'])
+    @use_read_replica
+    def balance_series(self, request):
+        """Closing balance of each day from ?start= to ?end= (the last 90 days by default)"""
+        end = timezone.localdate()
+        start = end - timedelta(days=89)
+        for name in ('start', 'end'):
+            if name in request.query_params:
+                value = _parse(parse_date, request.query_params[name])
+                if value is None:
+                    return Response({'error': f'{name} must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+                if name == 'start':
+                    start = value
+                else:
+                    end = value
+        if not 0 <= (end - start).days < MAX_SERIES_DAYS:
+            return Response({
+                'error': f'end must not be before start and the range must span at most {MAX_SERIES_DAYS} days'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(daily_balances(request.user.pk, start, end))
+
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Return the last 5 transactions"""
@@ -114,51 +265,14 @@ class TransactionViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @use_read_replica
     def time_series(self, request):
         """Return time-based data for charts"""
-        user = request.user
         period = request.query_params.get('period', 'month')
-        
-        # Set the truncation function based on period
-        if period == 'week':
-            trunc_func = TruncWeek('date')
-            days_ago = 7 * 12  # Last 12 weeks
-        elif period == 'day':
-            trunc_func = TruncDay('date')
-            days_ago = 30  # Last 30 days
-        else:  # Default to month
-            trunc_func = TruncMonth('date')
-            days_ago = 30 * 12  # Last 12 months
-        
-        # Get start date
-        start_date = timezone.now() - timedelta(days=days_ago)
-        
-        # Get income time series
-        income_series = Transaction.objects.filter(
-            user=user,
-            transaction_type='income',
-            date__gte=start_date
-        ).annotate(
-            period=trunc_func
-        ).values('period').annotate(
-            total=Sum('amount')
-        ).order_by('period')
-        
-        # Get expense time series
-        expense_series = Transaction.objects.filter(
-            user=user,
-            transaction_type='expense',
-            date__gte=start_date
-        ).annotate(
-            period=trunc_func
-        ).values('period').annotate(
-            total=Sum('amount')
-        ).order_by('period')
-        
-        return Response({
-            'income_series': income_series,
-            'expense_series': expense_series,
-        })
+        user_id = request.user.pk
+        return Response(coalesced(
+            'time_series', user_id, {'period': period}, lambda: build_time_series(get_frame(user_id), period),
+        ))
 
 
 
@@ -178,6 +292,99 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
 
+class RecurringTransactionViewSet(viewsets.ModelViewSet):
+    """Rules for rent, salary, subscriptions...; posted by materialize_recurring"""
+    serializer_class = RecurringTransactionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return RecurringTransaction.objects.filter(user=self.request.user)
+
+class SpendingAnomalyViewSet(viewsets.ReadOnlyModelViewSet):
+    """Transactions flagged as unusual when they were recorded"""
+    serializer_class = SpendingAnomalySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = SpendingAnomaly.objects.filter(user=self.request.user).select_related('transaction')
+        if self.request.query_params.get('unread') == 'true':
+            queryset = queryset.filter(is_read=False)
+        return queryset
+    
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        anomaly = self.get_object()
+        anomaly.is_read = True
+        anomaly.save(update_fields=['is_read'])
+        return Response({'status': 'success'})
+
+class SyncView(APIView):
+    """
+    Transactions, budgets and alerts changed since ?since=<cursor>, with the
+    ids of deleted ones. Without a cursor (or with one from before the
+    user's rows were renumbered) it returns everything and ``reset`` is
+    true. Keep calling with the returned cursor while ``has_more`` is true.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({'error': 'since must be a cursor returned by this endpoint'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        changes = changes_since(request.user, since)
+        context = {
+            'request': request,
+            'year': timezone.now().year,
+            'month': timezone.now().month,
+            'week': None,
+        }
+        return Response({
+            'cursor': str(changes['cursor']),
+            'has_more': changes['has_more'],
+            'reset': changes['reset'],
+            'balance': changes['balance'],
+            'transactions': TransactionSerializer(changes['transactions'], many=True, context=context).data,
+            'budgets': BudgetSerializer(changes['budgets'], many=True, context=context).data,
+            'alerts': BudgetAlertSerializer(changes['alerts'], many=True, context=context).data,
+            'deleted': changes['deleted'],
+        })
+
+class DashboardView(APIView):
+    """
+    Several dashboard widgets in one response: ?widgets=summary,recent,...
+    (all of them by default). Widget parameters are prefixed with the
+    widget's name, e.g. ?time_series.period=week&budget_summary.period=weekly,
+    and take the values of the standalone endpoints.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @method_decorator(use_read_replica)
+    def get(self, request):
+        names = [name.strip() for name in request.query_params.get('widgets', '').split(',') if name.strip()]
+        names = names or list(WIDGETS)
+        unknown = [name for name in names if name not in WIDGETS]
+        if unknown:
+            return Response({'error': f"Unknown widgets: {', '.join(unknown)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dashboard = Dashboard(request.user)
+        widgets = {}
+        for name in dict.fromkeys(names):
+            params = {
+                param: request.query_params[f'{name}.{param}']
+                for param in WIDGETS[name] if f'{name}.{param}' in request.query_params
+            }
+            try:
+                widgets[name] = dashboard.widget(name, params)
+            except ValueError:
+                return Response({'error': f'Invalid parameters for {name}'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return Response({'change_seq': dashboard.profile.change_seq, 'widgets': widgets})
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
@@ -206,7 +413,7 @@ class CustomLoginView(APIView):
         
         if user is not None:
             login(request, user)
-            requires_2fa = user_has_device(user, confirmed=True)
+            requires_2fa = cached_user_has_device(user)
             # Do not mark session as verified here; TOTPVerifyView will set it.
             return Response({
                 'success': True,
@@ -243,6 +450,15 @@ def get_csrf(request):
     return JsonResponse({"detail": "ok"})
 
 
+@require_GET
+def event_stream(request):
+    """
+    /api/events/ is answered by backend.asgi (transactions.events) before
+    Django's request handling, so this only runs under WSGI
+    """
+    return JsonResponse({'error': 'The event stream is served by the ASGI application'}, status=501)
+
+
 class WhoAmIView(APIView):
     permission_classes = [AllowAny]
 
@@ -275,7 +491,7 @@ def legacy_api_auth_login(request):
         return JsonResponse({"success": False, "message": "Invalid credentials"}, status=401)
 
     login(request, user)
-    requires_2fa = user_has_device(user, confirmed=True)
+    requires_2fa = cached_user_has_device(user)
     return JsonResponse({"success": True, "username": user.username, "two_factor_required": requires_2fa})
 
 